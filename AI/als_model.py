@@ -0,0 +1,196 @@
+import logging
+import os
+
+import numpy as np
+from scipy import sparse
+from threadpoolctl import threadpool_limits
+
+from artifact_store import save_npz
+from ranking import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+# Bump when the arrays stored in the artifact change meaning
+ALS_FORMAT_VERSION = 1
+
+
+def _row_blocks(widths, width_of, cells):
+    """Split rows sorted by width into slices of at most about `cells` values of (rows x width_of(width))."""
+    first = 0
+    while first < len(widths):
+        last = first + 1
+        while last < len(widths) and (last + 1 - first) * width_of(widths[last]) <= cells:
+            last += 1
+        yield first, last
+        first = last
+
+
+def _least_squares(confidence, fixed, regularization, gram=None, block_cells=8_000_000):
+    """One ALS half-step: the best factors for every row of `confidence` given `fixed`.
+
+    For implicit feedback (Hu, Koren & Volinsky, 2008) every unobserved pair
+    has preference 0 and confidence 1, and an observed pair preference 1 and
+    confidence 1 + alpha * r. `confidence` holds alpha * r for the observed
+    pairs only; the shared YtY term accounts for all the others, so row u
+    solves (B + G_u^T G_u) x_u = b_u with B = YtY + regularization * I and
+    G_u the rows of Y it has entries for, scaled by sqrt(alpha * r).
+    `gram` is YtY, when already known.
+
+    Rows are solved in batches of rows with similar entry counts m, their
+    G_u zero-padded into one (rows, m, f) array. Rows with m < f (nearly all
+    of them with sparse feedback) use the Woodbury identity with B^-1
+    computed once: G_u B^-1 for the whole batch is one BLAS matrix product,
+    and each row is left with an m x m system instead of an f x f one. The
+    other rows build their f x f systems with one batched matmul. Either
+    way a batch is solved with one batched np.linalg.solve, and holds at
+    most about `block_cells` values.
+    """
+    fixed = np.asarray(fixed, dtype=np.float64)
+    n_factors = fixed.shape[1]
+    if gram is None:
+        gram = fixed.T @ fixed
+    base = gram + regularization * np.eye(n_factors)
+    base_inverse = np.linalg.inv(base)
+    solved = np.zeros((confidence.shape[0], n_factors))
+    indptr, indices, data = confidence.indptr, confidence.indices, confidence.data
+
+    counts = np.diff(indptr)
+    rows = np.flatnonzero(counts)
+    rows = rows[np.argsort(counts[rows], kind='stable')]
+    widths = counts[rows]
+
+    def width_of(width):
+        return width * n_factors + (width * width if width < n_factors else n_factors * n_factors)
+
+    for first, last in _row_blocks(widths, width_of, block_cells):
+        block = rows[first:last]
+        # Sorted by width, so the last row is the widest; shorter rows are zero-padded
+        width = widths[last - 1]
+        offsets = np.arange(width)
+        valid = offsets[None, :] < counts[block][:, None]
+        positions = np.where(valid, indptr[block][:, None] + offsets[None, :], 0)
+        factors = fixed[indices[positions]] * valid[:, :, None]
+        weights = np.where(valid, data[positions], 0.0)
+        b = np.einsum('rwf,rw->rf', factors, weights + valid)
+
+        if width < n_factors:
+            scaled = factors * np.sqrt(weights)[:, :, None]
+            # (B + G^T G)^-1 = B^-1 - H^T (I + H G^T)^-1 H, with H = G B^-1
+            projected = (scaled.reshape(-1, n_factors) @ base_inverse).reshape(scaled.shape)
+            inner = np.matmul(projected, scaled.transpose(0, 2, 1))
+            inner[:, offsets, offsets] += 1.0
+            z = b @ base_inverse
+            y = np.linalg.solve(inner, np.einsum('rwf,rf->rw', scaled, z)[:, :, None])[:, :, 0]
+            solved[block] = z - np.einsum('rwf,rw->rf', projected, y)
+        else:
+            a = base + np.matmul(factors.transpose(0, 2, 1) * weights[:, None, :], factors)
+            solved[block] = np.linalg.solve(a, b[:, :, None])[:, :, 0]
+    return solved
+
+
+def train_implicit_als(likes, factors=64, regularization=0.1, alpha=40.0, iterations=15,
+                       blas_threads=None, seed=0):
+    """Factorize a user x product feedback matrix with implicit ALS.
+
+    Returns (user_factors, item_factors) as float32; the predicted preference
+    of user u for product i is user_factors[u] @ item_factors[i]. Each
+    half-step is a handful of large matrix products and batched solves per
+    block of rows, so it runs with `blas_threads` BLAS threads (all cores
+    when None) regardless of the single-thread limit set for serving
+    processes.
+    """
+    confidence = sparse.csr_matrix(likes, dtype=np.float64)
+    confidence.data *= alpha
+    confidence_t = confidence.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(scale=0.01, size=(confidence.shape[0], factors))
+    item_factors = rng.normal(scale=0.01, size=(confidence.shape[1], factors))
+
+    with threadpool_limits(limits=blas_threads or os.cpu_count(), user_api='blas'):
+        for iteration in range(iterations):
+            user_factors = _least_squares(confidence, item_factors, regularization)
+            item_factors = _least_squares(confidence_t, user_factors, regularization)
+            logger.info(f"ALS iteration {iteration + 1}/{iterations} done")
+
+    return user_factors.astype(np.float32), item_factors.astype(np.float32)
+
+
+class ALSModel:
+    """Serving side of the implicit ALS model.
+
+    A known user is scored with one (n_products x f) matrix-vector product
+    and a top-k selection. Users that were not in the training data get
+    factors folded in from their current likes with a single least-squares
+    solve against the item factors.
+    """
+
+    def __init__(self, user_ids, product_ids, user_factors, item_factors, regularization=0.1, alpha=40.0):
+        self.user_ids = np.asarray(user_ids)
+        self.product_ids = np.asarray(product_ids)
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.user_row = {user_id: row for row, user_id in enumerate(self.user_ids.tolist())}
+        self.product_col = {product_id: col for col, product_id in enumerate(self.product_ids.tolist())}
+        self._item_gram = None
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def _columns(self, product_ids):
+        return np.fromiter(
+            (self.product_col[p] for p in product_ids if p in self.product_col), dtype=np.int64
+        )
+
+    def fold_in(self, liked_columns):
+        if self._item_gram is None:
+            item_factors = self.item_factors.astype(np.float64)
+            self._item_gram = item_factors.T @ item_factors
+        confidence = sparse.csr_matrix(
+            (np.full(len(liked_columns), self.alpha), (np.zeros(len(liked_columns), dtype=np.int64), liked_columns)),
+            shape=(1, len(self.product_ids))
+        )
+        confidence.sum_duplicates()
+        return _least_squares(confidence, self.item_factors, self.regularization, gram=self._item_gram)[0].astype(np.float32)
+
+    def recommend(self, user_id, liked_product_ids, top_n):
+        """[(ProductId, score)] of the best `top_n` products not in `liked_product_ids`."""
+        liked = self._columns(liked_product_ids)
+        row = self.user_row.get(user_id)
+        if row is not None:
+            user_vector = self.user_factors[row]
+        elif len(liked):
+            user_vector = self.fold_in(liked)
+        else:
+            return []
+
+        scores = self.item_factors @ user_vector
+        scores[liked] = -np.inf
+        top = top_k_indices(scores, min(top_n, len(scores) - len(np.unique(liked))))
+        return list(zip(self.product_ids[top].tolist(), scores[top].astype(float).tolist()))
+
+
+def save_als_model(path, user_ids, product_ids, user_factors, item_factors, regularization, alpha):
+    save_npz(
+        path,
+        format_version=np.int32(ALS_FORMAT_VERSION),
+        user_ids=np.asarray(user_ids, dtype=str),
+        product_ids=np.asarray(product_ids, dtype=str),
+        user_factors=np.asarray(user_factors, dtype=np.float32),
+        item_factors=np.asarray(item_factors, dtype=np.float32),
+        regularization=np.float64(regularization),
+        alpha=np.float64(alpha),
+    )
+    logger.info(f"Saved ALS model for {len(user_ids)} users and {len(product_ids)} products to {path}")
+
+
+def load_als_model(path):
+    with np.load(path, allow_pickle=False) as arrays:
+        if int(arrays['format_version']) != ALS_FORMAT_VERSION:
+            raise ValueError(f"Unsupported ALS model format in {path}")
+        return ALSModel(
+            arrays['user_ids'], arrays['product_ids'], arrays['user_factors'], arrays['item_factors'],
+            regularization=float(arrays['regularization']), alpha=float(arrays['alpha'])
+        )
@@ -0,0 +1,146 @@
+import logging
+import time
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+
+from ranking import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+
+def _assign(embeddings, centroids, block_rows=65536):
+    """Index of the most similar centroid per row, in blocks to bound memory."""
+    labels = np.empty(len(embeddings), dtype=np.int32)
+    for start in range(0, len(embeddings), block_rows):
+        labels[start:start + block_rows] = np.argmax(embeddings[start:start + block_rows] @ centroids.T, axis=1)
+    return labels
+
+
+def spherical_kmeans(embeddings, n_clusters, iterations=10, sample_size=100_000, seed=0):
+    """Unit-length centroids of `n_clusters` clusters of the (unit-length) rows, by cosine.
+
+    Lloyd iterations run on a random sample of at most `sample_size` rows;
+    clusters that end up empty are restarted from a random sample row.
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(embeddings))
+    if len(embeddings) > sample_size:
+        sample = embeddings[rng.choice(len(embeddings), sample_size, replace=False)]
+    else:
+        sample = embeddings
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = np.bincount(labels, minlength=n_clusters) == 0
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = _normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+
+class LSAIndex:
+    """Approximate nearest-neighbor retrieval over LSA embeddings of the TF-IDF matrix.
+
+    The TF-IDF rows are projected onto a few hundred TruncatedSVD components
+    and L2-normalized, so a dot product of embeddings approximates the cosine
+    similarity of the sparse rows. The embeddings are clustered with
+    spherical k-means into inverted lists (IVF). A query is compared with the
+    list centroids and only the rows of the `n_probe` closest lists are
+    scored, so a search costs O(n_lists + n_probe * n_rows / n_lists) instead
+    of O(n_rows). `n_probe` is the recall/latency knob: n_probe = n_lists
+    scans every embedding.
+
+    Embeddings are stored grouped by list: `embeddings[i]` belongs to catalog
+    row `list_rows[i]`, and list `l` is the slice
+    `list_offsets[l]:list_offsets[l + 1]`.
+    """
+
+    def __init__(self, components, centroids, list_offsets, list_rows, embeddings):
+        self.components = np.asarray(components, dtype=np.float32)
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.list_offsets = np.asarray(list_offsets, dtype=np.int64)
+        self.list_rows = np.asarray(list_rows, dtype=np.int64)
+        self.embeddings = embeddings
+
+    @classmethod
+    def build(cls, matrix, dimensions=256, n_lists=None, iterations=10, seed=0):
+        """Index the rows of a TF-IDF matrix; `n_lists` defaults to about sqrt(rows)."""
+        n_rows, n_features = matrix.shape
+        dimensions = max(1, min(dimensions, n_features - 1, n_rows - 1))
+        n_lists = n_lists or int(np.sqrt(n_rows))
+        n_lists = max(1, min(n_lists, n_rows))
+
+        start = time.perf_counter()
+        svd = TruncatedSVD(n_components=dimensions, algorithm='randomized', random_state=seed)
+        embeddings = _normalize_rows(svd.fit_transform(matrix).astype(np.float32))
+        svd_seconds = time.perf_counter() - start
+
+        centroids = spherical_kmeans(embeddings, n_lists, iterations=iterations, seed=seed)
+        labels = _assign(embeddings, centroids)
+        list_rows = np.argsort(labels, kind='stable')
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=n_lists))])
+
+        logger.info(
+            f"LSA index built: {n_rows} rows, {dimensions} dimensions "
+            f"(explained variance {svd.explained_variance_ratio_.sum():.2f}), {n_lists} lists; "
+            f"SVD {svd_seconds:.1f}s, clustering {time.perf_counter() - start - svd_seconds:.1f}s"
+        )
+        return cls(svd.components_, centroids, list_offsets, list_rows, embeddings[list_rows])
+
+    def arrays(self):
+        return {
+            'components': self.components,
+            'centroids': self.centroids,
+            'list_offsets': self.list_offsets,
+            'list_rows': self.list_rows,
+            'embeddings': self.embeddings,
+        }
+
+    @property
+    def n_rows(self):
+        return len(self.list_rows)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def embed_query(self, query_vector):
+        embedded = np.asarray(query_vector @ self.components.T, dtype=np.float32).ravel()
+        norm = np.linalg.norm(embedded)
+        return embedded / norm if norm > 0 else embedded
+
+    def search(self, query_vector, k, n_probe=8, allowed=None):
+        """Catalog rows among the `k` most similar to a TF-IDF query vector, best first.
+
+        At least `n_probe` lists are probed, and more while fewer than `k`
+        rows allowed by the boolean mask `allowed` have been found. Returns
+        (rows, approximate scores).
+        """
+        query = self.embed_query(query_vector)
+        list_order = np.argsort(-(self.centroids @ query))
+        offsets = self.list_offsets
+
+        slices, found = [], 0
+        for probed, list_id in enumerate(list_order):
+            if probed >= n_probe and found >= k:
+                break
+            start, end = offsets[list_id], offsets[list_id + 1]
+            if allowed is not None:
+                positions = start + np.flatnonzero(allowed[self.list_rows[start:end]])
+            else:
+                positions = np.arange(start, end)
+            slices.append(positions)
+            found += len(positions)
+
+        positions = np.concatenate(slices) if slices else np.zeros(0, dtype=np.int64)
+        scores = self.embeddings[positions] @ query
+        top = top_k_indices(scores, k)
+        return self.list_rows[positions[top]], scores[top]
@@ -0,0 +1,62 @@
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def save_npz(path, **arrays):
+    """Write `arrays` to `path` (.npz) without pickling.
+
+    The file is written next to `path` and renamed into place, so a reader
+    sees either the previous artifact or the complete new one.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f'.tmp-{os.getpid()}-{os.path.basename(path)}')
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ArtifactStore:
+    """Serves the artifact at `path`, loading it with `load` only when the file changes.
+
+    The file's identity (inode, mtime, size) is its version: offline jobs
+    replace the file atomically, so a new version is picked up by the next
+    lookup, in every process that reads it.
+    """
+
+    def __init__(self, path, load):
+        self.path = path
+        self.load = load
+        self._lock = threading.Lock()
+        self._artifact = None
+        self._version = None
+
+    def current(self):
+        """The loaded artifact, or None when none has been written yet."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    try:
+                        self._artifact = self.load(self.path)
+                        logger.info(f"Loaded {self.path} ({len(self._artifact)} entries)")
+                    except Exception as e:
+                        # Keep serving the previous version
+                        logger.error(f"Could not load {self.path}: {e}")
+                    self._version = version
+        return self._artifact
@@ -0,0 +1,128 @@
+"""Measure recall@N and latency of LSA + IVF content retrieval against exact TF-IDF scoring.
+
+    python benchmark_ann.py --rows 200000 --top-n 10 --probes 1,2,4,8,16,32
+
+Generates a synthetic catalog of products from a number of material
+families, builds the TF-IDF content index and the LSA index over it,
+and runs the same queries through exact scoring and through
+ContentIndex.retrieve for every probe count. recall@N is the share of
+the approximate top N that scores at least as high as the exact N-th
+result, so ties between equally relevant products do not count as misses;
+the score ratio compares the summed exact scores of both top N lists.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ann_index import LSAIndex
+from content_index import ContentIndex
+from ranking import top_k_indices
+
+
+def synthetic_documents(rows, materials=150, vocabulary=3000, seed=0):
+    """Product texts and noisy queries shaped like content_features and build_query_text.
+
+    Every product belongs to a material family with its own name, category
+    and description terms. Families draw those terms from one shared
+    vocabulary with Zipf-like word frequencies, so common words are shared
+    by many families, as in real material names. A product's text repeats
+    the name and category terms as content_features does, plus description
+    words of the family, a few words of the whole vocabulary and some
+    general ones.
+
+    Queries are held out from the catalog: two keywords of a family plus
+    one word of the whole vocabulary, with the family's category three
+    times for half of them, so they match no product exactly and the
+    nearest products come from several families.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array([f'term{i}' for i in range(vocabulary)])
+    frequency = 1 / np.arange(1, vocabulary + 1) ** 0.8
+    frequency /= frequency.sum()
+
+    def family_words(count):
+        return list(rng.choice(words, count, replace=False, p=frequency))
+
+    family_terms = [
+        {
+            'name': family_words(5),
+            'category': f'category{m % 40}',
+            'description': family_words(15),
+        }
+        for m in range(materials)
+    ]
+    general = [f'general{i}' for i in range(500)]
+
+    documents = []
+    for family in rng.integers(0, materials, rows):
+        terms = family_terms[family]
+        name = ' '.join(rng.choice(terms['name'], 3, replace=False))
+        description = ' '.join(rng.choice(terms['description'], 8, replace=False))
+        documents.append(' '.join([
+            name, name, description, ' '.join(rng.choice(words, 3, p=frequency)),
+            ' '.join(rng.choice(general, 5)), terms['category'], terms['category']
+        ]))
+    queries = []
+    for family in rng.integers(0, materials, 1000):
+        terms = family_terms[family]
+        keywords = list(rng.choice(terms['name'] + terms['description'], 2, replace=False))
+        keywords.append(rng.choice(words, p=frequency))
+        query = [' '.join(keywords)] * 3
+        if rng.random() < 0.5:
+            query += [terms['category']] * 3
+        queries.append(' '.join(query))
+    return documents, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--candidates', type=int, default=2000)
+    parser.add_argument('--dimensions', type=int, default=256)
+    parser.add_argument('--lists', type=int, default=0)
+    parser.add_argument('--probes', default='1,2,4,8,16,32')
+    args = parser.parse_args()
+
+    documents, queries = synthetic_documents(args.rows)
+    queries = queries[:args.queries]
+
+    start = time.perf_counter()
+    content_index = ContentIndex.build(documents)
+    print(f"{args.rows} products, TF-IDF {content_index.matrix.shape} built in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    ann = LSAIndex.build(content_index.matrix, dimensions=args.dimensions, n_lists=args.lists or None)
+    print(f"LSA index ({ann.embeddings.shape[1]} dimensions, {ann.n_lists} lists) built in {time.perf_counter() - start:.1f}s")
+
+    query_vectors = [content_index.transform_query(q) for q in queries]
+    start = time.perf_counter()
+    exact = []
+    for v in query_vectors:
+        scores = content_index.score(v)
+        exact.append(scores[top_k_indices(scores, args.top_n)])
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"{'exact':<12} recall@{args.top_n} 1.000   {exact_ms:8.2f} ms/query")
+
+    content_index.ann = ann
+    for n_probe in [int(p) for p in args.probes.split(',')]:
+        start = time.perf_counter()
+        found = [
+            content_index.retrieve(v, max(args.top_n, args.candidates), n_probe)[1][:args.top_n]
+            for v in query_vectors
+        ]
+        ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        pairs = [(e, f) for e, f in zip(exact, found) if len(e) and e[0] > 0]
+        # Products tie a lot on text, so a result counts as a hit when its
+        # exact score reaches that of the exact N-th result
+        recall = np.mean([np.sum(f >= e[-1] - 1e-6) / len(e) for e, f in pairs])
+        score_ratio = np.mean([f.sum() / e.sum() for e, f in pairs])
+        print(
+            f"{f'probes={n_probe}':<12} recall@{args.top_n} {recall:.3f}   "
+            f"score ratio {score_ratio:.3f}   {ann_ms:8.2f} ms/query"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Compare catalog load time of the row-by-row preprocessing with catalog_loader.load_catalog.
+
+    python benchmark_preprocessing.py --rows 200000 --workers 4
+
+Generates a synthetic catalog shaped like PRODUCT_QUERY rows, runs the
+previous `.apply`-based preprocessing and load_catalog on the same rows
+streamed in FETCH_CHUNK_ROWS-sized chunks, serially and with the chunks
+past --parallel-rows on a pool of --workers processes (the path
+fetch_catalog takes), checks that all produce the same content_features
+and reports preprocessing and total index build times. For load_catalog
+the preprocessing time includes compacting the chunks to the serving
+layout.
+"""
+import argparse
+import ast
+import json
+import random
+import re
+import time
+
+import pandas as pd
+
+from catalog_loader import load_catalog
+from content_index import ContentIndex
+
+WORDS = [
+    'recycled', 'pallets', 'steel', 'scrap', 'oak', 'pine', 'bottles', 'fabric', 'cotton',
+    'cardboard', 'solvent', 'copper', 'aluminium', 'bricks', 'concrete', 'circuit', 'boards',
+    'residue', 'granulate', 'sheets', 'PET-flakes', 'HDPE', 'glass/cullet', 'wood-chips'
+]
+CATEGORIES = ['Wood', 'Metal', 'Plastic', 'Glass', 'Textile', 'Paper', 'Chemicals', 'Food waste']
+
+
+def synthetic_catalog(rows, seed=0):
+    rnd = random.Random(seed)
+    return pd.DataFrame({
+        'ProductName': [' '.join(rnd.sample(WORDS, 3)).title() for _ in range(rows)],
+        'MaterialName': [' '.join(rnd.sample(WORDS, 2)) for _ in range(rows)],
+        'MaterialDescription': [', '.join(rnd.sample(WORDS, 8)) + '.' for _ in range(rows)],
+        'Categories': [json.dumps(rnd.sample(CATEGORIES, 3)) for _ in range(rows)],
+        'SupplyType': [rnd.choice(['Waste', 'Surplus', 'By-product']) for _ in range(rows)],
+        'UnitOfMeasure': [rnd.choice(['kg', 'ton', 'm3', 'pieces']) for _ in range(rows)],
+        'Latitude': [str(51 + rnd.random() * 2) for _ in range(rows)],
+        'Longitude': [str(4 + rnd.random() * 3) for _ in range(rows)],
+        'AvailableQuantity': [rnd.randint(1, 5000) for _ in range(rows)],
+        'ProductId': [f'product-{i}' for i in range(rows)],
+        'ValidFrom': ['2024-01-01'] * rows,
+        'ValidTo': ['2030-01-01'] * rows,
+        'CreatedOn': ['2024-01-01 12:00:00'] * rows,
+        'LocationId': [f'location-{rnd.randint(0, rows // 20)}' for _ in range(rows)],
+    })
+
+
+def legacy_add_content_features(df):
+    """The previous per-row implementation, kept as the reference."""
+    df['Categories'] = df['Categories'].apply(
+        lambda x: ast.literal_eval(x) if isinstance(x, str) else x
+    )
+
+    numeric_cols = ['Latitude', 'Longitude', 'AvailableQuantity']
+    for col in numeric_cols:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    def preprocess_text(text):
+        if isinstance(text, (list, tuple)):
+            text = ' '.join(map(str, text))
+        if pd.isna(text) or text is None:
+            return ''
+        text = str(text).lower().strip()
+        text = re.sub(r'[^\w\s]', ' ', text)
+        text = ' '.join(text.split())
+        return text
+
+    df['processed_name'] = df['ProductName'].apply(preprocess_text)
+    df['processed_material'] = df['MaterialName'].apply(preprocess_text)
+    df['processed_description'] = df['MaterialDescription'].apply(preprocess_text)
+    df['processed_categories'] = df['Categories'].apply(preprocess_text)
+    df['processed_supply_type'] = df['SupplyType'].apply(preprocess_text)
+    df['processed_unit'] = df['UnitOfMeasure'].apply(preprocess_text)
+
+    df['content_features'] = (
+        df['processed_name'] + ' ' +
+        df['processed_name'] + ' ' +
+        df['processed_material'] + ' ' +
+        df['processed_description'] + ' ' +
+        df['processed_categories'] + ' ' +
+        df['processed_categories'] + ' ' +
+        df['processed_supply_type'] + ' ' +
+        df['processed_unit']
+    )
+    return df
+
+
+def timed_build(name, preprocess, catalog):
+    start = time.perf_counter()
+    features = preprocess(catalog)
+    preprocessed = time.perf_counter()
+    ContentIndex.build(features)
+    built = time.perf_counter()
+    print(f"{name:<28} preprocess {preprocessed - start:8.2f}s   total build {built - start:8.2f}s")
+    return features.tolist()
+
+
+def streamed(catalog, chunk_rows):
+    """The catalog as stream_query yields it: fresh frames of at most `chunk_rows` rows."""
+    for start in range(0, len(catalog), chunk_rows):
+        yield catalog.iloc[start:start + chunk_rows].reset_index(drop=True).copy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--fetch-rows', type=int, default=10_000)
+    parser.add_argument('--parallel-rows', type=int, default=20_000)
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(args.rows)
+    print(f"{args.rows} products")
+
+    reference = timed_build(
+        'row-by-row (.apply)', lambda df: legacy_add_content_features(df.copy())['content_features'], catalog
+    )
+    serial = timed_build(
+        'load_catalog, serial',
+        lambda df: load_catalog(streamed(df, args.fetch_rows), workers=1)[1],
+        catalog
+    )
+    parallel = timed_build(
+        f'load_catalog, {args.workers} processes',
+        lambda df: load_catalog(
+            streamed(df, args.fetch_rows), workers=args.workers, parallel_rows=args.parallel_rows
+        )[1],
+        catalog
+    )
+
+    assert serial == reference, 'load_catalog content_features differ from the reference'
+    assert parallel == reference, 'parallel content_features differ from the reference'
+    print('content_features identical')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import logging
+import os
+from collections import deque
+
+import pandas as pd
+from sqlalchemy import text
+
+from catalog_snapshot import SERVING_COLUMNS, compact_catalog, concat_catalog
+from text_preprocessing import TEXT_COLUMNS, coerce_numeric, content_features, preprocessing_pool
+
+logger = logging.getLogger(__name__)
+
+
+def stream_query(connection, query, params=None, chunk_rows=10_000):
+    """Yield the rows of `query` as DataFrames of at most `chunk_rows` rows.
+
+    Rows are read through a server-side cursor (`yield_per`), so neither the
+    driver nor SQLAlchemy buffers the full result. An empty result yields one
+    empty frame, so callers always see the columns.
+    """
+    result = connection.execution_options(yield_per=chunk_rows).execute(text(query), params or {})
+    columns = list(result.keys())
+    empty = True
+    for rows in result.partitions(chunk_rows):
+        empty = False
+        yield pd.DataFrame.from_records(rows, columns=columns)
+    if empty:
+        yield pd.DataFrame(columns=columns)
+
+
+def read_frame(connection, query, params=None, chunk_rows=10_000, dtypes=None):
+    """Read `query` chunk by chunk into one DataFrame, casting each chunk to `dtypes` as it arrives."""
+    chunks = [
+        chunk.astype(dtypes) if dtypes else chunk
+        for chunk in stream_query(connection, query, params, chunk_rows)
+    ]
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+
+
+def load_catalog(chunks, workers=1, parallel_rows=50_000):
+    """Preprocess and compact streamed product rows, chunk by chunk.
+
+    Each chunk is reduced to its compact serving columns and its
+    content_features text as soon as it is read, so the raw rows (material
+    descriptions, Row objects) of the whole catalog are never held at once.
+    Once more than `parallel_rows` rows have been read, further chunks are
+    preprocessed on a pool of `workers` processes while the next ones are
+    fetched.
+
+    Returns (catalog, content_features, sync_watermark).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    frames = []
+    features = []
+    watermarks = []
+    pending = deque()
+    pool = None
+    rows_read = 0
+
+    def finish(chunk, result):
+        chunk['Categories'], chunk['content_features'] = result
+        features.append(chunk['content_features'])
+        watermarks.append(pd.to_datetime(chunk['CreatedOn']).max())
+        frames.append(compact_catalog(chunk))
+
+    try:
+        for chunk in chunks:
+            coerce_numeric(chunk)
+            rows_read += len(chunk)
+            if pool is None and workers > 1 and rows_read > parallel_rows:
+                pool = preprocessing_pool(workers)
+
+            if pool is None:
+                finish(chunk, content_features(chunk))
+                continue
+
+            pending.append((chunk, pool.submit(content_features, chunk[TEXT_COLUMNS + ['Categories']])))
+            # Bound the number of raw chunks waiting on the pool
+            while len(pending) > 2 * workers:
+                chunk, future = pending.popleft()
+                finish(chunk, future.result())
+
+        while pending:
+            chunk, future = pending.popleft()
+            finish(chunk, future.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    if not frames:
+        return compact_catalog(pd.DataFrame(columns=SERVING_COLUMNS)), pd.Series([], dtype=object), None
+
+    catalog = concat_catalog(frames)
+    features = pd.concat(features, ignore_index=True)
+    sync_watermark = pd.Series(watermarks).max()
+    logger.info(f"Loaded {len(catalog)} products in {len(frames)} chunks")
+    return catalog, features, None if pd.isna(sync_watermark) else sync_watermark
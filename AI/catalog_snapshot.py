@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from filter_index import FilterIndex
+from geo_index import GeoIndex
+
+logger = logging.getLogger(__name__)
+
+# Columns a snapshot keeps once the TF-IDF matrix is built; the material text,
+# the processed_* columns and content_features are only needed for fitting.
+SERVING_COLUMNS = [
+    'ProductId', 'ProductName', 'Categories', 'SupplyType', 'UnitOfMeasure',
+    'AvailableQuantity', 'ValidFrom', 'ValidTo', 'CreatedOn',
+    'LocationId', 'Latitude', 'Longitude'
+]
+CATEGORICAL_COLUMNS = ['Categories', 'SupplyType', 'UnitOfMeasure', 'LocationId']
+FLOAT_COLUMNS = ['AvailableQuantity', 'Latitude', 'Longitude']
+DATE_COLUMNS = ['ValidFrom', 'ValidTo', 'CreatedOn']
+
+
+def compact_catalog(df):
+    """Serving-time layout of product rows.
+
+    Low-cardinality fields become categoricals (a product's categories are
+    stored as one tuple-valued categorical, so each distinct combination is
+    held once), numerics become float32 and dates datetime64.
+    """
+    compact = pd.DataFrame(index=pd.RangeIndex(len(df)))
+    for column in SERVING_COLUMNS:
+        values = df[column]
+        if column == 'Categories':
+            values = values.map(lambda c: tuple(c) if isinstance(c, (list, tuple)) else ())
+        if column in CATEGORICAL_COLUMNS:
+            compact[column] = pd.Categorical(values.to_numpy())
+        elif column in FLOAT_COLUMNS:
+            compact[column] = pd.to_numeric(values, errors='coerce').fillna(0).to_numpy(dtype=np.float32)
+        elif column in DATE_COLUMNS:
+            compact[column] = pd.to_datetime(values, errors='coerce').to_numpy(dtype='datetime64[s]')
+        else:
+            compact[column] = values.to_numpy()
+    return compact
+
+
+def concat_catalog(frames):
+    """Concatenate compacted catalog frames, keeping categorical columns categorical."""
+    if len(frames) == 1:
+        return frames[0]
+    columns = {}
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            columns[column] = union_categoricals([f[column] for f in frames], ignore_order=True)
+        else:
+            columns[column] = np.concatenate([f[column].to_numpy() for f in frames])
+    return pd.DataFrame(columns)
+
+
+class CatalogSnapshot:
+    """Everything a request reads from the product catalog, as one object.
+
+    A snapshot is never modified after it has been built: refreshes build a
+    new snapshot next to it and publish that with a single reference swap, so
+    a request that pinned a snapshot keeps a consistent view for its whole
+    lifetime without any locking.
+    """
+
+    __slots__ = (
+        'version', 'df', 'content_index', 'geo_index', 'filter_index',
+        'scaler', 'numerical_features_scaled', 'active_mask', 'has_tombstones',
+        'sync_watermark', 'default_query', 'built_at'
+    )
+
+    def __init__(self, version, df, content_index, geo_index, filter_index, scaler,
+                 numerical_features_scaled, active_mask, sync_watermark=None, default_query=''):
+        set_attr = object.__setattr__
+        set_attr(self, 'version', version)
+        set_attr(self, 'df', df)
+        set_attr(self, 'content_index', content_index)
+        set_attr(self, 'geo_index', geo_index)
+        set_attr(self, 'filter_index', filter_index)
+        set_attr(self, 'scaler', scaler)
+        set_attr(self, 'numerical_features_scaled', numerical_features_scaled)
+        # Tombstoned (expired) rows stay in the arrays until the next full
+        # refit but are never candidates
+        set_attr(self, 'active_mask', active_mask)
+        set_attr(self, 'has_tombstones', not bool(active_mask.all()))
+        set_attr(self, 'sync_watermark', sync_watermark)
+        # Query text used when a request carries no text preferences
+        set_attr(self, 'default_query', default_query)
+        set_attr(self, 'built_at', time.time())
+        active_mask.flags.writeable = False
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CatalogSnapshot is immutable')
+
+    @classmethod
+    def build(cls, version, df, content_index, scaler, numerical_features_scaled,
+              active_mask=None, sync_watermark=None, default_query=''):
+        geo_index = GeoIndex.build(df['Latitude'], df['Longitude'], df['LocationId'])
+        filter_index = FilterIndex.build(
+            df['Categories'],
+            df['SupplyType'],
+            df['UnitOfMeasure'],
+            df['AvailableQuantity'],
+            df['ValidFrom'],
+            df['ValidTo']
+        )
+        if active_mask is None:
+            active_mask = np.ones(len(df), dtype=bool)
+        return cls(
+            version, df, content_index, geo_index, filter_index, scaler,
+            numerical_features_scaled, np.array(active_mask, dtype=bool), sync_watermark,
+            default_query
+        )
+
+    @property
+    def vectorizer(self):
+        return self.content_index.vectorizer if self.content_index is not None else None
+
+    @property
+    def content_matrix(self):
+        return self.content_index.matrix if self.content_index is not None else None
+
+    def __len__(self):
+        return len(self.df)
+
+    def memory_report(self):
+        """Bytes held per component of the snapshot."""
+        columns = {
+            column: int(self.df[column].memory_usage(index=False, deep=True))
+            for column in self.df.columns
+        }
+        report = {'catalog_columns': columns, 'catalog': sum(columns.values())}
+        if self.content_index is not None:
+            matrix = self.content_index.matrix
+            report['content_matrix'] = int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes)
+        report['geo_index'] = int(sum(a.nbytes for a in self.geo_index.arrays().values()))
+        report['filter_index'] = int(sum(a.nbytes for a in self.filter_index.arrays().values()))
+        report['numerical_features'] = int(np.asarray(self.numerical_features_scaled).nbytes)
+        report['active_mask'] = int(self.active_mask.nbytes)
+        report['total'] = sum(v for k, v in report.items() if k != 'catalog_columns')
+        return report
+
+
+class SnapshotHolder:
+    """Holds the published snapshot.
+
+    Readers call `current()` once and use the returned snapshot throughout;
+    publishing replaces the reference atomically. Only publishers take the
+    lock, so serving never waits on a rebuild.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._publish_lock = threading.Lock()
+        self._listeners = []
+
+    def current(self):
+        return self._snapshot
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def publish(self, snapshot):
+        with self._publish_lock:
+            previous = self._snapshot
+            if previous is not None and snapshot.version <= previous.version:
+                raise ValueError(
+                    f"Snapshot version {snapshot.version} is not newer than {previous.version}"
+                )
+            self._snapshot = snapshot
+        logger.info(f"Published catalog snapshot v{snapshot.version} ({len(snapshot)} rows)")
+        for listener in self._listeners:
+            listener(snapshot)
+        return previous
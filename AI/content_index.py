@@ -0,0 +1,140 @@
+import logging
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+from ranking import top_k_with_ties
+
+logger = logging.getLogger(__name__)
+
+TFIDF_PARAMS = dict(
+    stop_words='english',
+    max_df=0.95,
+    min_df=2,
+    ngram_range=(1, 2),
+    max_features=5000,
+    strip_accents='unicode',
+    norm='l2',
+    dtype=np.float32
+)
+
+
+class ContentIndex:
+    """Persistent TF-IDF scoring index over the product catalog.
+
+    The catalog is vectorized once at build time into a single L2-normalised
+    CSR matrix. Requests only transform their query text and score it with one
+    sparse matrix-vector product, so the per-request cost no longer includes
+    re-tokenizing every product.
+    """
+
+    def __init__(self, vectorizer, matrix, normalized=False, ann=None):
+        self.vectorizer = vectorizer
+        # Optional ann_index.LSAIndex over the first ann.n_rows rows
+        self.ann = ann
+        if normalized:
+            # Already L2-normalised CSR with sorted indices, possibly backed
+            # by read-only memory-mapped arrays that must not be written to
+            self.matrix = matrix
+        else:
+            # Rows are already L2-normalised by the vectorizer, but normalising
+            # again keeps the dot product a cosine similarity for matrices that
+            # were assembled elsewhere (e.g. appended rows).
+            self.matrix = normalize(sparse.csr_matrix(matrix), norm='l2', copy=False)
+            self.matrix.sort_indices()
+        self._feature_names = None
+
+    @classmethod
+    def build(cls, documents, **tfidf_params):
+        params = {**TFIDF_PARAMS, **tfidf_params}
+        vectorizer = TfidfVectorizer(**params)
+        matrix = vectorizer.fit_transform(documents)
+        logger.info(f"Content index built with shape {matrix.shape}, nnz={matrix.nnz}")
+        return cls(vectorizer, matrix)
+
+    @property
+    def n_products(self):
+        return self.matrix.shape[0]
+
+    @property
+    def feature_names(self):
+        if self._feature_names is None:
+            self._feature_names = np.asarray(self.vectorizer.get_feature_names_out())
+        return self._feature_names
+
+    def transform_query(self, query_text):
+        return self.vectorizer.transform([query_text]).tocsr()
+
+    def score(self, query_vector, rows=None):
+        """Cosine similarity of the query against all rows, or only `rows`.
+
+        `rows` is an array of row positions; the returned scores are aligned
+        with it.
+        """
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        if query_vector.nnz == 0 or matrix.shape[0] == 0:
+            return np.zeros(matrix.shape[0])
+        return np.asarray((matrix @ query_vector.T).todense()).ravel()
+
+    def retrieve(self, query_vector, k, n_probe, rows=None, n_candidates=None):
+        """The `k` best-scoring rows (or positions in `rows`) with their exact scores, best first.
+
+        Rows tied with the k-th score are all returned, so a query without
+        any known terms returns every row. With an ANN index, the best `n_candidates` (at least `k`) found by
+        probing `n_probe` of its lists plus the rows appended after it was
+        built are scored exactly; otherwise every row is scored. Returns
+        (positions, scores) where positions index `rows` when given, else the
+        catalog.
+        """
+        if self.ann is None or query_vector.nnz == 0:
+            scores = self.score(query_vector, rows)
+            top = top_k_with_ties(scores, k)
+            return top, scores[top]
+
+        n_rows = self.n_products
+        allowed = None
+        if rows is not None:
+            allowed = np.zeros(n_rows, dtype=bool)
+            allowed[rows] = True
+        candidates, _ = self.ann.search(query_vector, max(k, n_candidates or 0), n_probe, allowed)
+        # Rows added by delta syncs since the index was built
+        tail = np.arange(self.ann.n_rows, n_rows)
+        if allowed is not None:
+            tail = tail[allowed[tail]]
+        candidates = np.concatenate([candidates, tail])
+
+        scores = self.score(query_vector, candidates)
+        top = top_k_with_ties(scores, k)
+        candidates, scores = candidates[top], scores[top]
+        if rows is not None:
+            position = np.full(n_rows, -1, dtype=np.int64)
+            position[rows] = np.arange(len(rows))
+            candidates = position[candidates]
+        return candidates, scores
+
+    def explain(self, query_vector, rows, top_terms=5):
+        """Top matching terms between the query and each of `rows`, in one batch.
+
+        The element-wise product of the query and the stored product rows only
+        has entries for terms present in both, so each row's explanation is the
+        top `top_terms` entries of its slice of that sparse product.
+        """
+        overlap = self.matrix[rows].multiply(query_vector).tocsr()
+        overlap.eliminate_zeros()
+
+        explanations = []
+        for i in range(overlap.shape[0]):
+            start, end = overlap.indptr[i], overlap.indptr[i + 1]
+            relevance = overlap.data[start:end]
+            terms = overlap.indices[start:end]
+            if len(relevance) > top_terms:
+                keep = np.argpartition(-relevance, top_terms - 1)[:top_terms]
+                relevance, terms = relevance[keep], terms[keep]
+            order = np.argsort(-relevance, kind='stable')
+            explanations.append([
+                {'term': str(self.feature_names[term]), 'relevance': float(value)}
+                for term, value in zip(terms[order], relevance[order])
+            ])
+        return explanations
@@ -0,0 +1,145 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+
+def interaction_matrix(user_ids, product_ids, values, users=None):
+    """User x product CSR matrix of feedback `values`, built from factorized ID codes.
+
+    Repeated (user, product) events are reduced to their highest value, as
+    pivot_table(aggfunc='max') did. Rows follow `users` when given (events
+    of other users are dropped), otherwise the sorted user IDs; columns are
+    the sorted product IDs. Returns (matrix, users, products).
+    """
+    events = pd.DataFrame({
+        'UserId': pd.Series(user_ids, dtype=object).to_numpy(),
+        'ProductId': pd.Series(product_ids, dtype=object).to_numpy(),
+        'Value': np.asarray(values, dtype=np.float32),
+    })
+    if users is not None:
+        users = pd.Index(users, dtype=object)
+        events = events[events['UserId'].isin(users)]
+        user_codes = users.get_indexer(events['UserId'])
+    else:
+        user_codes, users = pd.factorize(events['UserId'], sort=True)
+    product_codes, products = pd.factorize(events['ProductId'], sort=True)
+
+    codes = pd.DataFrame({'user': user_codes, 'product': product_codes, 'value': events['Value'].to_numpy()})
+    codes = codes.sort_values('value', kind='stable').drop_duplicates(subset=['user', 'product'], keep='last')
+    matrix = sparse.csr_matrix(
+        (codes['value'].to_numpy(), (codes['user'].to_numpy(), codes['product'].to_numpy())),
+        shape=(len(users), len(products))
+    )
+    matrix.eliminate_zeros()
+    return matrix, users, products
+
+
+def _extend_ids(ids, row_of, new_ids):
+    """Append IDs not yet in `row_of`; returns (ids, row_of, positions of new_ids)."""
+    unseen = [i for i in dict.fromkeys(new_ids) if i not in row_of]
+    if unseen:
+        row_of = {**row_of, **{i: len(ids) + n for n, i in enumerate(unseen)}}
+        ids = np.concatenate([ids, np.asarray(unseen, dtype=object)])
+    return ids, row_of, np.fromiter((row_of[i] for i in new_ids), dtype=np.int64, count=len(new_ids))
+
+
+class FeedbackIndex:
+    """Which products each user liked, as a binary user x product CSR matrix.
+
+    Row `i` is `user_ids[i]`, column `j` is `product_ids[j]`. Instances are not
+    modified once built; `with_feedback` returns an updated copy, so readers
+    can keep using the index they hold while a new one is swapped in.
+    """
+
+    def __init__(self, user_ids, product_ids, likes, user_row=None, product_col=None):
+        self.user_ids = np.asarray(user_ids, dtype=object)
+        self.product_ids = np.asarray(product_ids, dtype=object)
+        self.likes = likes
+        self.user_row = user_row if user_row is not None else {u: i for i, u in enumerate(self.user_ids)}
+        self.product_col = product_col if product_col is not None else {p: j for j, p in enumerate(self.product_ids)}
+
+    @classmethod
+    def build(cls, user_ids, product_ids):
+        """Index the liked (user, product) pairs; duplicate pairs are counted once."""
+        user_codes, users = pd.factorize(pd.Series(user_ids, dtype=object))
+        product_codes, products = pd.factorize(pd.Series(product_ids, dtype=object))
+        likes = sparse.csr_matrix(
+            (np.ones(len(user_codes), dtype=np.int8), (user_codes, product_codes)),
+            shape=(len(users), len(products))
+        )
+        likes.sum_duplicates()
+        likes.data[:] = 1
+        logger.info(f"Feedback index built: {len(users)} users, {len(products)} products, {likes.nnz} likes")
+        return cls(users.to_numpy(dtype=object), products.to_numpy(dtype=object), likes)
+
+    @property
+    def n_likes(self):
+        return self.likes.nnz
+
+    def liked_columns(self, user_id):
+        row = self.user_row.get(user_id)
+        if row is None:
+            return np.zeros(0, dtype=self.likes.indices.dtype)
+        return self.likes.indices[self.likes.indptr[row]:self.likes.indptr[row + 1]]
+
+    def liked_products(self, user_id):
+        return self.product_ids[self.liked_columns(user_id)]
+
+    def new_products_from(self, user_id, neighbor_ids):
+        """Products liked by any of `neighbor_ids` that `user_id` has not liked."""
+        rows = [self.user_row[n] for n in neighbor_ids if n in self.user_row]
+        if not rows:
+            return self.product_ids[:0]
+        # Slicing the neighbor rows gathers all their likes in one pass
+        candidates = np.unique(self.likes[rows].indices)
+        own = self.liked_columns(user_id)
+        return self.product_ids[np.setdiff1d(candidates, own, assume_unique=True)]
+
+    def weighted_likes(self, neighbor_ids, weights):
+        """Per product, the summed `weights` of the `neighbor_ids` that liked it.
+
+        Returns (product_ids, scores) for the products liked by at least one
+        of the neighbors.
+        """
+        known = [(self.user_row[n], w) for n, w in zip(neighbor_ids, weights) if n in self.user_row]
+        if not known:
+            return self.product_ids[:0], np.zeros(0)
+        rows, row_weights = zip(*known)
+        summed = (sparse.csr_matrix(np.asarray([row_weights], dtype=np.float64)) @ self.likes[list(rows)]).tocoo()
+        return self.product_ids[summed.col], summed.data
+
+    def with_feedback(self, user_ids, product_ids, liked):
+        """A copy with the given feedback events applied in order.
+
+        A like adds the (user, product) pair, anything else removes it; of
+        several events for the same pair the last one wins. Users and products
+        not seen before are appended.
+        """
+        events = pd.DataFrame({
+            'UserId': pd.Series(user_ids, dtype=object),
+            'ProductId': pd.Series(product_ids, dtype=object),
+            'IsLiked': np.asarray(liked, dtype=bool),
+        }).drop_duplicates(subset=['UserId', 'ProductId'], keep='last')
+        if events.empty:
+            return self
+
+        user_ids, user_row, rows = _extend_ids(self.user_ids, self.user_row, events['UserId'].tolist())
+        product_ids, product_col, cols = _extend_ids(self.product_ids, self.product_col, events['ProductId'].tolist())
+        shape = (len(user_ids), len(product_ids))
+
+        likes = self.likes.copy()
+        likes.resize(shape)
+        # Clear every touched pair, then set the ones that end up liked
+        touched = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=shape)
+        is_liked = events['IsLiked'].to_numpy()
+        added = sparse.csr_matrix(
+            (np.ones(int(is_liked.sum()), dtype=np.int8), (rows[is_liked], cols[is_liked])), shape=shape
+        )
+        likes = (likes - likes.multiply(touched) + added).tocsr()
+        likes.eliminate_zeros()
+        likes.sort_indices()
+        return FeedbackIndex(user_ids, product_ids, likes.astype(np.int8), user_row, product_col)
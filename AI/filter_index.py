@@ -0,0 +1,212 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Sentinels for missing validity dates: an open start or end never excludes a product
+MIN_TIMESTAMP = np.iinfo(np.int64).min
+MAX_TIMESTAMP = np.iinfo(np.int64).max
+
+
+def normalize_value(value):
+    return str(value).strip().lower()
+
+
+def as_list(values):
+    if values is None:
+        return []
+    if isinstance(values, str):
+        return [values] if values.strip() else []
+    return [v for v in values if v is not None and str(v).strip()]
+
+
+def to_timestamps(values, fill):
+    stamps = pd.to_datetime(pd.Series(values), errors='coerce')
+    result = stamps.to_numpy(dtype='datetime64[s]').astype(np.int64)
+    result[stamps.isna().to_numpy()] = fill
+    return result
+
+
+class FilterIndex:
+    """Columnar hard filters over the product catalog.
+
+    Categories are kept as an inverted index (category -> sorted product rows),
+    supply type and unit of measure as integer codes, and quantity and validity
+    dates as sorted arrays so range constraints are two binary searches. Every
+    constraint produces a boolean mask; masks are AND-ed across constraints and
+    OR-ed across the values within one constraint.
+    """
+
+    def __init__(self, n_products, category_values, category_offsets, category_rows,
+                 supply_values, supply_codes, unit_values, unit_codes,
+                 quantity_sorted, quantity_order, valid_from_sorted, valid_from_order,
+                 valid_to_sorted, valid_to_order):
+        self.n_products = int(n_products)
+        self.category_values = [str(v) for v in category_values]
+        self.category_offsets = category_offsets
+        self.category_rows = category_rows
+        self.supply_values = [str(v) for v in supply_values]
+        self.supply_codes = supply_codes
+        self.unit_values = [str(v) for v in unit_values]
+        self.unit_codes = unit_codes
+        self.quantity_sorted = quantity_sorted
+        self.quantity_order = quantity_order
+        self.valid_from_sorted = valid_from_sorted
+        self.valid_from_order = valid_from_order
+        self.valid_to_sorted = valid_to_sorted
+        self.valid_to_order = valid_to_order
+
+        self._category_lookup = {v: i for i, v in enumerate(self.category_values)}
+        self._supply_lookup = {v: i for i, v in enumerate(self.supply_values)}
+        self._unit_lookup = {v: i for i, v in enumerate(self.unit_values)}
+
+    @classmethod
+    def build(cls, categories, supply_types, units, quantities, valid_from, valid_to):
+        n_products = len(supply_types)
+
+        # Inverted index: one sorted row array per category, stored CSR-style
+        category_rows_per_value = {}
+        for row, product_categories in enumerate(categories):
+            for category in as_list(product_categories):
+                category_rows_per_value.setdefault(normalize_value(category), []).append(row)
+        category_values = sorted(category_rows_per_value)
+        lengths = [len(category_rows_per_value[v]) for v in category_values]
+        category_offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        category_rows = np.fromiter(
+            (row for v in category_values for row in category_rows_per_value[v]),
+            dtype=np.int32, count=int(category_offsets[-1])
+        )
+
+        supply_codes, supply_values = pd.factorize(
+            pd.Series(supply_types, dtype=object).fillna('').map(normalize_value)
+        )
+        unit_codes, unit_values = pd.factorize(
+            pd.Series(units, dtype=object).fillna('').map(normalize_value)
+        )
+
+        quantities = pd.to_numeric(pd.Series(quantities), errors='coerce').fillna(0).to_numpy(dtype=np.float64)
+        valid_from = to_timestamps(valid_from, MIN_TIMESTAMP)
+        valid_to = to_timestamps(valid_to, MAX_TIMESTAMP)
+        quantity_order = np.argsort(quantities, kind='stable').astype(np.int32)
+        valid_from_order = np.argsort(valid_from, kind='stable').astype(np.int32)
+        valid_to_order = np.argsort(valid_to, kind='stable').astype(np.int32)
+
+        index = cls(
+            n_products,
+            category_values, category_offsets, category_rows,
+            list(supply_values), supply_codes.astype(np.int32),
+            list(unit_values), unit_codes.astype(np.int32),
+            quantities[quantity_order], quantity_order,
+            valid_from[valid_from_order], valid_from_order,
+            valid_to[valid_to_order], valid_to_order,
+        )
+        logger.info(
+            f"Filter index built: {len(category_values)} categories, "
+            f"{len(supply_values)} supply types, {len(unit_values)} units"
+        )
+        return index
+
+    def arrays(self):
+        return {
+            'n_products': np.array(self.n_products),
+            'category_values': np.array(self.category_values, dtype=str),
+            'category_offsets': self.category_offsets,
+            'category_rows': self.category_rows,
+            'supply_values': np.array(self.supply_values, dtype=str),
+            'supply_codes': self.supply_codes,
+            'unit_values': np.array(self.unit_values, dtype=str),
+            'unit_codes': self.unit_codes,
+            'quantity_sorted': self.quantity_sorted,
+            'quantity_order': self.quantity_order,
+            'valid_from_sorted': self.valid_from_sorted,
+            'valid_from_order': self.valid_from_order,
+            'valid_to_sorted': self.valid_to_sorted,
+            'valid_to_order': self.valid_to_order,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(**arrays)
+
+    def _resolve(self, values, lookup):
+        # Preferences seeded from the database may hold several values joined
+        # with ", " in one string; fall back to the parts when the whole string
+        # is not a known value.
+        codes = set()
+        for value in as_list(values):
+            key = normalize_value(value)
+            if key in lookup:
+                codes.add(lookup[key])
+                continue
+            for part in key.split(','):
+                part = part.strip()
+                if part in lookup:
+                    codes.add(lookup[part])
+        return np.fromiter(codes, dtype=np.int32, count=len(codes))
+
+    def category_mask(self, values):
+        mask = np.zeros(self.n_products, dtype=bool)
+        for code in self._resolve(values, self._category_lookup):
+            mask[self.category_rows[self.category_offsets[code]:self.category_offsets[code + 1]]] = True
+        return mask
+
+    def supply_type_mask(self, values):
+        return np.isin(self.supply_codes, self._resolve(values, self._supply_lookup))
+
+    def unit_mask(self, values):
+        return np.isin(self.unit_codes, self._resolve(values, self._unit_lookup))
+
+    def _range_mask(self, sorted_values, order, low=None, high=None):
+        lo = 0 if low is None else np.searchsorted(sorted_values, low, side='left')
+        hi = len(sorted_values) if high is None else np.searchsorted(sorted_values, high, side='right')
+        mask = np.zeros(self.n_products, dtype=bool)
+        mask[order[lo:hi]] = True
+        return mask
+
+    def quantity_mask(self, minimum=None, maximum=None):
+        return self._range_mask(self.quantity_sorted, self.quantity_order, minimum, maximum)
+
+    def validity_mask(self, valid_from=None, valid_to=None):
+        """Products whose validity period overlaps the preferred window."""
+        mask = np.ones(self.n_products, dtype=bool)
+        if valid_to is not None:
+            mask &= self._range_mask(
+                self.valid_from_sorted, self.valid_from_order,
+                high=to_timestamps([valid_to], MAX_TIMESTAMP)[0]
+            )
+        if valid_from is not None:
+            mask &= self._range_mask(
+                self.valid_to_sorted, self.valid_to_order,
+                low=to_timestamps([valid_from], MIN_TIMESTAMP)[0]
+            )
+        return mask
+
+    def mask(self, preferences):
+        """Boolean mask of products satisfying every hard constraint, or None if there are none."""
+        masks = []
+
+        if as_list(preferences.get('PreferredCategories')):
+            masks.append(self.category_mask(preferences['PreferredCategories']))
+        if as_list(preferences.get('PreferredSupplyType')):
+            masks.append(self.supply_type_mask(preferences['PreferredSupplyType']))
+        if as_list(preferences.get('PreferredUnitOfMeasures')):
+            masks.append(self.unit_mask(preferences['PreferredUnitOfMeasures']))
+
+        minimum = preferences.get('MinimumAvailableQuantity')
+        maximum = preferences.get('MaximumAvailableQuantity')
+        minimum = float(minimum) if minimum not in (None, '') and float(minimum) > 0 else None
+        maximum = float(maximum) if maximum not in (None, '') and np.isfinite(float(maximum)) else None
+        if minimum is not None or maximum is not None:
+            masks.append(self.quantity_mask(minimum, maximum))
+
+        if preferences.get('PreferredValidFrom') or preferences.get('PreferredValidTo'):
+            masks.append(self.validity_mask(
+                preferences.get('PreferredValidFrom') or None,
+                preferences.get('PreferredValidTo') or None
+            ))
+
+        if not masks:
+            return None
+        return np.logical_and.reduce(masks)
@@ -6,6 +6,8 @@ from sklearn.preprocessing import MinMaxScaler
 from flask import Flask, request, jsonify
 from datetime import datetime
 
+from ranking import top_k_indices
+
 app = Flask(__name__)
 
 class ContentBasedRecommender:
@@ -101,36 +103,28 @@ class ContentBasedRecommender:
         filtered_df.rename(columns={'index': 'original_index'}, inplace=True)
         seed_row_original_index = filtered_df.loc[0, 'original_index']
         
+        # Only score the rows that survived the filters, minus the seed row itself
+        candidate_rows = filtered_df['original_index'].to_numpy()
+        candidate_rows = candidate_rows[candidate_rows != seed_row_original_index]
+        if len(candidate_rows) == 0:
+            return []
+
         content_sim = cosine_similarity(
             self.content_matrix[seed_row_original_index],  # row from the entire dataset
-            self.content_matrix
+            self.content_matrix[candidate_rows]
         )[0]
 
         numerical_sim = cosine_similarity(
             self.numerical_features_scaled[seed_row_original_index].reshape(1, -1), 
-            self.numerical_features_scaled
+            self.numerical_features_scaled[candidate_rows]
         )[0]
 
         combined_sim = 0.7 * content_sim + 0.3 * numerical_sim
 
-        # Sort all rows in descending order of similarity
-        overall_ranking = np.argsort(combined_sim)[::-1]  # highest similarity first
-        valid_orig_indices = set(filtered_df['original_index'].values)
-
-        # Filter out the seed row itself and keep only the top_n from the valid subset
-        recommendations = []
-        for idx in overall_ranking:
-            if idx == seed_row_original_index:
-                continue  # skip the seed row itself
-            if idx in valid_orig_indices:
-                recommendations.append(idx)
-            if len(recommendations) == top_n:
-                break
-
-        # If no recommendations found, return empty
-        if not recommendations:
-            return []
-        recommended_rows = filtered_df[filtered_df['original_index'].isin(recommendations)] 
+        # Partial selection of the top_n candidates instead of sorting everything
+        recommendations = candidate_rows[top_k_indices(combined_sim, top_n)]
+        # Look the rows up in that order; an isin() mask would return them in catalog order
+        recommended_rows = filtered_df.set_index('original_index', drop=False).loc[recommendations]
         return recommended_rows
 
 df = pd.read_excel('RESOURCES_CLEANED.xlsx')
@@ -0,0 +1,118 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat, lon, lats_rad, lons_rad):
+    """Great-circle distance in km from one point (degrees) to arrays of points (radians)."""
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    dlat = lats_rad - lat
+    dlon = lons_rad - lon
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat) * np.cos(lats_rad) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class GeoIndex:
+    """Distance lookups over product locations.
+
+    Products share a `Locations` row through their company, so coordinates are
+    stored once per site and products only keep the position of their site.
+    Distance work (vectorized haversine and the BallTree radius query) is
+    therefore proportional to the number of sites, not products.
+    """
+
+    def __init__(self, product_site, site_lat_rad, site_lon_rad):
+        self.product_site = np.asarray(product_site, dtype=np.int32).ravel()
+        self.site_lat_rad = np.asarray(site_lat_rad, dtype=np.float64)
+        self.site_lon_rad = np.asarray(site_lon_rad, dtype=np.float64)
+
+        # Products grouped by site, so a set of sites maps to product rows
+        # with one concatenation.
+        self._site_order = np.argsort(self.product_site, kind='stable').astype(np.int32)
+        counts = np.bincount(self.product_site, minlength=self.n_sites)
+        self._site_offsets = np.concatenate([[0], np.cumsum(counts)])
+
+        if self.n_sites > 0:
+            self.tree = BallTree(
+                np.column_stack([self.site_lat_rad, self.site_lon_rad]),
+                metric='haversine'
+            )
+        else:
+            self.tree = None
+
+        logger.info(f"Geo index built for {len(self.product_site)} products over {self.n_sites} sites")
+
+    @classmethod
+    def build(cls, latitudes, longitudes, location_ids=None):
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+
+        if location_ids is not None:
+            product_site, _ = pd.factorize(pd.Series(location_ids), use_na_sentinel=False)
+            _, first_rows = np.unique(product_site, return_index=True)
+        else:
+            coords = np.column_stack([latitudes, longitudes])
+            _, first_rows, product_site = np.unique(
+                coords, axis=0, return_index=True, return_inverse=True
+            )
+
+        return cls(
+            product_site,
+            np.radians(latitudes[first_rows]),
+            np.radians(longitudes[first_rows])
+        )
+
+    def arrays(self):
+        return {
+            'product_site': self.product_site,
+            'site_lat_rad': self.site_lat_rad,
+            'site_lon_rad': self.site_lon_rad,
+        }
+
+    @property
+    def n_sites(self):
+        return len(self.site_lat_rad)
+
+    def site_distances(self, lat, lon):
+        return haversine_km(lat, lon, self.site_lat_rad, self.site_lon_rad)
+
+    def distances(self, lat, lon, rows=None):
+        """Distance in km from (lat, lon) to every product, or only to `rows`."""
+        sites = self.product_site if rows is None else self.product_site[rows]
+        if len(sites) == 0:
+            return np.zeros(0)
+        unique_sites, inverse = np.unique(sites, return_inverse=True)
+        site_lat = self.site_lat_rad[unique_sites]
+        site_lon = self.site_lon_rad[unique_sites]
+        return haversine_km(lat, lon, site_lat, site_lon)[inverse]
+
+    def within_radius(self, lat, lon, radius_km):
+        """Product rows within `radius_km` of (lat, lon), in catalog order, with their distances."""
+        if self.tree is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        sites, site_dist = self.tree.query_radius(
+            np.radians([[lat, lon]]),
+            r=radius_km / EARTH_RADIUS_KM,
+            return_distance=True
+        )
+        sites, site_dist = sites[0], site_dist[0] * EARTH_RADIUS_KM
+        if len(sites) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        starts = self._site_offsets[sites]
+        ends = self._site_offsets[sites + 1]
+        lengths = ends - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        rows = self._site_order[positions].astype(np.int64)
+        distances = np.repeat(site_dist, lengths)
+
+        order = np.argsort(rows, kind='stable')
+        return rows[order], distances[order]
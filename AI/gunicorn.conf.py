@@ -0,0 +1,49 @@
+"""Gunicorn settings for the recommendation API.
+
+The app is preloaded in the master, which builds (or maps) the catalog index
+once; workers are forked afterwards and share it copy-on-write, or through
+the page cache when it is mapped from INDEX_DIR. One sync worker per core
+lets scoring run in parallel instead of serializing on the GIL.
+"""
+import gc
+import multiprocessing
+import os
+import signal
+
+# One BLAS/OpenMP thread per worker; parallelism comes from the processes
+for _var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(_var, '1')
+
+bind = os.getenv('BIND', '0.0.0.0:6000')
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('WORKER_THREADS', '1'))
+timeout = int(os.getenv('WORKER_TIMEOUT', '120'))
+max_requests = int(os.getenv('WORKER_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+preload_app = True
+
+_maintenance = None
+
+
+def when_ready(server):
+    global _maintenance
+    from recommender_system_v3 import start_maintenance_process
+
+    # Objects created while preloading are never collected; freezing them
+    # keeps the collector from touching, and so copying, their pages in workers
+    gc.freeze()
+    _maintenance = start_maintenance_process()
+
+
+def post_fork(server, worker):
+    from recommender_system_v3 import init_worker
+
+    init_worker()
+
+
+def on_exit(server):
+    if _maintenance is not None:
+        try:
+            os.kill(_maintenance, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import MinMaxScaler
+
+from ann_index import LSAIndex
+from catalog_snapshot import CatalogSnapshot
+from content_index import ContentIndex
+from filter_index import FilterIndex
+from geo_index import GeoIndex
+
+logger = logging.getLogger(__name__)
+
+# Bump when the directory layout or array semantics change; older artifacts
+# are then ignored and the catalog is rebuilt from the database.
+INDEX_FORMAT_VERSION = 2
+CURRENT_POINTER = 'CURRENT'
+KEEP_ARTIFACTS = 2
+
+SCALER_ATTRIBUTES = ['min_', 'scale_', 'data_min_', 'data_max_', 'data_range_']
+
+
+def _json_safe_params(vectorizer):
+    params = {}
+    for key, value in vectorizer.get_params().items():
+        if key == 'dtype':
+            params[key] = np.dtype(value).name
+        elif isinstance(value, (str, int, float, bool, type(None))):
+            params[key] = value
+        elif isinstance(value, tuple):
+            params[key] = list(value)
+    return params
+
+
+def _column_arrays(series):
+    """Split a catalog column into (kind, arrays) that np.save can store without pickling."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        if len(categories) and isinstance(categories[0], tuple):
+            kind, values = 'tuple_category', [json.dumps(list(c)) for c in categories]
+        else:
+            kind, values = 'category', [str(c) for c in categories]
+        return kind, {'codes': series.cat.codes.to_numpy(dtype=np.int32), 'categories': np.array(values, dtype=str)}
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return 'datetime', {'values': series.to_numpy(dtype='datetime64[s]')}
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return 'numeric', {'values': series.to_numpy()}
+    return 'string', {'values': series.fillna('').astype(str).to_numpy(dtype=str)}
+
+
+def _column_from_arrays(kind, arrays):
+    if kind in ('category', 'tuple_category'):
+        if kind == 'tuple_category':
+            categories = pd.Index(
+                [tuple(json.loads(c)) for c in arrays['categories'].tolist()], dtype=object, tupleize_cols=False
+            )
+        else:
+            categories = pd.Index(arrays['categories'].tolist())
+        return pd.Categorical.from_codes(np.asarray(arrays['codes']), categories)
+    if kind == 'string':
+        return np.asarray(arrays['values']).astype(object)
+    return arrays['values']
+
+
+def _save_arrays(path, prefix, arrays):
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'{prefix}_{name}.npy'), np.asarray(array), allow_pickle=False)
+
+
+def _load_arrays(path, prefix, names, mmap_mode):
+    return {
+        name: np.load(os.path.join(path, f'{prefix}_{name}.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+        for name in names
+    }
+
+
+def save_snapshot(snapshot, root_dir, full_refit_at):
+    """Write `snapshot` as a new versioned artifact and make it current.
+
+    `full_refit_at` is the time (epoch seconds) of the full refit the
+    snapshot descends from; delta syncs pass on that of their parent, so it
+    only moves when the vocabulary is refit. The artifact is written to a
+    temporary directory and renamed into place, then the CURRENT pointer is
+    replaced, so readers never see a partial artifact.
+    """
+    os.makedirs(root_dir, exist_ok=True)
+    name = f'v{snapshot.version}-{int(time.time())}-{os.getpid()}'
+    tmp_path = os.path.join(root_dir, f'.tmp-{name}')
+    final_path = os.path.join(root_dir, name)
+    os.makedirs(tmp_path)
+
+    try:
+        df = snapshot.df
+        content_index = snapshot.content_index
+        matrix = content_index.matrix
+
+        _save_arrays(tmp_path, 'content', {
+            'data': matrix.data,
+            'indices': matrix.indices,
+            'indptr': matrix.indptr,
+            'idf': content_index.vectorizer.idf_,
+            'terms': content_index.feature_names.astype(str),
+        })
+        if content_index.ann is not None:
+            _save_arrays(tmp_path, 'ann', content_index.ann.arrays())
+        _save_arrays(tmp_path, 'geo', snapshot.geo_index.arrays())
+        _save_arrays(tmp_path, 'filter', snapshot.filter_index.arrays())
+        _save_arrays(tmp_path, 'scaler', {
+            attribute: getattr(snapshot.scaler, attribute) for attribute in SCALER_ATTRIBUTES
+        })
+
+        _save_arrays(tmp_path, 'products', {
+            'active_mask': snapshot.active_mask,
+            'numerical': snapshot.numerical_features_scaled,
+        })
+        columns = {}
+        for column in df.columns:
+            kind, arrays = _column_arrays(df[column])
+            columns[column] = kind
+            _save_arrays(tmp_path, f'column_{column}', arrays)
+
+        manifest = {
+            'format_version': INDEX_FORMAT_VERSION,
+            'catalog_version': snapshot.version,
+            'created_at': time.time(),
+            'full_refit_at': float(full_refit_at),
+            'n_products': int(matrix.shape[0]),
+            'n_features': int(matrix.shape[1]),
+            'sync_watermark': None if snapshot.sync_watermark is None else str(snapshot.sync_watermark),
+            'default_query': snapshot.default_query,
+            'columns': columns,
+            'tfidf_params': _json_safe_params(content_index.vectorizer),
+            'ann_index': content_index.ann is not None,
+            'scaler_feature_names': [str(f) for f in snapshot.scaler.feature_names_in_],
+            'scaler_n_samples_seen': int(snapshot.scaler.n_samples_seen_),
+        }
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        os.rename(tmp_path, final_path)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    pointer_tmp = os.path.join(root_dir, f'.{CURRENT_POINTER}.{os.getpid()}')
+    with open(pointer_tmp, 'w') as f:
+        f.write(name)
+    os.replace(pointer_tmp, os.path.join(root_dir, CURRENT_POINTER))
+
+    _prune_artifacts(root_dir, keep=name)
+    logger.info(f"Saved catalog index artifact {final_path}")
+    return final_path
+
+
+def _prune_artifacts(root_dir, keep):
+    # Processes that still map an older artifact keep working: removing the
+    # directory only unlinks the files.
+    artifacts = sorted(
+        (entry for entry in os.listdir(root_dir) if entry.startswith('v') and entry != keep),
+        key=lambda entry: os.path.getmtime(os.path.join(root_dir, entry)),
+        reverse=True
+    )
+    for entry in artifacts[KEEP_ARTIFACTS - 1:]:
+        shutil.rmtree(os.path.join(root_dir, entry), ignore_errors=True)
+
+
+def current_artifact(root_dir):
+    """Path of the current artifact under `root_dir`, or None if there is no usable one."""
+    try:
+        with open(os.path.join(root_dir, CURRENT_POINTER)) as f:
+            path = os.path.join(root_dir, f.read().strip())
+    except OSError:
+        return None
+
+    manifest = read_manifest(path)
+    if manifest is None or manifest.get('format_version') != INDEX_FORMAT_VERSION:
+        return None
+    return path
+
+
+def read_manifest(path):
+    try:
+        with open(os.path.join(path, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_snapshot(path, mmap_mode='r'):
+    """Load an artifact written by `save_snapshot`.
+
+    With `mmap_mode='r'` the large arrays (CSR matrix, filter and geo arrays)
+    are memory-mapped read-only, so loading is independent of catalog size and
+    every process mapping the same artifact shares one copy in the page cache.
+    """
+    manifest = read_manifest(path)
+    if manifest is None or manifest.get('format_version') != INDEX_FORMAT_VERSION:
+        raise ValueError(f"No compatible catalog index artifact at {path}")
+
+    content = _load_arrays(path, 'content', ['data', 'indices', 'indptr', 'idf', 'terms'], mmap_mode)
+    params = manifest['tfidf_params']
+    params['ngram_range'] = tuple(params['ngram_range'])
+    params['dtype'] = np.dtype(params['dtype']).type
+    vectorizer = TfidfVectorizer(**params)
+    vectorizer.vocabulary_ = {term: i for i, term in enumerate(content['terms'].tolist())}
+    vectorizer.idf_ = np.asarray(content['idf'])
+    matrix = sparse.csr_matrix(
+        (content['data'], content['indices'], content['indptr']),
+        shape=(manifest['n_products'], manifest['n_features']),
+        copy=False
+    )
+    matrix.has_sorted_indices = True
+    ann = None
+    if manifest.get('ann_index'):
+        ann = LSAIndex(**_load_arrays(
+            path, 'ann', ['components', 'centroids', 'list_offsets', 'list_rows', 'embeddings'], mmap_mode
+        ))
+    content_index = ContentIndex(vectorizer, matrix, normalized=True, ann=ann)
+
+    geo_index = GeoIndex(**_load_arrays(path, 'geo', ['product_site', 'site_lat_rad', 'site_lon_rad'], mmap_mode))
+    filter_names = [
+        'n_products', 'category_values', 'category_offsets', 'category_rows',
+        'supply_values', 'supply_codes', 'unit_values', 'unit_codes',
+        'quantity_sorted', 'quantity_order', 'valid_from_sorted', 'valid_from_order',
+        'valid_to_sorted', 'valid_to_order'
+    ]
+    filter_index = FilterIndex.from_arrays(_load_arrays(path, 'filter', filter_names, mmap_mode))
+
+    scaler = MinMaxScaler()
+    for attribute, value in _load_arrays(path, 'scaler', SCALER_ATTRIBUTES, None).items():
+        setattr(scaler, attribute, value)
+    scaler.n_features_in_ = len(manifest['scaler_feature_names'])
+    scaler.feature_names_in_ = np.array(manifest['scaler_feature_names'], dtype=object)
+    scaler.n_samples_seen_ = manifest['scaler_n_samples_seen']
+
+    products = _load_arrays(path, 'products', ['active_mask', 'numerical'], mmap_mode)
+    df = pd.DataFrame({
+        column: _column_from_arrays(kind, _load_arrays(
+            path, f'column_{column}',
+            ['codes', 'categories'] if kind.endswith('category') else ['values'], mmap_mode
+        ))
+        for column, kind in manifest['columns'].items()
+    })
+
+    sync_watermark = manifest.get('sync_watermark')
+    snapshot = CatalogSnapshot(
+        manifest['catalog_version'], df, content_index, geo_index, filter_index, scaler,
+        products['numerical'], np.array(products['active_mask'], dtype=bool),
+        pd.Timestamp(sync_watermark) if sync_watermark else None,
+        manifest.get('default_query', '')
+    )
+    logger.info(f"Loaded catalog index artifact {path} ({manifest['n_products']} products)")
+    return snapshot, manifest
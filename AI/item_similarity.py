@@ -0,0 +1,112 @@
+import logging
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from artifact_store import save_npz
+from ranking import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+# Bump when the arrays stored in the artifact change meaning
+ITEM_SIMILARITY_FORMAT_VERSION = 1
+
+
+def item_neighbors(likes, k, block_rows=2000):
+    """Sparse top-`k` co-like neighbors per product.
+
+    `likes` is a user x product matrix. Two products are similar by the cosine
+    of their columns, i.e. by how many users liked both relative to their
+    popularity. Products are processed in blocks of `block_rows`; each block's
+    similarities stay sparse (only co-liked pairs exist), and of each row only
+    the `k` best positive entries are kept.
+
+    Returns a product x product CSR matrix with at most `k` entries per row.
+    """
+    items = normalize(sparse.csr_matrix(likes, dtype=np.float32).T.tocsr(), norm='l2')
+    n_items = items.shape[0]
+    rows, cols, values = [], [], []
+    for start in range(0, n_items, block_rows):
+        similarity = (items[start:start + block_rows] @ items.T).tocoo()
+        row = similarity.row.astype(np.int64) + start
+        # A product is not its own neighbor
+        keep = (similarity.col != row) & (similarity.data > 0)
+        row, col, value = row[keep], similarity.col[keep], similarity.data[keep]
+
+        # Best first within each row (ties by position), then the first k per row
+        order = np.lexsort((col, -value, row))
+        row, col, value = row[order], col[order], value[order]
+        rank = np.arange(len(row)) - np.searchsorted(row, row)
+        keep = rank < k
+        rows.append(row[keep])
+        cols.append(col[keep])
+        values.append(value[keep])
+
+    matrix = sparse.csr_matrix(
+        (np.concatenate(values or [np.zeros(0, np.float32)]),
+         (np.concatenate(rows or [np.zeros(0, np.int64)]), np.concatenate(cols or [np.zeros(0, np.int64)]))),
+        shape=(n_items, n_items), dtype=np.float32
+    )
+    logger.info(f"Item neighbors computed for {n_items} products, {matrix.nnz} pairs")
+    return matrix
+
+
+class ItemSimilarityModel:
+    """Item-item collaborative model: "users who liked this also liked".
+
+    Row `i` of `similarity` holds the top co-like neighbors of
+    `product_ids[i]`. A user's candidates are scored by summing the neighbor
+    rows of the products they liked, so a lookup costs O(likes x k)
+    regardless of the number of users.
+    """
+
+    def __init__(self, product_ids, similarity):
+        self.product_ids = np.asarray(product_ids)
+        self.similarity = similarity
+        self.product_col = {product_id: i for i, product_id in enumerate(self.product_ids.tolist())}
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def recommend(self, liked_product_ids, top_n):
+        """[(ProductId, score)] of the best `top_n` products the user has not liked yet."""
+        liked = np.fromiter(
+            (self.product_col[p] for p in liked_product_ids if p in self.product_col), dtype=np.int64
+        )
+        if len(liked) == 0:
+            return []
+
+        # Gather the neighbor rows of all liked products and add them up
+        neighbors = self.similarity[liked].tocoo()
+        candidates, inverse = np.unique(neighbors.col, return_inverse=True)
+        scores = np.bincount(inverse, weights=neighbors.data, minlength=len(candidates))
+
+        unseen = ~np.isin(candidates, liked)
+        candidates, scores = candidates[unseen], scores[unseen]
+        top = top_k_indices(scores, top_n)
+        return list(zip(self.product_ids[candidates[top]].tolist(), scores[top].tolist()))
+
+
+def save_item_similarity(path, product_ids, similarity):
+    similarity = sparse.csr_matrix(similarity, dtype=np.float32)
+    save_npz(
+        path,
+        format_version=np.int32(ITEM_SIMILARITY_FORMAT_VERSION),
+        product_ids=np.asarray(product_ids, dtype=str),
+        data=similarity.data,
+        indices=similarity.indices,
+        indptr=similarity.indptr,
+    )
+    logger.info(f"Saved item similarity for {len(product_ids)} products to {path}")
+
+
+def load_item_similarity(path):
+    with np.load(path, allow_pickle=False) as arrays:
+        if int(arrays['format_version']) != ITEM_SIMILARITY_FORMAT_VERSION:
+            raise ValueError(f"Unsupported item similarity format in {path}")
+        n_items = len(arrays['product_ids'])
+        similarity = sparse.csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']), shape=(n_items, n_items)
+        )
+        return ItemSimilarityModel(arrays['product_ids'], similarity)
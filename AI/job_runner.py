@@ -0,0 +1,179 @@
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).isoformat(timespec='seconds')
+
+
+def _run(func):
+    """Run `func` in a pool process; returns when it started and finished there."""
+    started = time.time()
+    func()
+    return started, time.time()
+
+
+def write_json(path, data):
+    """Write `data` to `path` as JSON, renamed into place so readers never see a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f'.tmp-{os.getpid()}-{os.path.basename(path)}')
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_job_status(path):
+    """The status last written by a JobRunner to `path`, or None when there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class JobRunner:
+    """Runs offline jobs in process pools, away from the request-serving interpreters.
+
+    Every job belongs to a lane, and every lane is its own pool of worker
+    processes. Worker processes live as long as their pool, so jobs that
+    keep state between runs (e.g. a live model they update) get a lane with
+    a single process: every run finds what the previous one left behind. A
+    lane whose process died is restarted on the next submission.
+
+    A job is never started while its previous run is still going. Per job,
+    the runner records state, run and failure counts, the start, end and
+    duration of the last run, the last success and the last error; when
+    `status_path` is given, every change is also written there as JSON.
+    Jobs publish their results themselves, through atomically replaced
+    artifacts, so a failed run leaves the previous result in place.
+    """
+
+    def __init__(self, lanes, status_path=None, initializer=None, initargs=(), start_method='spawn'):
+        self.lanes = dict(lanes)
+        self.status_path = status_path
+        self.initializer = initializer
+        self.initargs = initargs
+        self._context = multiprocessing.get_context(start_method)
+        self._executors = {}
+        self._jobs = {}
+        self._status = {}
+        self._lock = threading.Lock()
+
+    def register(self, func, lane='default', name=None):
+        """Register a picklable, argument-free module-level function as a job."""
+        if lane not in self.lanes:
+            raise ValueError(f"Unknown job lane: {lane}")
+        name = name or func.__name__
+        self._jobs[name] = (func, lane)
+        self._status[name] = {
+            'lane': lane,
+            'state': 'idle',
+            'runs': 0,
+            'failures': 0,
+            'last_started': None,
+            'last_finished': None,
+            'last_duration_seconds': None,
+            'last_success': None,
+            'last_error': None,
+        }
+        return name
+
+    def _executor(self, lane):
+        executor = self._executors.get(lane)
+        if executor is None:
+            executor = ProcessPoolExecutor(
+                max_workers=self.lanes[lane], mp_context=self._context,
+                initializer=self.initializer, initargs=self.initargs
+            )
+            self._executors[lane] = executor
+        return executor
+
+    def submit(self, name):
+        """Start job `name` unless it is still running. Returns whether it was started."""
+        func, lane = self._jobs[name]
+        with self._lock:
+            status = self._status[name]
+            if status['state'] == 'running':
+                logger.warning(f"Job {name} is still running since {status['last_started']}; skipping this run")
+                return False
+            submitted = time.time()
+            try:
+                try:
+                    future = self._executor(lane).submit(_run, func)
+                except BrokenProcessPool:
+                    # The lane's process died since the last run; start a new one
+                    self._executors.pop(lane, None)
+                    future = self._executor(lane).submit(_run, func)
+            except Exception as e:
+                # Never let a failed submission take down the caller's schedule
+                logger.error(f"Could not start job {name}: {e}")
+                status['state'] = 'failed'
+                status['failures'] += 1
+                status['last_error'] = f"{type(e).__name__}: {e}"
+                self._write_status()
+                return False
+            status['state'] = 'running'
+            status['last_started'] = _timestamp(submitted)
+            self._write_status()
+
+        logger.info(f"Job {name} submitted to the {lane} lane")
+        future.add_done_callback(lambda future: self._finished(name, lane, submitted, future))
+        return True
+
+    def _finished(self, name, lane, submitted, future):
+        error = future.exception()
+        if error is None:
+            # Timed in the pool process, so waiting in the lane's queue is not counted
+            started, finished = future.result()
+        else:
+            started, finished = submitted, time.time()
+        with self._lock:
+            status = self._status[name]
+            status['runs'] += 1
+            status['last_started'] = _timestamp(started)
+            status['last_finished'] = _timestamp(finished)
+            status['last_duration_seconds'] = round(finished - started, 3)
+            if error is None:
+                status['state'] = 'succeeded'
+                status['last_success'] = status['last_finished']
+            else:
+                status['state'] = 'failed'
+                status['failures'] += 1
+                status['last_error'] = f"{type(error).__name__}: {error}"
+                if isinstance(error, BrokenProcessPool) and self._executors.get(lane) is not None:
+                    self._executors.pop(lane)
+            self._write_status()
+
+        if error is None:
+            logger.info(f"Job {name} succeeded in {finished - started:.1f}s")
+        else:
+            logger.error(f"Job {name} failed after {finished - started:.1f}s: {error}")
+            logger.error(''.join(traceback.format_exception(error)))
+
+    def status(self):
+        with self._lock:
+            return {name: dict(status) for name, status in self._status.items()}
+
+    def _write_status(self):
+        if not self.status_path:
+            return
+        try:
+            write_json(self.status_path, {'updated': _timestamp(time.time()), 'jobs': self._status})
+        except OSError as e:
+            logger.error(f"Could not write job status to {self.status_path}: {e}")
+
+    def shutdown(self, wait=True):
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait, cancel_futures=True)
+        self._executors.clear()
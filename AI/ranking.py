@@ -0,0 +1,40 @@
+import numpy as np
+
+
+def top_k_indices(scores, k):
+    """Positions of the `k` highest scores, best first.
+
+    Uses argpartition so only the selected `k` entries are sorted (O(n + k log k)
+    instead of a full O(n log n) argsort). Ties within the selection are
+    ordered by position.
+    """
+    scores = np.asarray(scores)
+
+    n = len(scores)
+    if k is None or k >= n:
+        return np.argsort(-scores, kind='stable')
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    # Sort by score, then by position so the result is deterministic on ties
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
+def top_k_with_ties(scores, k):
+    """Positions of the `k` highest scores plus every position tied with the k-th, best first.
+
+    Cutting at exactly `k` would keep an arbitrary part (the lowest
+    positions) of a run of equal scores, e.g. every row when a query
+    matches no known terms and all scores are 0. Ties are ordered by
+    position.
+    """
+    scores = np.asarray(scores)
+    top = top_k_indices(scores, k)
+    if len(top) == 0 or len(top) == len(scores):
+        return top
+    keep = np.flatnonzero(scores >= scores[top[-1]])
+    if len(keep) == len(top):
+        return top
+    return keep[np.lexsort((keep, -scores[keep]))]
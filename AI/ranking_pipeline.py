@@ -0,0 +1,232 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from catalog_snapshot import FLOAT_COLUMNS
+from filter_index import MAX_TIMESTAMP, MIN_TIMESTAMP, to_timestamps
+from ranking import top_k_indices, top_k_with_ties
+
+logger = logging.getLogger(__name__)
+
+# Column of the available quantity in numerical_features_scaled
+QUANTITY_COLUMN = FLOAT_COLUMNS.index('AvailableQuantity')
+
+
+def _number(value):
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RankingContext:
+    """One request moving through a RankingPipeline.
+
+    Retrieval stages narrow `rows` (catalog rows; None while the whole
+    catalog is a candidate) and keep `distances` and `content_scores`
+    aligned with it through `keep`.
+    """
+
+    def __init__(self, snapshot, preferences, top_n, longitude, latitude, query_vector,
+                 user_id=None, content_sim=None):
+        self.snapshot = snapshot
+        self.preferences = preferences
+        self.top_n = top_n
+        self.longitude = longitude
+        self.latitude = latitude
+        self.query_vector = query_vector
+        self.user_id = user_id
+        # Text scores over the whole catalog, when precomputed (batch scoring)
+        self.content_sim = content_sim
+        self.rows = None
+        self.distances = None
+        self.max_radius = None
+        self.content_scores = None
+
+    def candidate_count(self):
+        return len(self.snapshot) if self.rows is None else len(self.rows)
+
+    def keep(self, positions):
+        """Restrict the candidates to `positions` of the current ones, in that order."""
+        self.rows = positions if self.rows is None else self.rows[positions]
+        if self.distances is not None:
+            self.distances = self.distances[positions]
+        if self.content_scores is not None:
+            self.content_scores = self.content_scores[positions]
+
+
+class RankingPipeline:
+    """Retrieve-then-rerank ranking of catalog products for one request.
+
+    Stage one runs the retrieval stages in order. Each is a callable that
+    narrows the candidates of a RankingContext (hard filters, then text
+    retrieval), so that normally a few hundred are left. Stage two computes
+    every rerank feature on those candidates only: a callable returning a
+    score in [0, 1] per candidate, or None when it does not apply to the
+    request. Candidates are ranked by the weighted mean of the features that
+    apply, so the cost of the features is O(candidates) instead of
+    O(catalog).
+
+    Stages and features are registered by name and can be added, replaced
+    or reweighted independently. Every one of them is timed, with the
+    number of candidates going in and out, in `stats()`.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.features = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, func):
+        """Append (or replace) retrieval stage `name`; `func(context)` narrows the candidates."""
+        self.stages[name] = func
+
+    def add_feature(self, name, func, weight):
+        """Add (or replace) rerank feature `name`; `func(context)` returns scores or None."""
+        self.features[name] = (func, weight)
+
+    def record(self, name, seconds, candidates_in, candidates_out):
+        with self._lock:
+            stats = self._stats.setdefault(name, {
+                'calls': 0, 'seconds': 0.0, 'candidates_in': 0, 'candidates_out': 0
+            })
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['candidates_in'] += candidates_in
+            stats['candidates_out'] += candidates_out
+
+    def stats(self):
+        """Calls, total and mean time, and mean candidates in and out per stage."""
+        with self._lock:
+            return {
+                name: {
+                    'calls': s['calls'],
+                    'total_seconds': s['seconds'],
+                    'mean_ms': 1000 * s['seconds'] / s['calls'],
+                    'mean_candidates_in': s['candidates_in'] / s['calls'],
+                    'mean_candidates_out': s['candidates_out'] / s['calls'],
+                }
+                for name, s in self._stats.items()
+            }
+
+    def rank(self, context):
+        """The context's `top_n` best candidates, best first.
+
+        Returns (positions, scores, features): positions index the
+        candidates left in `context.rows`, and features maps the name of
+        every feature that applied to its scores at those positions.
+        """
+        for name, func in self.stages.items():
+            candidates_in = context.candidate_count()
+            start = time.perf_counter()
+            func(context)
+            self.record(name, time.perf_counter() - start, candidates_in, context.candidate_count())
+            if context.candidate_count() == 0:
+                return np.zeros(0, dtype=np.int64), np.zeros(0), {}
+        if context.rows is None:
+            context.rows = np.arange(len(context.snapshot))
+
+        n_candidates = len(context.rows)
+        features = {}
+        weights = {}
+        for name, (func, weight) in self.features.items():
+            start = time.perf_counter()
+            values = func(context)
+            self.record(name, time.perf_counter() - start, n_candidates, n_candidates)
+            if values is not None and weight > 0:
+                features[name] = np.asarray(values, dtype=np.float64)
+                weights[name] = weight
+
+        start = time.perf_counter()
+        scores = np.zeros(n_candidates)
+        for name, values in features.items():
+            scores += weights[name] * values
+        if weights:
+            scores /= sum(weights.values())
+        top = top_k_indices(scores, context.top_n)
+        self.record('rank', time.perf_counter() - start, n_candidates, len(top))
+        return top, scores[top], {name: values[top] for name, values in features.items()}
+
+
+def text_retrieval(k, n_probe=8, n_candidates=None):
+    """Retrieval stage keeping the `k` (at least top_n) candidates most similar to the query text.
+
+    Uses the precomputed scores of a batch when there are any, else
+    ContentIndex.retrieve: exact sparse scoring of the candidates, or the
+    ANN index with `n_probe` probes and `n_candidates` exactly rescored
+    rows when the catalog has one. Candidates tied with the k-th score are
+    all kept, so when the text does not tell candidates apart (no known
+    query terms, equal scores) the rerank sees every one of them.
+    """
+    def retrieve(context):
+        count = max(k, context.top_n)
+        if context.content_sim is not None:
+            scores = context.content_sim if context.rows is None else context.content_sim[context.rows]
+            positions = top_k_with_ties(scores, count)
+            scores = scores[positions]
+        else:
+            positions, scores = context.snapshot.content_index.retrieve(
+                context.query_vector, count, n_probe, context.rows, n_candidates
+            )
+        context.keep(positions)
+        context.content_scores = scores
+    return retrieve
+
+
+def content_score(context):
+    """Cosine similarity of the product text to the query, from retrieval."""
+    return context.content_scores
+
+
+def distance_score(context):
+    """1 at the requested location down to 0 at the search radius; applies to radius searches."""
+    if context.distances is None or not context.max_radius:
+        return None
+    return 1 - (context.distances / context.max_radius).clip(0, 1)
+
+
+def quantity_fit(context):
+    """How close the available quantity is to the middle of the requested range.
+
+    Compared on the MinMax-scaled quantity, 1 in the middle and 0 at the
+    bounds; applies when a finite maximum quantity is requested.
+    """
+    maximum = _number(context.preferences.get('MaximumAvailableQuantity'))
+    if maximum is None or not np.isfinite(maximum):
+        return None
+    minimum = _number(context.preferences.get('MinimumAvailableQuantity')) or 0.0
+    scaler = context.snapshot.scaler
+    low, high = np.array([minimum, maximum]) * scaler.scale_[QUANTITY_COLUMN] + scaler.min_[QUANTITY_COLUMN]
+    quantities = np.asarray(context.snapshot.numerical_features_scaled[context.rows, QUANTITY_COLUMN])
+    if high <= low:
+        return (np.abs(quantities - low) < 1e-9).astype(np.float64)
+    half_range = (high - low) / 2
+    return 1 - (np.abs(quantities - (low + half_range)) / half_range).clip(0, 1)
+
+
+def validity_overlap(context):
+    """Share of the preferred validity window during which the product is valid.
+
+    Products without a start or end date are open on that side; applies
+    when both ends of the window are requested.
+    """
+    preferred_from = context.preferences.get('PreferredValidFrom')
+    preferred_to = context.preferences.get('PreferredValidTo')
+    if not preferred_from or not preferred_to:
+        return None
+    window_start = to_timestamps([preferred_from], MIN_TIMESTAMP)[0]
+    window_end = to_timestamps([preferred_to], MAX_TIMESTAMP)[0]
+    df = context.snapshot.df
+    valid_from = to_timestamps(df['ValidFrom'].to_numpy()[context.rows], MIN_TIMESTAMP)
+    valid_to = to_timestamps(df['ValidTo'].to_numpy()[context.rows], MAX_TIMESTAMP)
+
+    overlap_start = np.maximum(valid_from, window_start)
+    overlap_end = np.minimum(valid_to, window_end)
+    if window_end <= window_start:
+        return (overlap_end >= overlap_start).astype(np.float64)
+    return ((overlap_end - overlap_start) / (window_end - window_start)).clip(0, 1)
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def normalize_terms(values):
+    if values is None:
+        return ()
+    if isinstance(values, str):
+        values = [values]
+    return tuple(' '.join(str(v).lower().split()) for v in values if v is not None and str(v).strip())
+
+
+def normalize_number(value):
+    if value in (None, ''):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional time-to-live and hit/miss counters."""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class RecommendationCache:
+    """Two-level cache for content recommendations.
+
+    Level one maps the text-bearing preferences to their TF-IDF query vector,
+    level two maps the full request (preferences, rounded location, top_n) to
+    the ranked result. Keys carry the catalog version they were computed
+    against, and both levels are emptied as soon as a new catalog is installed.
+    """
+
+    def __init__(self, query_maxsize=4096, result_maxsize=1024, ttl=600, location_precision=3):
+        self.query_vectors = LRUCache(query_maxsize, ttl)
+        self.results = LRUCache(result_maxsize, ttl)
+        self.location_precision = location_precision
+        self.catalog_version = None
+        self._lock = threading.Lock()
+
+    def set_catalog_version(self, version):
+        with self._lock:
+            if version != self.catalog_version:
+                self.query_vectors.clear()
+                self.results.clear()
+                self.catalog_version = version
+
+    @staticmethod
+    def query_key(preferences):
+        return (
+            normalize_terms(preferences.get('PreferredCategories')),
+            normalize_terms(preferences.get('PreferredSupplyType')),
+            normalize_terms(preferences.get('PreferredUnitOfMeasures')),
+            normalize_terms(preferences.get('PreferredKeywords')),
+        )
+
+    def vector_key(self, version, preferences):
+        return (version,) + self.query_key(preferences)
+
+    def result_key(self, version, preferences, longitude, latitude, top_n, *extra):
+        location = None
+        if longitude is not None and latitude is not None:
+            location = (
+                round(float(longitude), self.location_precision),
+                round(float(latitude), self.location_precision),
+            )
+        return (
+            version,
+            self.query_key(preferences),
+            normalize_number(preferences.get('MinimumAvailableQuantity')),
+            normalize_number(preferences.get('MaximumAvailableQuantity')),
+            normalize_number(preferences.get('MaxSearchRadiusKm')),
+            preferences.get('PreferredValidFrom'),
+            preferences.get('PreferredValidTo'),
+            location,
+            int(top_n),
+        ) + extra
+
+    def stats(self):
+        return {
+            'catalog_version': self.catalog_version,
+            'query_vectors': self.query_vectors.stats(),
+            'results': self.results.stats(),
+        }
@@ -1,22 +1,37 @@
 import pandas as pd
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.compose import make_column_transformer
 from sklearn.preprocessing import MinMaxScaler
 from flask import Flask, request, jsonify
 from datetime import datetime
-import sqlalchemy
 from sqlalchemy import create_engine, text
 import os
-import math
-import ast
 import logging
 import traceback
-from functools import lru_cache
 import time
 import threading
-import re
+import signal
+import schedule
+
+from ann_index import LSAIndex
+from als_model import load_als_model, save_als_model, train_implicit_als
+from artifact_store import ArtifactStore
+from catalog_loader import load_catalog, read_frame, stream_query
+from catalog_snapshot import CatalogSnapshot, SnapshotHolder, concat_catalog, FLOAT_COLUMNS
+from content_index import ContentIndex
+from feedback_index import FeedbackIndex, interaction_matrix
+from item_similarity import item_neighbors, load_item_similarity, save_item_similarity
+from index_store import current_artifact, load_snapshot, save_snapshot
+from job_runner import JobRunner, read_job_status
+from ranking import top_k_indices
+from ranking_pipeline import (
+    RankingContext, RankingPipeline, content_score, distance_score, quantity_fit, text_retrieval,
+    validity_overlap
+)
+from recommendation_cache import RecommendationCache
+from user_similarity import UserNeighborModel, load_user_similarity, save_user_similarity
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -37,6 +52,163 @@ DB_PORT = os.getenv('DB_PORT', '3306')
 DB_USER = os.getenv('DB_USER', 'root')
 DB_PASSWORD = os.getenv('DB_PASSWORD', 'None58-DB')
 DB_NAME = os.getenv('DB_NAME', 'SymbioDb')
+# Full SQLAlchemy URL overriding the DB_* settings, e.g. sqlite:///symbio.db
+# for a stand-in database created with sqlite_standin.py
+DATABASE_URL = os.getenv('DATABASE_URL', '')
+
+# Rows per chunk when streaming the catalog and feedback from the database
+FETCH_CHUNK_ROWS = int(os.getenv('FETCH_CHUNK_ROWS', '10000'))
+
+# Recommendation cache configuration
+CACHE_QUERY_SIZE = int(os.getenv('CACHE_QUERY_SIZE', '4096'))
+CACHE_RESULT_SIZE = int(os.getenv('CACHE_RESULT_SIZE', '1024'))
+CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '600'))
+
+# Upper bound on the dense (users x products) score block in batch scoring
+BATCH_SCORE_CELLS = int(os.getenv('BATCH_SCORE_CELLS', str(8_000_000)))
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', '10000'))
+
+# Catalog refresh: delta sync interval and how often a full TF-IDF refit runs.
+# Products has no modification timestamp, so edits to an existing product
+# are only picked up by the full refit: CATALOG_FULL_REFIT_SECONDS is the
+# upper bound on how stale an edited product can be.
+CATALOG_SYNC_SECONDS = int(os.getenv('CATALOG_SYNC_SECONDS', '300'))
+CATALOG_FULL_REFIT_SECONDS = int(os.getenv('CATALOG_FULL_REFIT_SECONDS', str(24 * 3600)))
+
+# Catalog text preprocessing: with PREPROCESS_WORKERS > 1 (0 = all cores),
+# chunks streamed after the first PREPROCESS_CHUNK_ROWS rows go to a process
+# pool. Serial by default: shipping the raw text to the spawned processes
+# costs more than the vectorized preprocessing itself (benchmark_preprocessing.py:
+# 200k rows on one core in 4.2s serial, 15.2s on 2 and 17.0s on 4 processes).
+PREPROCESS_WORKERS = int(os.getenv('PREPROCESS_WORKERS', '1')) or None
+PREPROCESS_CHUNK_ROWS = int(os.getenv('PREPROCESS_CHUNK_ROWS', '50000'))
+
+# Content retrieval: 'exact' scores every product against the query, 'ann'
+# builds LSA embeddings (LSA_DIMENSIONS) clustered into ANN_LISTS inverted
+# lists (0 = about sqrt(products)) at each full refit, probes ANN_PROBES of
+# them per query and rescores the best ANN_CANDIDATES exactly. More probes
+# or candidates trade latency for recall; see benchmark_ann.py.
+CONTENT_RETRIEVAL = os.getenv('CONTENT_RETRIEVAL', 'exact')
+LSA_DIMENSIONS = int(os.getenv('LSA_DIMENSIONS', '256'))
+ANN_LISTS = int(os.getenv('ANN_LISTS', '0'))
+ANN_PROBES = int(os.getenv('ANN_PROBES', '8'))
+ANN_CANDIDATES = int(os.getenv('ANN_CANDIDATES', '2000'))
+
+# Content recommendations are ranked in two stages: retrieval keeps the
+# RERANK_CANDIDATES products most similar to the query text that pass the
+# hard filters, and only those are reranked on all features
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', '300'))
+
+# Persisted, memory-mapped catalog index; an empty value disables it
+INDEX_DIR = os.getenv('INDEX_DIR', 'catalog_index')
+# How often pre-fork workers check INDEX_DIR for an artifact published by the
+# maintenance process
+INDEX_POLL_SECONDS = int(os.getenv('INDEX_POLL_SECONDS', '10'))
+
+# How often serving processes read feedback given since their last sync
+# (UserFeedback.CreatedOn), and how often they reload all of it instead,
+# which also drops rows deleted from the table
+FEEDBACK_SYNC_SECONDS = int(os.getenv('FEEDBACK_SYNC_SECONDS', '10'))
+FEEDBACK_FULL_SYNC_SECONDS = int(os.getenv('FEEDBACK_FULL_SYNC_SECONDS', str(24 * 3600)))
+
+# Binary user-user similarity artifact written by CreateUserUserMatrix
+USER_SIMILARITY_PATH = os.getenv('USER_SIMILARITY_PATH', 'user_user_similarity.npz')
+# Neighbors kept per user, and the bound on similarity values held at once
+# while computing them
+USER_NEIGHBORS_K = int(os.getenv('USER_NEIGHBORS_K', '20'))
+USER_SIMILARITY_BLOCK_CELLS = int(os.getenv('USER_SIMILARITY_BLOCK_CELLS', str(16_000_000)))
+# How often new feedback is folded into the user neighbor lists between the
+# daily full builds
+NEIGHBOR_UPDATE_SECONDS = int(os.getenv('NEIGHBOR_UPDATE_SECONDS', '60'))
+
+# Item-item co-like model written by CreateItemItemMatrix, and the neighbors
+# kept per product
+ITEM_SIMILARITY_PATH = os.getenv('ITEM_SIMILARITY_PATH', 'item_item_similarity.npz')
+ITEM_NEIGHBORS_K = int(os.getenv('ITEM_NEIGHBORS_K', '50'))
+
+# Implicit ALS factor model written by TrainALSModel. Training uses
+# ALS_BLAS_THREADS BLAS threads (0 = all cores).
+ALS_MODEL_PATH = os.getenv('ALS_MODEL_PATH', 'als_model.npz')
+ALS_FACTORS = int(os.getenv('ALS_FACTORS', '64'))
+ALS_ITERATIONS = int(os.getenv('ALS_ITERATIONS', '15'))
+ALS_REGULARIZATION = float(os.getenv('ALS_REGULARIZATION', '0.1'))
+ALS_ALPHA = float(os.getenv('ALS_ALPHA', '40'))
+ALS_BLAS_THREADS = int(os.getenv('ALS_BLAS_THREADS', '0')) or None
+
+# Offline jobs run in process pools: JOB_WORKERS processes for the stateless
+# model builds, at JOB_NICE lower CPU priority than the serving processes.
+# Their status is written to JOB_STATUS_PATH.
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_NICE = int(os.getenv('JOB_NICE', '10'))
+JOB_STATUS_PATH = os.getenv('JOB_STATUS_PATH', 'job_status.json')
+
+PRODUCT_QUERY = """
+    SELECT 
+        p.Id AS ProductId,
+        p.Name AS ProductName,
+        p.SupplyType AS SupplyType, 
+        p.Categories AS Categories,  
+        p.ValidFrom AS ValidFrom,
+        p.ValidTo AS ValidTo,
+        p.CreatedOn AS CreatedOn,
+        COALESCE(m.Name, '') AS MaterialName,
+        COALESCE(m.Description, '') AS MaterialDescription,
+        COALESCE(m.AvailableQuantity, 0) AS AvailableQuantity,
+        COALESCE(m.UnitOfMeasure, '') AS UnitOfMeasure, 
+        l.Id AS LocationId,
+        l.Longitude AS Longitude,
+        l.Latitude AS Latitude
+    FROM 
+        Products p
+    LEFT JOIN 
+        Materials m ON m.ProductId = p.Id
+    JOIN 
+        Companies c ON c.Id = p.CompanyId
+    JOIN 
+        Locations l ON l.Id = c.LocationId
+    WHERE 
+        p.ValidTo >= CURRENT_DATE
+"""
+
+# Ids of the products PRODUCT_QUERY returns; the delta sync tombstones the
+# rows that are no longer among them (deleted or moved out of the catalog)
+ACTIVE_PRODUCT_IDS_QUERY = """
+    SELECT p.Id AS ProductId
+    FROM 
+        Products p
+    JOIN 
+        Companies c ON c.Id = p.CompanyId
+    JOIN 
+        Locations l ON l.Id = c.LocationId
+    WHERE 
+        p.ValidTo >= CURRENT_DATE
+"""
+
+FEEDBACK_QUERY = """
+    SELECT UserId, ProductId, IsLiked
+    FROM UserFeedback
+    WHERE IsLiked = 1
+"""
+
+# Feedback given on or after a watermark, oldest first
+FEEDBACK_SINCE_QUERY = """
+    SELECT UserId, ProductId, IsLiked, CreatedOn
+    FROM UserFeedback
+    WHERE CreatedOn >= :since
+    ORDER BY CreatedOn
+"""
+
+USER_PROFILE_COLUMNS = [
+    "PreferredCategories1",
+    "PreferredCategories2",
+    "PreferredCategories3",
+    "PreferredUnitOfMeasures",
+    "PreferredKeywords",
+    "PreferredSupplyType",
+    "PreferredValidFrom",
+    "PreferredValidTo",
+    "NACECode"
+]
 
 class HybridRecommendationSystem:
     def __init__(self, engine):
@@ -45,231 +217,479 @@ class HybridRecommendationSystem:
             self.keyword_weight = 0.3
             self.content_weight = 0.4
             self.collaborative_weight = 0.3
+
+            self._refresh_lock = threading.Lock()
+            self._feedback_lock = threading.Lock()
+            # (user, product, liked) events posted to this process, applied
+            # by the next sync_feedback
+            self._pending_feedback = []
+            self.index_path = None
+            self.cache = RecommendationCache(
+                query_maxsize=CACHE_QUERY_SIZE,
+                result_maxsize=CACHE_RESULT_SIZE,
+                ttl=CACHE_TTL_SECONDS
+            )
+            # Cached query vectors and results belong to the previous catalog
+            self.snapshots = SnapshotHolder()
+            self.snapshots.subscribe(lambda snapshot: self.cache.set_catalog_version(snapshot.version))
+            self.user_similarity = ArtifactStore(USER_SIMILARITY_PATH, load_user_similarity)
+            self.item_similarity = ArtifactStore(ITEM_SIMILARITY_PATH, load_item_similarity)
+            self.als_model = ArtifactStore(ALS_MODEL_PATH, load_als_model)
+            self.pipeline = self.build_content_pipeline()
             
-            self.df, self.feedback_df = self.fetch_data_from_db()
-            self.prepare_data()
+            self.refresh_feedback()
+            if not self.load_catalog_index():
+                self.snapshots.publish(self.prepare_data(*self.fetch_catalog(), version=1))
+                self.full_refit_at = time.time()
+                self.save_catalog_index()
             logger.info("Recommendation system initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing recommendation system: {e}")
             raise
 
-    def fetch_data_from_db(self):
-        product_query = """
-            SELECT 
-                p.Id AS ProductId,
-                p.Name AS ProductName,
-                p.SupplyType AS SupplyType, 
-                p.Categories AS Categories,  
-                p.ValidFrom AS ValidFrom,
-                p.ValidTo AS ValidTo,
-                COALESCE(m.Name, '') AS MaterialName,
-                COALESCE(m.Description, '') AS MaterialDescription,
-                COALESCE(m.AvailableQuantity, 0) AS AvailableQuantity,
-                COALESCE(m.UnitOfMeasure, '') AS UnitOfMeasure, 
-                l.Longitude AS Longitude,
-                l.Latitude AS Latitude
-            FROM 
-                Products p
-            LEFT JOIN 
-                Materials m ON m.ProductId = p.Id
-            JOIN 
-                Companies c ON c.Id = p.CompanyId
-            JOIN 
-                Locations l ON l.Id = c.LocationId
-            WHERE 
-                p.ValidTo >= CURRENT_DATE
+    # Read-only views of the currently published snapshot. Request paths pin
+    # one snapshot up front instead of reading these repeatedly.
+    @property
+    def snapshot(self):
+        return self.snapshots.current()
+
+    @property
+    def df(self):
+        return self.snapshot.df
+
+    @property
+    def content_index(self):
+        return self.snapshot.content_index
+
+    @property
+    def tfidf(self):
+        return self.snapshot.vectorizer
+
+    @property
+    def content_matrix(self):
+        return self.snapshot.content_matrix
+
+    @property
+    def geo_index(self):
+        return self.snapshot.geo_index
+
+    @property
+    def filter_index(self):
+        return self.snapshot.filter_index
+
+    @property
+    def numerical_features_scaled(self):
+        return self.snapshot.numerical_features_scaled
+
+    @property
+    def catalog_version(self):
+        return self.snapshot.version
+
+    def load_catalog_index(self):
+        """Serve from the persisted index artifact in INDEX_DIR, if there is one.
+
+        The artifact is memory-mapped, so this is independent of catalog size.
+        Products created after the artifact was written are picked up by the
+        next delta sync, and the full refit schedule continues from the full
+        refit the artifact descends from (artifacts written by delta syncs
+        keep that of their parent). Returns False when the catalog has to be
+        built from the database instead.
         """
+        if not INDEX_DIR:
+            return False
+        path = current_artifact(INDEX_DIR)
+        if path is None:
+            return False
+
+        try:
+            snapshot, manifest = load_snapshot(path)
+        except Exception as e:
+            logger.error(f"Could not load catalog index from {path}: {e}")
+            return False
 
-        feedback_query = """
-            SELECT UserId, ProductId, IsLiked
-            FROM UserFeedback
-            WHERE IsLiked = 1
+        self.snapshots.publish(snapshot)
+        self.index_path = path
+        # Artifacts from before full_refit_at was recorded are refit right away
+        self.full_refit_at = manifest.get('full_refit_at', 0.0)
+        return True
+
+    def follow_catalog_index(self):
+        """Publish the current index artifact if another process has written a newer one.
+
+        Used by pre-fork workers, which do not sync the catalog themselves.
+        Returns True when a new snapshot was published.
         """
+        if not INDEX_DIR:
+            return False
+        path = current_artifact(INDEX_DIR)
+        if path is None or path == self.index_path:
+            return False
+
+        with self._refresh_lock:
+            snapshot, _ = load_snapshot(path)
+            self.index_path = path
+            if snapshot.version <= self.catalog_version:
+                return False
+            self.snapshots.publish(snapshot)
+            return True
+
+    def save_catalog_index(self):
+        if not INDEX_DIR:
+            return
+        try:
+            self.index_path = save_snapshot(self.snapshots.current(), INDEX_DIR, self.full_refit_at)
+        except Exception as e:
+            # Serving continues from memory; the next full refit tries again
+            logger.error(f"Could not save catalog index to {INDEX_DIR}: {e}")
 
+    def fetch_feedback_from_db(self):
+        """All likes, with the CreatedOn watermark to sync on from and how many events share it.
+
+        The watermark is None when userfeedback has no CreatedOn column, and
+        the start of the epoch while the table is empty.
+        """
         try:
             with self.engine.connect() as connection:
-                product_result = connection.execute(text(product_query))
-                feedback_result = connection.execute(text(feedback_query))
-                
-                df = pd.DataFrame(product_result.fetchall(), columns=product_result.keys())
-                feedback_df = pd.DataFrame(feedback_result.fetchall(), columns=feedback_result.keys())
+                watermark, at_watermark = None, 0
+                if feedback_has_created_on(connection):
+                    # Taken before the read: later events are read again by
+                    # the next sync, which is harmless
+                    watermark, at_watermark = connection.execute(text(
+                        "SELECT MAX(CreatedOn), COUNT(*) FROM userfeedback "
+                        "WHERE CreatedOn = (SELECT MAX(CreatedOn) FROM userfeedback)"
+                    )).one()
+                    watermark = pd.Timestamp(0) if watermark is None else pd.Timestamp(watermark)
+                else:
+                    logger.warning(
+                        "userfeedback has no CreatedOn column; feedback from other processes is only "
+                        "picked up by the full reload every FEEDBACK_FULL_SYNC_SECONDS"
+                    )
+                feedback_df = read_frame(
+                    connection, FEEDBACK_QUERY, chunk_rows=FETCH_CHUNK_ROWS,
+                    dtypes={'IsLiked': np.int8}
+                )
+                return feedback_df, watermark, at_watermark
+
+        except Exception as e:
+            logger.error(f"Database feedback fetch error: {e}")
+            raise
+
+    def refresh_feedback(self):
+        """Rebuild the in-memory feedback index from the database."""
+        feedback_df, watermark, at_watermark = self.fetch_feedback_from_db()
+        feedback_index = FeedbackIndex.build(feedback_df['UserId'], feedback_df['ProductId'])
+        with self._feedback_lock:
+            self.feedback_index = feedback_index
+            self.feedback_watermark = watermark
+            self.feedback_at_watermark = at_watermark
+        self.last_feedback_reload = time.monotonic()
+
+    def sync_feedback(self):
+        """Apply the feedback given since the last sync to the in-memory index.
+
+        Reads only the UserFeedback rows with a CreatedOn at or after the
+        watermark and applies them, after the events posted to this process
+        since the last sync, in one FeedbackIndex.with_feedback call, so the
+        cost of copying the index is paid once per sync and not per event.
+        Every FEEDBACK_FULL_SYNC_SECONDS the index is rebuilt from the whole
+        table instead. Without a CreatedOn column there is nothing to poll
+        on, so only that full reload runs. Returns the number of events
+        applied, or None after a full reload.
+        """
+        with self._feedback_lock:
+            pending, self._pending_feedback = self._pending_feedback, []
+        users, products, liked = (list(column) for column in zip(*pending)) if pending else ([], [], [])
+
+        reload_due = time.monotonic() - self.last_feedback_reload >= FEEDBACK_FULL_SYNC_SECONDS
+        if reload_due:
+            self.refresh_feedback()
+            self._apply_feedback(users, products, liked)
+            return None
+
+        watermark, at_watermark = None, None
+        events = self.fetch_new_feedback()
+        if events is not None:
+            # CreatedOn may have coarse precision, so events at the watermark
+            # itself are read again; they are only new when there are more of them
+            created_on = pd.to_datetime(events['CreatedOn'])
+            watermark = created_on.max()
+            at_watermark = int((created_on == watermark).sum())
+            if watermark == self.feedback_watermark and at_watermark == self.feedback_at_watermark:
+                watermark = None
+            else:
+                users += events['UserId'].astype(str).tolist()
+                products += events['ProductId'].astype(str).tolist()
+                liked += (pd.to_numeric(events['IsLiked'], errors='coerce').fillna(0).to_numpy() == 1).tolist()
+
+        applied = self._apply_feedback(users, products, liked, watermark, at_watermark)
+        if applied:
+            logger.info(f"Feedback sync: {applied} events applied ({len(pending)} posted to this process)")
+        return applied
+
+    def fetch_new_feedback(self):
+        """UserFeedback rows from the watermark on, oldest first; None when there are none or no watermark."""
+        if self.feedback_watermark is None:
+            return None
+        with self.engine.connect() as connection:
+            events = read_frame(
+                connection, FEEDBACK_SINCE_QUERY, {'since': self.feedback_watermark.to_pydatetime()},
+                chunk_rows=FETCH_CHUNK_ROWS
+            )
+        return None if events.empty else events
+
+    def _apply_feedback(self, user_ids, product_ids, liked, watermark=None, at_watermark=None):
+        if not user_ids and watermark is None:
+            return 0
+        with self._feedback_lock:
+            self.feedback_index = self.feedback_index.with_feedback(user_ids, product_ids, liked)
+            if watermark is not None:
+                self.feedback_watermark = watermark
+                self.feedback_at_watermark = at_watermark
+        return len(user_ids)
+
+    def record_feedback(self, user_ids, product_ids, liked):
+        """Queue feedback events for this process's index; the next sync_feedback applies them.
+
+        Copying the index costs O(all likes), so events are applied in one
+        batch per FEEDBACK_SYNC_SECONDS instead of on every request.
+        """
+        with self._feedback_lock:
+            self._pending_feedback.extend(zip(user_ids, product_ids, liked))
+
+    def fetch_catalog(self, since=None):
+        """Stream the product rows (created on or after `since`, if given) into a compact catalog.
+
+        Returns (catalog, content_features, sync_watermark), see
+        catalog_loader.load_catalog.
+        """
+        query = PRODUCT_QUERY
+        params = {}
+        if since is not None:
+            # CreatedOn may only have day precision, so the watermark day is
+            # read again; the caller drops products it already holds.
+            query += """
+                AND p.CreatedOn >= :since
+            """
+            params['since'] = pd.Timestamp(since).to_pydatetime()
 
-            return df, feedback_df
+        try:
+            with self.engine.connect() as connection:
+                return load_catalog(
+                    stream_query(connection, query, params, chunk_rows=FETCH_CHUNK_ROWS),
+                    workers=PREPROCESS_WORKERS,
+                    parallel_rows=PREPROCESS_CHUNK_ROWS
+                )
 
         except Exception as e:
-            logger.error(f"Database fetch error: {e}")
+            logger.error(f"Database catalog fetch error: {e}")
             raise
 
-    def preprocess_text(self, text):
-        if isinstance(text, (pd.Series, np.ndarray)):
-            return ' '.join(map(str, text))
-        if pd.isna(text) or text is None:
-            return ''
-        if isinstance(text, (list, tuple)):
-            text = ' '.join(map(str, text))
-        text = str(text).lower().strip()
-        text = re.sub(r'[^\w\s]', ' ', text)
-        return ' '.join(text.split())
-
-    def prepare_data(self):
+    def fetch_active_product_ids(self):
         try:
-            self.df['Categories'] = self.df['Categories'].apply(
-                lambda x: ast.literal_eval(x) if isinstance(x, str) else x
-            )
-            
-            numeric_cols = ['Latitude', 'Longitude', 'AvailableQuantity']
-            for col in numeric_cols:
-                self.df[col] = pd.to_numeric(self.df[col], errors='coerce').fillna(0)
-
-            def preprocess_text(text):
-                if pd.isna(text) or text is None:
-                    return ''
-                if isinstance(text, (list, tuple)):
-                    text = ' '.join(map(str, text))
-                text = str(text).lower().strip()
-                text = re.sub(r'[^\w\s]', ' ', text)
-                text = ' '.join(text.split())
-                return text
-
-            self.df['processed_name'] = self.df['ProductName'].apply(preprocess_text)
-            self.df['processed_material'] = self.df['MaterialName'].apply(preprocess_text)
-            self.df['processed_description'] = self.df['MaterialDescription'].apply(preprocess_text)
-            self.df['processed_categories'] = self.df['Categories'].apply(preprocess_text)
-            self.df['processed_supply_type'] = self.df['SupplyType'].apply(preprocess_text)
-            self.df['processed_unit'] = self.df['UnitOfMeasure'].apply(preprocess_text)
-
-            self.df['content_features'] = (
-                self.df['processed_name'] + ' ' + 
-                self.df['processed_name'] + ' ' +  
-                self.df['processed_material'] + ' ' +
-                self.df['processed_description'] + ' ' +
-                self.df['processed_categories'] + ' ' +
-                self.df['processed_categories'] + ' ' +  
-                self.df['processed_supply_type'] + ' ' +
-                self.df['processed_unit']
-            )
+            with self.engine.connect() as connection:
+                return read_frame(connection, ACTIVE_PRODUCT_IDS_QUERY, chunk_rows=FETCH_CHUNK_ROWS)['ProductId']
 
-            self.tfidf = TfidfVectorizer(
-                stop_words='english',
-                max_df=0.95,
-                min_df=2,
-                ngram_range=(1, 2),
-                max_features=5000,
-                strip_accents='unicode',
-                norm='l2'
-            )
+        except Exception as e:
+            logger.error(f"Database active products fetch error: {e}")
+            raise
 
-            if len(self.df) > 0:
-                self.content_matrix = self.tfidf.fit_transform(self.df['content_features'])
-                logger.info(f"TF-IDF matrix shape: {self.content_matrix.shape}")
+    def prepare_data(self, df, content_features, sync_watermark, version):
+        """Build a complete catalog snapshot from a freshly loaded compact catalog."""
+        try:
+            if len(df) > 0:
+                content_index = ContentIndex.build(content_features)
+                if CONTENT_RETRIEVAL == 'ann':
+                    content_index.ann = LSAIndex.build(
+                        content_index.matrix, dimensions=LSA_DIMENSIONS, n_lists=ANN_LISTS or None
+                    )
+                default_query = ' '.join(content_features.iloc[0].split()[:5])
+                logger.info(f"TF-IDF matrix shape: {content_index.matrix.shape}")
             else:
-                self.content_matrix = None
+                content_index = None
+                default_query = ''
                 logger.warning("No documents available for TF-IDF vectorization")
 
-            self.scaler = MinMaxScaler()
-            self.numerical_features_scaled = self.scaler.fit_transform(
-                self.df[['AvailableQuantity', 'Latitude', 'Longitude']]
+            scaler = MinMaxScaler()
+            numerical_features_scaled = scaler.fit_transform(df[FLOAT_COLUMNS])
+
+            snapshot = CatalogSnapshot.build(
+                version, df, content_index, scaler, numerical_features_scaled,
+                sync_watermark=sync_watermark, default_query=default_query
             )
+            logger.info(f"Catalog snapshot memory: {snapshot.memory_report()['total']} bytes")
+            return snapshot
 
         except Exception as e:
             logger.error(f"Data preparation error: {e}")
             raise
 
-    def explain_similarity(self, query_text, product_text, score):
-        try:
-            query_vector = self.tfidf.transform([query_text])
-            product_vector = self.tfidf.transform([product_text])
-            
-            feature_names = np.array(self.tfidf.get_feature_names_out())
-            query_scores = query_vector.toarray()[0]
-            product_scores = product_vector.toarray()[0]
-            
-            common_terms = []
-            for term, q_score, p_score in zip(feature_names, query_scores, product_scores):
-                if q_score > 0 and p_score > 0:
-                    common_terms.append((term, q_score * p_score))
-            
-            common_terms.sort(key=lambda x: x[1], reverse=True)
-            top_terms = common_terms[:5] if len(common_terms) > 5 else common_terms
-            
-            return {
-                'overall_score': score,
-                'matching_terms': [{'term': term, 'relevance': float(score)} for term, score in top_terms]
-            }
-        except Exception as e:
-            logger.error(f"Error in explain_similarity: {e}")
-            return {'overall_score': score, 'matching_terms': []}
+    def refresh_catalog(self, full=False):
+        """Bring the catalog up to date with the database.
+
+        Runs a full reload and TF-IDF refit when `full` is set or
+        CATALOG_FULL_REFIT_SECONDS have passed since the last one. Otherwise
+        only products created since the sync watermark are fetched and
+        vectorized against the existing vocabulary; unseen products are
+        appended to the index, and rows that expired or that the database no
+        longer returns are tombstoned. Edits to existing products wait for
+        the next full refit.
+
+        The next snapshot is built entirely off to the side and published with
+        one reference swap; requests in flight keep the snapshot they started
+        with. Every published snapshot is also saved to INDEX_DIR, where
+        pre-fork workers pick it up.
+        """
+        with self._refresh_lock:
+            current = self.snapshots.current()
+            version = current.version + 1
+
+            refit_due = time.time() - self.full_refit_at >= CATALOG_FULL_REFIT_SECONDS
+            if full or refit_due or current.content_index is None or current.sync_watermark is None:
+                logger.info("Running full catalog refit")
+                self.snapshots.publish(self.prepare_data(*self.fetch_catalog(), version=version))
+                self.full_refit_at = time.time()
+                self.save_catalog_index()
+                return True
+
+            delta, delta_features, delta_watermark = self.fetch_catalog(since=current.sync_watermark)
+            known_products = current.df.loc[current.active_mask, 'ProductId']
+            unseen = ~delta['ProductId'].isin(known_products).to_numpy()
+            delta = delta[unseen].reset_index(drop=True)
+            delta_features = delta_features[unseen].reset_index(drop=True)
+
+            today = pd.Timestamp.today().normalize()
+            expired = (pd.to_datetime(current.df['ValidTo'], errors='coerce') < today).to_numpy()
+            removed = ~current.df['ProductId'].isin(self.fetch_active_product_ids()).to_numpy()
+            active_mask = current.active_mask & ~expired & ~removed
+
+            if delta.empty and active_mask.sum() == current.active_mask.sum():
+                return False
+
+            df = current.df
+            content_index = current.content_index
+            numerical_features_scaled = current.numerical_features_scaled
+            sync_watermark = current.sync_watermark
+            if not delta.empty:
+                delta_matrix = content_index.vectorizer.transform(delta_features)
+                # New rows are outside the ANN index until the next full refit
+                # and are always scored exactly
+                content_index = ContentIndex(
+                    content_index.vectorizer,
+                    sparse.vstack([content_index.matrix, delta_matrix], format='csr'),
+                    ann=content_index.ann
+                )
+                sync_watermark = max(sync_watermark, delta_watermark)
+
+                numerical_features_scaled = np.vstack([
+                    numerical_features_scaled,
+                    current.scaler.transform(delta[FLOAT_COLUMNS])
+                ])
+                df = concat_catalog([df, delta])
+                active_mask = np.concatenate([active_mask, np.ones(len(delta), dtype=bool)])
+
+            self.snapshots.publish(CatalogSnapshot.build(
+                version, df, content_index, current.scaler, numerical_features_scaled,
+                active_mask=active_mask, sync_watermark=sync_watermark,
+                default_query=current.default_query
+            ))
+            self.save_catalog_index()
+
+            logger.info(
+                f"Catalog delta sync: {len(delta)} new rows, "
+                f"{int((~active_mask).sum())} tombstoned rows, {len(df)} rows total"
+            )
+            return True
+
+    def build_query_text(self, preferences, snapshot):
+        query_content = []
+        
+        if preferences.get('PreferredCategories'):
+            categories = ' '.join(map(str, preferences['PreferredCategories']))
+            query_content.extend([categories] * 3)
+        
+        if preferences.get('PreferredSupplyType'):
+            supply_type = ' '.join(map(str, preferences['PreferredSupplyType']))
+            query_content.append(supply_type)
+        
+        if preferences.get('PreferredUnitOfMeasures'):
+            units = ' '.join(map(str, preferences['PreferredUnitOfMeasures']))
+            query_content.append(units)
+        
+        if preferences.get('PreferredKeywords'):
+            keywords = ' '.join(map(str, preferences['PreferredKeywords']))
+            query_content.extend([keywords] * 3)
+        
+        query_text = ' '.join(query_content) if query_content else ''
+        if not query_text:
+            query_text = snapshot.default_query
+        return query_text
+
+    def get_query_vector(self, preferences, snapshot):
+        key = self.cache.vector_key(snapshot.version, preferences)
+        query_vector = self.cache.query_vectors.get(key)
+        if query_vector is None:
+            query_vector = snapshot.content_index.transform_query(
+                self.build_query_text(preferences, snapshot)
+            )
+            self.cache.query_vectors.put(key, query_vector)
+        return query_vector
+
+    def build_content_pipeline(self):
+        """Two-stage ranking of content recommendations (see ranking_pipeline.py).
+
+        Retrieval applies the radius and hard filters, then keeps the
+        RERANK_CANDIDATES products most similar to the query text. The rerank
+        weights text similarity 0.7 against distance 0.3, as a single-stage
+        ranking did, with quantity fit, validity overlap and collaborative
+        affinity added when the request allows them.
+        """
+        pipeline = RankingPipeline()
+        pipeline.add_stage('filter', self._filter_stage)
+        pipeline.add_stage('retrieve', text_retrieval(RERANK_CANDIDATES, ANN_PROBES, ANN_CANDIDATES))
+        pipeline.add_feature('content', content_score, 0.7)
+        pipeline.add_feature('distance', distance_score, 0.3)
+        pipeline.add_feature('quantity', quantity_fit, 0.1)
+        pipeline.add_feature('validity', validity_overlap, 0.1)
+        pipeline.add_feature('collaborative', self._collaborative_feature, 0.2)
+        return pipeline
+
+    def _filter_stage(self, context):
+        rows, distances, max_radius = self._candidate_rows(
+            context.snapshot, context.preferences, context.longitude, context.latitude
+        )
+        context.rows, context.distances, context.max_radius = rows, distances, max_radius
 
-    def get_content_based_recommendations(self, preferences, top_n, longitude, latitude):
+    def _collaborative_feature(self, context):
+        if not context.user_id:
+            return None
+        candidate_ids = context.snapshot.df['ProductId'].to_numpy()[context.rows]
+        return self.collaborative_candidate_scores(context.user_id, candidate_ids)
+
+    def get_content_based_recommendations(self, preferences, top_n, longitude, latitude, include_explanations=True,
+                                          user_id=None):
         try:
-            filtered_df = self.df.copy()
-            
-            if len(filtered_df) == 0:
+            # Pin the catalog for the whole request
+            snapshot = self.snapshots.current()
+            if len(snapshot) == 0:
                 return []
 
-            query_content = []
-            
-            if preferences.get('PreferredCategories'):
-                categories = ' '.join(map(str, preferences['PreferredCategories']))
-                query_content.extend([categories] * 3)
-            
-            if preferences.get('PreferredSupplyType'):
-                supply_type = ' '.join(map(str, preferences['PreferredSupplyType']))
-                query_content.append(supply_type)
-            
-            if preferences.get('PreferredUnitOfMeasures'):
-                units = ' '.join(map(str, preferences['PreferredUnitOfMeasures']))
-                query_content.append(units)
-            
-            if preferences.get('PreferredKeywords'):
-                keywords = ' '.join(map(str, preferences['PreferredKeywords']))
-                query_content.extend([keywords] * 3)
-            
-            query_text = ' '.join(query_content) if query_content else ''
-            if not query_text:
-                query_text = ' '.join(filtered_df['content_features'].iloc[0].split()[:5])
-            
-            query_vector = self.tfidf.transform([query_text])
-            content_sim = cosine_similarity(
-                query_vector, 
-                self.tfidf.transform(filtered_df['content_features'])
-            )[0]
-
-            if longitude and latitude and preferences.get('MaxSearchRadiusKm'):
-                max_radius = float(preferences['MaxSearchRadiusKm'])
-                distances = np.array([
-                    haversine(
-                        float(latitude), float(longitude),
-                        float(row['Latitude']), float(row['Longitude'])
-                    )
-                    for _, row in filtered_df.iterrows()
-                ])
-                distance_scores = 1 - (distances / max_radius).clip(0, 1)
-                content_sim = 0.7 * content_sim + 0.3 * distance_scores
-
-            top_indices = content_sim.argsort()[::-1][:top_n]
-            
-            recommendations = []
-            for idx in top_indices:
-                product = filtered_df.iloc[idx]
-                similarity_explanation = self.explain_similarity(
-                    query_text,
-                    product['content_features'],
-                    float(content_sim[idx])
+            # Personalized rankings follow the user's feedback and neighbors,
+            # which the catalog version does not cover, so they are not cached
+            cache_key = None
+            if not user_id:
+                cache_key = self.cache.result_key(
+                    snapshot.version, preferences, longitude, latitude, top_n, bool(include_explanations)
                 )
-                
-                recommendation = {
-                    'ProductId': product['ProductId'],
-                    'Score': float(content_sim[idx]),
-                    'Name': product['ProductName'],
-                    'Categories': product['Categories'],
-                    'Explanation': {
-                        'ContentSimilarity': similarity_explanation,
-                        'Distance': f"{haversine(float(latitude), float(longitude), float(product['Latitude']), float(product['Longitude'])):.2f}km" if longitude and latitude else "N/A",
-                        'MatchingFeatures': similarity_explanation['matching_terms']
-                    }
-                }
-                recommendations.append(recommendation)
+                recommendations = self.cache.results.get(cache_key)
+                if recommendations is not None:
+                    logger.info(f"Serving {len(recommendations)} cached recommendations")
+                    return recommendations
+
+            recommendations = self._rank_content(
+                snapshot, preferences, top_n, longitude, latitude, include_explanations, user_id=user_id
+            )
+            if cache_key is not None:
+                self.cache.results.put(cache_key, recommendations)
 
             logger.info(f"Generated {len(recommendations)} recommendations")
             return recommendations
@@ -277,218 +697,493 @@ class HybridRecommendationSystem:
         except Exception as e:
             logger.error(f"Content-based recommendations error: {str(e)}")
             return []
-        
-    def get_collaborative_recommendations(self, user_id_of_interest):
-        try:
-            combined_sim_matrix = pd.read_csv("combined_user_user_similarity.csv", index_col=0)
-        except Exception as e: 
+
+    def _candidate_rows(self, snapshot, preferences, longitude, latitude):
+        """Rows passing the radius and hard filters, with their distances.
+
+        Returns (rows, distances, max_radius); rows is None when nothing
+        restricts the catalog, distances is None without a radius search.
+        """
+        # Prune to products inside the search radius before any text scoring
+        candidate_rows = None
+        candidate_distances = None
+        max_radius = None
+        if longitude and latitude and preferences.get('MaxSearchRadiusKm'):
+            max_radius = float(preferences['MaxSearchRadiusKm'])
+            candidate_rows, candidate_distances = snapshot.geo_index.within_radius(
+                float(latitude), float(longitude), max_radius
+            )
+            if len(candidate_rows) == 0:
+                logger.info(f"No products within {max_radius}km")
+                return candidate_rows, candidate_distances, max_radius
+
+        # Hard constraints (category, supply type, unit, quantity, validity)
+        filter_mask = snapshot.filter_index.mask(preferences)
+        if snapshot.has_tombstones:
+            filter_mask = snapshot.active_mask if filter_mask is None else filter_mask & snapshot.active_mask
+        if filter_mask is not None:
+            if candidate_rows is None:
+                candidate_rows = np.flatnonzero(filter_mask)
+            else:
+                keep = filter_mask[candidate_rows]
+                candidate_rows = candidate_rows[keep]
+                candidate_distances = candidate_distances[keep]
+            if len(candidate_rows) == 0:
+                logger.info("No products satisfy the requested constraints")
+
+        return candidate_rows, candidate_distances, max_radius
+
+    def _rank_content(self, snapshot, preferences, top_n, longitude, latitude, include_explanations,
+                      content_sim=None, query_vector=None, user_id=None):
+        # content_sim may be passed in as a precomputed score row over the
+        # whole catalog (batch scoring); otherwise only candidates are scored.
+        if query_vector is None:
+            query_vector = self.get_query_vector(preferences, snapshot)
+        context = RankingContext(
+            snapshot, preferences, top_n, longitude, latitude, query_vector,
+            user_id=user_id, content_sim=content_sim
+        )
+        top_positions, top_scores, features = self.pipeline.rank(context)
+        if len(top_positions) == 0:
             return []
 
-        try:
-            user_sims = combined_sim_matrix.loc[user_id_of_interest].sort_values(ascending=False)
-        except Exception as e:
+        start = time.perf_counter()
+        top_rows = context.rows[top_positions]
+        if context.distances is not None:
+            top_distances = context.distances[top_positions]
+        elif longitude and latitude:
+            top_distances = snapshot.geo_index.distances(float(latitude), float(longitude), top_rows)
+        else:
+            top_distances = None
+
+        if include_explanations:
+            matching_terms = snapshot.content_index.explain(query_vector, top_rows)
+
+        recommendations = []
+        for rank, row in enumerate(top_rows):
+            product = snapshot.df.iloc[row]
+            score = float(top_scores[rank])
+            explanation = {
+                'Distance': f"{top_distances[rank]:.2f}km" if top_distances is not None else "N/A"
+            }
+            if include_explanations:
+                explanation['ContentSimilarity'] = {
+                    'overall_score': score,
+                    'matching_terms': matching_terms[rank]
+                }
+                explanation['MatchingFeatures'] = matching_terms[rank]
+                explanation['RankingFeatures'] = {
+                    name: float(values[rank]) for name, values in features.items()
+                }
+
+            recommendation = {
+                'ProductId': product['ProductId'],
+                'Score': score,
+                'Name': product['ProductName'],
+                'Categories': list(product['Categories']),
+                'Explanation': explanation
+            }
+            recommendations.append(recommendation)
+
+        self.pipeline.record('explain', time.perf_counter() - start, len(top_rows), len(recommendations))
+        return recommendations
+
+    def get_batch_content_recommendations(self, batch, include_explanations=True):
+        """Content recommendations for many preference sets at once.
+
+        `batch` is a list of dicts with 'preferences', 'top_n', 'longitude',
+        'latitude' and optionally 'user_id'. Query vectors of all cache misses are stacked into one
+        sparse matrix and scored against the catalog block by block, keeping
+        the dense score block under BATCH_SCORE_CELLS entries. Items with a
+        user_id are always scored, like in get_content_based_recommendations.
+        """
+        results = [[] for _ in batch]
+        snapshot = self.snapshots.current()
+        if len(snapshot) == 0 or not batch:
+            return results
+
+        cache_keys = []
+        pending = []
+        for i, item in enumerate(batch):
+            key = None
+            if not item.get('user_id'):
+                key = self.cache.result_key(
+                    snapshot.version, item['preferences'], item['longitude'], item['latitude'], item['top_n'],
+                    bool(include_explanations)
+                )
+            cache_keys.append(key)
+            cached = self.cache.results.get(key) if key is not None else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+
+        if not pending:
+            return results
+
+        query_vectors = [self.get_query_vector(batch[i]['preferences'], snapshot) for i in pending]
+        query_matrix = sparse.vstack(query_vectors, format='csr')
+        n_products = snapshot.content_index.n_products
+        block_size = max(1, BATCH_SCORE_CELLS // max(n_products, 1))
+
+        for start in range(0, len(pending), block_size):
+            block = pending[start:start + block_size]
+            block_scores = (query_matrix[start:start + block_size] @ snapshot.content_index.matrix.T).toarray()
+            for offset, i in enumerate(block):
+                item = batch[i]
+                try:
+                    recommendations = self._rank_content(
+                        snapshot, item['preferences'], item['top_n'], item['longitude'], item['latitude'],
+                        include_explanations,
+                        content_sim=block_scores[offset],
+                        query_vector=query_vectors[start + offset],
+                        user_id=item.get('user_id')
+                    )
+                except Exception as e:
+                    logger.error(f"Batch recommendations error for item {i}: {e}")
+                    continue
+                if cache_keys[i] is not None:
+                    self.cache.results.put(cache_keys[i], recommendations)
+                results[i] = recommendations
+
+        logger.info(f"Generated batch recommendations for {len(batch)} requests ({len(pending)} scored)")
+        return results
+
+    def get_collaborative_recommendations(self, user_id_of_interest):
+        user_similarity = self.user_similarity.current()
+        if user_similarity is None:
             return []
 
+        # Top 5 most similar users, excluding the user_id_of_interest itself
+        top_5_similar_users = user_similarity.neighbors(user_id_of_interest, k=5)
+        if not top_5_similar_users:
+            return []
 
-        # 2. Exclude the user_id_of_interest itself from the list 
-        #    so you don't get the user as their own top similar user
+        logger.debug(f"Top 5 similar users: {top_5_similar_users}")
 
-        user_sims = user_sims.drop(user_id_of_interest, errors='ignore')
+        # Products liked by any of the similar users that the
+        # user_of_interest does NOT like yet, from the in-memory feedback index
+        combined_new_products = self.feedback_index.new_products_from(
+            user_id_of_interest, top_5_similar_users
+        ).tolist()
 
-        # 3. Take the top 5 user IDs
-        top_5_similar_users = user_sims.head(5).index.tolist()
+        recommendations_list = [{"ProductId": pid} for pid in combined_new_products]
+    
+        return recommendations_list
 
-        print("Top 5 similar users:", top_5_similar_users)
+    def get_item_based_recommendations(self, user_id, top_n, liked_product_ids=()):
+        """Products co-liked with the user's likes, scored by summed item-item similarity.
 
+        The user's likes come from the feedback index, plus any
+        `liked_product_ids` sent with the request.
+        """
+        item_similarity = self.item_similarity.current()
+        if item_similarity is None:
+            return []
 
+        liked = set(self.feedback_index.liked_products(user_id).tolist())
+        liked.update(str(p) for p in liked_product_ids)
+        return [
+            {'ProductId': product_id, 'Score': score}
+            for product_id, score in item_similarity.recommend(liked, top_n)
+        ]
 
-        # Build the list of placeholders for the IN clause, e.g. (:id1, :id2, ...)
-        placeholders = ", ".join([f":id{i}" for i in range(len(top_5_similar_users))])
+    def get_factor_recommendations(self, user_id, top_n, liked_product_ids=()):
+        """Ranked collaborative recommendations from the implicit ALS model.
 
-        # Build the SQL query
-        sql_query = f"SELECT * FROM userfeedback"
+        Known users are scored with their trained factors; others are folded
+        in from their likes. Products the user already liked are skipped.
+        """
+        als_model = self.als_model.current()
+        if als_model is None:
+            return []
 
-        # Create a dictionary of params, like {'id0': 'user1', 'id1': 'user2', ...}
+        liked = set(self.feedback_index.liked_products(user_id).tolist())
+        liked.update(str(p) for p in liked_product_ids)
+        return [
+            {'ProductId': product_id, 'Score': score}
+            for product_id, score in als_model.recommend(user_id, liked, top_n)
+        ]
 
-        # Execute the query using SQLAlchemy
-        with self.engine.connect() as connection:
-            result = connection.execute(text(sql_query))
-            feedback_data = pd.DataFrame(result.fetchall(), columns=result.keys())
+    def collaborative_product_scores(self, user_id):
+        """Collaborative score per product for `user_id`, from their stored neighbors.
 
+        A product's score is the similarity-weighted share of the user's
+        neighbors that liked it, in [0, 1]. Returns (product_ids, scores) for
+        the products liked by at least one neighbor.
+        """
+        user_similarity = self.user_similarity.current()
+        if user_similarity is None:
+            return np.zeros(0, dtype=object), np.zeros(0)
+        neighbor_ids, similarities = user_similarity.scored_neighbors(user_id)
+        similarities = np.clip(similarities, 0, None)
+        if similarities.sum() <= 0:
+            return np.zeros(0, dtype=object), np.zeros(0)
+        product_ids, scores = self.feedback_index.weighted_likes(neighbor_ids, similarities)
+        return product_ids, scores / similarities.sum()
+
+    def collaborative_candidate_scores(self, user_id, candidate_ids):
+        """Collaborative scores aligned with `candidate_ids`, or None without any for the user."""
+        product_ids, product_scores = self.collaborative_product_scores(user_id)
+        if len(product_ids) == 0:
+            return None
+        scores = np.zeros(len(candidate_ids))
+        positions = pd.Index(product_ids).get_indexer(candidate_ids)
+        found = positions >= 0
+        scores[found] = product_scores[positions[found]]
+        return scores
+
+    def get_hybrid_recommendations(self, user_id, preferences, top_n, longitude, latitude, include_explanations=True):
+        """One ranked list fusing content, keyword, distance and collaborative scores.
+
+        Every signal is computed once over the same candidate rows (radius
+        and hard filters as for content recommendations, minus the products
+        the user already liked) and combined as
+
+            keyword_weight * keyword overlap
+            + content_weight * content similarity (blended 0.7 / 0.3 with
+              distance when searching within a radius)
+            + collaborative_weight * collaborative score
+
+        before a single top-n selection.
+        """
+        snapshot = self.snapshots.current()
+        if len(snapshot) == 0 or snapshot.content_index is None:
+            return []
 
-        # 1) Get products liked by the user_of_interest
-        user_of_interest_likes = feedback_data[
-            (feedback_data['UserId'] == user_id_of_interest) & 
-            (feedback_data['IsLiked'] == 1)
-        ]['ProductId'].unique()
+        candidate_rows, candidate_distances, max_radius = self._candidate_rows(
+            snapshot, preferences, longitude, latitude
+        )
+        if candidate_rows is None:
+            candidate_rows = np.arange(len(snapshot))
+        candidate_ids = snapshot.df['ProductId'].to_numpy()[candidate_rows]
+
+        liked = set(self.feedback_index.liked_products(user_id).tolist()) if user_id else set()
+        liked.update(str(p) for p in preferences.get('LikedProductIds') or [])
+        if liked:
+            unseen = ~pd.Index(candidate_ids).isin(liked)
+            candidate_rows, candidate_ids = candidate_rows[unseen], candidate_ids[unseen]
+            if candidate_distances is not None:
+                candidate_distances = candidate_distances[unseen]
+        if len(candidate_rows) == 0:
+            return []
 
-        user_of_interest_likes_set = set(user_of_interest_likes)
+        # The candidates' TF-IDF rows are sliced once and shared by the
+        # content and keyword signals
+        candidate_matrix = snapshot.content_index.matrix[candidate_rows]
+        query_vector = self.get_query_vector(preferences, snapshot)
+        content_sim = np.asarray((candidate_matrix @ query_vector.T).todense()).ravel()
+
+        keywords = ' '.join(map(str, preferences.get('PreferredKeywords') or []))
+        keyword_terms = snapshot.content_index.transform_query(keywords).indices if keywords else []
+        if len(keyword_terms):
+            keyword_overlap = candidate_matrix[:, keyword_terms].getnnz(axis=1) / len(keyword_terms)
+        else:
+            keyword_overlap = np.zeros(len(candidate_rows))
+
+        if candidate_distances is not None:
+            distance_scores = 1 - (candidate_distances / max_radius).clip(0, 1)
+            content_part = 0.7 * content_sim + 0.3 * distance_scores
+        else:
+            distance_scores = None
+            content_part = content_sim
+
+        collaborative = None
+        if user_id:
+            collaborative = self.collaborative_candidate_scores(user_id, candidate_ids)
+        if collaborative is None:
+            collaborative = np.zeros(len(candidate_rows))
+
+        scores = (
+            self.keyword_weight * keyword_overlap
+            + self.content_weight * content_part
+            + self.collaborative_weight * collaborative
+        )
 
-        # 2) For each similar user, find their liked products 
-        #    that user_of_interest does NOT like
-        similar_user_recommendations = {}
+        top_positions = top_k_indices(scores, top_n)
+        top_rows = candidate_rows[top_positions]
+        if candidate_distances is not None:
+            top_distances = candidate_distances[top_positions]
+        elif longitude and latitude:
+            top_distances = snapshot.geo_index.distances(float(latitude), float(longitude), top_rows)
+        else:
+            top_distances = None
+
+        if include_explanations:
+            matching_terms = snapshot.content_index.explain(query_vector, top_rows)
+
+        recommendations = []
+        for rank, (idx, row) in enumerate(zip(top_positions, top_rows)):
+            product = snapshot.df.iloc[row]
+            explanation = {
+                'Distance': f"{top_distances[rank]:.2f}km" if top_distances is not None else "N/A",
+                'ContentScore': float(content_sim[idx]),
+                'KeywordScore': float(keyword_overlap[idx]),
+                'DistanceScore': float(distance_scores[idx]) if distance_scores is not None else None,
+                'CollaborativeScore': float(collaborative[idx])
+            }
+            if include_explanations:
+                explanation['MatchingFeatures'] = matching_terms[rank]
+
+            recommendations.append({
+                'ProductId': product['ProductId'],
+                'Score': float(scores[idx]),
+                'Name': product['ProductName'],
+                'Categories': list(product['Categories']),
+                'Explanation': explanation
+            })
+
+        return recommendations
+
+# Database engine and recommender, created once per process tree by create_app()
+engine = None
+recommender = None
+
+
+def create_app():
+    """Return the Flask app with its recommender initialized.
+
+    Under a pre-fork server this runs once in the master (see
+    gunicorn.conf.py), so the catalog is built or mapped a single time and
+    the workers inherit it.
+    """
+    global engine, recommender
+    if recommender is None:
+        engine = create_db_engine()
+        recommender = HybridRecommendationSystem(engine)
+    return app
+
+
+def create_db_engine():
+    return create_engine(
+        DATABASE_URL or f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}',
+        pool_pre_ping=True,
+        pool_recycle=3600
+    )
 
-        for sim_user in top_5_similar_users:
-            # Products liked by sim_user
-            sim_user_likes = feedback_data[
-                (feedback_data['UserId'] == sim_user) & 
-                (feedback_data['IsLiked'] == 1)
-            ]['ProductId'].unique()
-            
-            # Filter out products the user_of_interest already likes
-            new_products = set(sim_user_likes) - user_of_interest_likes_set
-            
-            similar_user_recommendations[sim_user] = list(new_products)
 
-        # 3) If desired, combine all new products from all top-5 users into a single list
-        combined_new_products = set()
-        for sim_user, products in similar_user_recommendations.items():
-            combined_new_products.update(products)
+def parse_content_request(data):
+    """Validate a content recommendation payload.
 
-        # Convert to a list, if needed
-        combined_new_products = list(combined_new_products)
+    Returns (preferences, top_n, longitude, latitude); raises ValueError with a
+    client-facing message when the payload is invalid.
+    """
+    required_params = ['longitude', 'latitude', 'top_n']
+    for param in required_params:
+        if param not in data:
+            raise ValueError(f'Missing required parameter: {param}')
         
-        recommendations_list = [{"ProductId": pid} for pid in combined_new_products]
+    # Process categories, since there is multiple preferredCategories
+    preferred_categories = []
+    for i in range(1, 4):
+        key = f'preferredCategories{i}'
+        logger.info(f"Processing {key}: {data.get(key)}")
+        
+        if key in data and data[key]:
+            categories = data[key]
+            if isinstance(categories, str):
+                preferred_categories.append(categories.strip())
+            elif isinstance(categories, list):
+                preferred_categories.extend([c.strip() for c in categories if c and c.strip()])
+
+    logger.info(f"Final processed categories: {preferred_categories}")
+
+    # Parse preferences
+    preferences = {
+        'PreferredCategories': preferred_categories,
+        'PreferredSupplyType': data.get('preferredSupplyType', []),
+        'PreferredUnitOfMeasures': data.get('preferredUnitOfMeasures', []),
+        'MinimumAvailableQuantity': data.get('minimumAvailableQuantity', 0),
+        'MaximumAvailableQuantity': data.get('maximumAvailableQuantity', float('inf')),
+        'MaxSearchRadiusKm': data.get('maxSearchRadiusKm', 50),
+        'PreferredKeywords': data.get('preferredKeywords', []),
+        'LikedProductIds': data.get('likedProductIds', []),
+    }
+
+    # Handle date parsing
+    date_format = "%Y-%m-%dT%H:%M:%S"
     
-        return recommendations_list
-
-def haversine(lat1, lon1, lat2, lon2):
-    try:
-        lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-        dlat = lat2 - lat1
-        dlon = lon2 - lon1
-        a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        return 6371.0 * c
-    except Exception as e:
-        logger.error(f"Haversine calculation error: {e}")
-        return float('inf')
-
-# Initialize database engine
-engine = create_engine(
-    f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}',
-    pool_pre_ping=True,
-    pool_recycle=3600
-)
+    if data.get('preferredValidFrom'):
+        try:
+            preferences['PreferredValidFrom'] = datetime.strptime(
+                data['preferredValidFrom'], 
+                date_format
+            ).isoformat()
+        except ValueError as e:
+            raise ValueError('Invalid preferredValidFrom date format. Use YYYY-MM-DDThh:mm:ss')
 
-# Initialize recommender
-recommender = HybridRecommendationSystem(engine)
+    if data.get('preferredValidTo'):
+        try:
+            preferences['PreferredValidTo'] = datetime.strptime(
+                data['preferredValidTo'], 
+                date_format
+            ).isoformat()
+        except ValueError as e:
+            raise ValueError('Invalid preferredValidTo date format. Use YYYY-MM-DDThh:mm:ss')
 
-@app.route('/content-recommendations', methods=['POST'])
-def get_content_recommendations():
+    # Validate and parse numeric parameters
     try:
-        data = request.json
+        top_n = int(data['top_n'])
+        longitude = float(data['longitude'])
+        latitude = float(data['latitude'])
+    except (TypeError, ValueError) as e:
+        logger.error(f"Parameter parsing error: {e}")
+        raise ValueError('Invalid numeric parameters')
 
-        print("Content Recommendation Request: ", data)
+    if top_n <= 0:
+        raise ValueError('top_n must be greater than 0')
 
-        if not data:
-            return jsonify({'status': 'error', 'message': 'No data provided'}), 400
+    # Basic coordinate validation
+    if not (-180 <= longitude <= 180 and -90 <= latitude <= 90):
+        raise ValueError('Invalid coordinates')
 
-        required_params = ['longitude', 'latitude', 'top_n']
-        for param in required_params:
-            if param not in data:
-                return jsonify({
-                    'status': 'error',
-                    'message': f'Missing required parameter: {param}'
-                }), 400
-            
-        # Process categories, since there is multiple preferredCategories
-        preferred_categories = []
-        for i in range(1, 4):
-            key = f'preferredCategories{i}'
-            logger.info(f"Processing {key}: {data.get(key)}")
-            
-            if key in data and data[key]:
-                categories = data[key]
-                if isinstance(categories, str):
-                    preferred_categories.append(categories.strip())
-                elif isinstance(categories, list):
-                    preferred_categories.extend([c.strip() for c in categories if c and c.strip()])
+    # Validate quantity constraints
+    min_qty = preferences['MinimumAvailableQuantity']
+    max_qty = preferences['MaximumAvailableQuantity']
+    if min_qty > max_qty:
+        raise ValueError('MinimumAvailableQuantity cannot be greater than MaximumAvailableQuantity')
 
-        logger.info(f"Final processed categories: {preferred_categories}")
+    return preferences, top_n, longitude, latitude
 
-        # Parse preferences
-        preferences = {
-            'PreferredCategories': preferred_categories,
-            'PreferredSupplyType': data.get('preferredSupplyType', []),
-            'PreferredUnitOfMeasures': data.get('preferredUnitOfMeasures', []),
-            'MinimumAvailableQuantity': data.get('minimumAvailableQuantity', 0),
-            'MaximumAvailableQuantity': data.get('maximumAvailableQuantity', float('inf')),
-            'MaxSearchRadiusKm': data.get('maxSearchRadiusKm', 50),
-            'PreferredKeywords': data.get('preferredKeywords', []),
-            'LikedProductIds': data.get('likedProductIds', []),
-        }
 
-        # Handle date parsing
-        date_format = "%Y-%m-%dT%H:%M:%S"
-        
-        if data.get('preferredValidFrom'):
-            try:
-                preferences['PreferredValidFrom'] = datetime.strptime(
-                    data['preferredValidFrom'], 
-                    date_format
-                ).isoformat()
-            except ValueError as e:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Invalid preferredValidFrom date format. Use YYYY-MM-DDThh:mm:ss'
-                }), 400
+def parse_include_explanations(data):
+    # Clients that do not display explanations can skip computing them
+    include_explanations = data.get('includeExplanations', True)
+    if isinstance(include_explanations, str):
+        include_explanations = include_explanations.strip().lower() not in ('false', '0', 'no')
+    return bool(include_explanations)
 
-        if data.get('preferredValidTo'):
-            try:
-                preferences['PreferredValidTo'] = datetime.strptime(
-                    data['preferredValidTo'], 
-                    date_format
-                ).isoformat()
-            except ValueError as e:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Invalid preferredValidTo date format. Use YYYY-MM-DDThh:mm:ss'
-                }), 400
 
-        # Validate and parse numeric parameters
-        try:
-            top_n = int(data['top_n'])
-            if top_n <= 0:
-                return jsonify({
-                    'status': 'error',
-                    'message': 'top_n must be greater than 0'
-                }), 400
+@app.route('/content-recommendations', methods=['POST'])
+def get_content_recommendations():
+    try:
+        data = request.json
 
-            longitude = float(data['longitude'])
-            latitude = float(data['latitude'])
+        logger.debug(f"Content Recommendation Request: {data}")
 
-            # Basic coordinate validation
-            if not (-180 <= longitude <= 180 and -90 <= latitude <= 90):
-                return jsonify({
-                    'status': 'error',
-                    'message': 'Invalid coordinates'
-                }), 400
+        if not data:
+            return jsonify({'status': 'error', 'message': 'No data provided'}), 400
 
+        try:
+            preferences, top_n, longitude, latitude = parse_content_request(data)
         except ValueError as e:
-            logger.error(f"Parameter parsing error: {e}")
             return jsonify({
                 'status': 'error',
-                'message': 'Invalid numeric parameters'
+                'message': str(e)
             }), 400
 
-        # Validate quantity constraints
-        min_qty = preferences['MinimumAvailableQuantity']
-        max_qty = preferences['MaximumAvailableQuantity']
-        if min_qty > max_qty:
-            return jsonify({
-                'status': 'error',
-                'message': 'MinimumAvailableQuantity cannot be greater than MaximumAvailableQuantity'
-            }), 400
+        include_explanations = parse_include_explanations(data)
+        # Optional; adds collaborative affinity to the rerank
+        user_id = str(data['userId']) if data.get('userId') else None
 
         # Log the processed request
         logger.info(f"Processing recommendation request with parameters: top_n={top_n}, "
-                   f"location=({latitude}, {longitude})")
+                   f"location=({latitude}, {longitude}), user={user_id}")
 
         # Generate recommendations
         try:
             content_recommendation = recommender.get_content_based_recommendations(
-                preferences, top_n, longitude, latitude
+                preferences, top_n, longitude, latitude, include_explanations, user_id
             )
 
             if not content_recommendation:
@@ -522,11 +1217,287 @@ def get_content_recommendations():
         }), 500
 
 
+@app.route('/hybrid-recommendations', methods=['POST'])
+def get_hybrid_recommendations():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'status': 'error', 'message': 'No data provided'}), 400
+
+        try:
+            preferences, top_n, longitude, latitude = parse_content_request(data)
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'message': str(e)
+            }), 400
+
+        # Without a user the collaborative signal is left out
+        user_id = str(data['userId']) if data.get('userId') else None
+        include_explanations = parse_include_explanations(data)
+
+        logger.info(f"Processing hybrid recommendation request with parameters: top_n={top_n}, "
+                   f"location=({latitude}, {longitude}), user={user_id}")
+
+        try:
+            recommendations = recommender.get_hybrid_recommendations(
+                user_id, preferences, top_n, longitude, latitude, include_explanations
+            )
+            return jsonify({
+                'status': 'success',
+                'recommendations': recommendations
+            }), 200
+
+        except Exception as e:
+            logger.error(f"Error generating hybrid recommendations: {e}")
+            logger.error(traceback.format_exc())
+            return jsonify({
+                'status': 'error',
+                'message': 'Error generating recommendations'
+            }), 500
+
+    except Exception as e:
+        logger.error(f"Unexpected error in hybrid recommendation endpoint: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            'status': 'error',
+            'message': 'An unexpected error occurred'
+        }), 500
+
+
+@app.route('/content-recommendations/batch', methods=['POST'])
+def get_batch_content_recommendations():
+    try:
+        data = request.json
+
+        if not data or not isinstance(data.get('requests'), list):
+            return jsonify({'status': 'error', 'message': 'No requests provided'}), 400
+
+        if len(data['requests']) > MAX_BATCH_SIZE:
+            return jsonify({
+                'status': 'error',
+                'message': f'A batch may contain at most {MAX_BATCH_SIZE} requests'
+            }), 400
+
+        batch = []
+        for i, item in enumerate(data['requests']):
+            if not isinstance(item, dict):
+                return jsonify({'status': 'error', 'message': f'Request {i}: invalid request'}), 400
+            try:
+                preferences, top_n, longitude, latitude = parse_content_request(item)
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': f'Request {i}: {e}'}), 400
+            batch.append({
+                'preferences': preferences,
+                'top_n': top_n,
+                'longitude': longitude,
+                'latitude': latitude,
+                'user_id': str(item['userId']) if item.get('userId') else None
+            })
+
+        include_explanations = parse_include_explanations(data)
+
+        logger.info(f"Processing batch recommendation request with {len(batch)} requests")
+
+        try:
+            batch_recommendations = recommender.get_batch_content_recommendations(
+                batch, include_explanations
+            )
+            return jsonify({
+                'status': 'success',
+                'results': [
+                    {
+                        'userId': item.get('userId'),
+                        'recommendations': recommendations
+                    }
+                    for item, recommendations in zip(data['requests'], batch_recommendations)
+                ]
+            }), 200
+
+        except Exception as e:
+            logger.error(f"Error generating batch recommendations: {e}")
+            logger.error(traceback.format_exc())
+            return jsonify({
+                'status': 'error',
+                'message': 'Error generating recommendations'
+            }), 500
+
+    except Exception as e:
+        logger.error(f"Unexpected error in batch recommendation endpoint: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            'status': 'error',
+            'message': 'An unexpected error occurred'
+        }), 500
+
+
+@app.route('/cache-stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        'status': 'success',
+        'cache': recommender.cache.stats()
+    }), 200
+
+
+@app.route('/pipeline-stats', methods=['GET'])
+def get_pipeline_stats():
+    # Per stage of the content ranking pipeline, in this process
+    return jsonify({
+        'status': 'success',
+        'stages': recommender.pipeline.stats()
+    }), 200
+
+
+@app.route('/catalog-stats', methods=['GET'])
+def get_catalog_stats():
+    snapshot = recommender.snapshot
+    return jsonify({
+        'status': 'success',
+        'catalog_version': snapshot.version,
+        'products': len(snapshot),
+        'active_products': int(snapshot.active_mask.sum()),
+        'memory': snapshot.memory_report()
+    }), 200
+
+
+@app.route('/job-status', methods=['GET'])
+def get_job_status():
+    # Jobs are scheduled by another process under gunicorn; it publishes
+    # their status to JOB_STATUS_PATH
+    if job_runner is not None:
+        jobs = job_runner.status()
+    else:
+        jobs = (read_job_status(JOB_STATUS_PATH) or {}).get('jobs')
+    if jobs is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'No job status available'
+        }), 404
+    return jsonify({
+        'status': 'success',
+        'jobs': jobs
+    }), 200
+
+
+@app.route('/feedback', methods=['POST'])
+def post_feedback():
+    """Queue like/unlike events for this process's feedback index.
+
+    They are applied in one batch by the next feedback sync, within
+    FEEDBACK_SYNC_SECONDS. The database stays the source of truth: every
+    process, including the other workers, reads the feedback stored there
+    since its last sync at the same interval.
+    """
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'status': 'error', 'message': 'No data provided'}), 400
+
+        events = data.get('events', [data])
+        if not isinstance(events, list) or not events:
+            return jsonify({'status': 'error', 'message': 'events must be a non-empty list'}), 400
+        for event in events:
+            if not isinstance(event, dict) or 'userId' not in event or 'productId' not in event:
+                return jsonify({'status': 'error', 'message': 'Each event needs userId and productId'}), 400
+
+        recommender.record_feedback(
+            [str(event['userId']) for event in events],
+            [str(event['productId']) for event in events],
+            [bool(event.get('isLiked', True)) for event in events]
+        )
+        return jsonify({'status': 'success', 'applied': len(events)}), 200
+
+    except Exception as e:
+        logger.error(f"Unexpected error in feedback endpoint: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            'status': 'error',
+            'message': 'An unexpected error occurred'
+        }), 500
+
+
+def parse_model_request(data):
+    """Validate a userId/top_n/likedProductIds payload of the model-based endpoints.
+
+    Returns (user_id, top_n, liked_product_ids); raises ValueError with a
+    client-facing message when the payload is invalid.
+    """
+    if 'userId' not in data:
+        raise ValueError('Missing required parameter: userId')
+
+    try:
+        top_n = int(data.get('top_n', 10))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid numeric parameters')
+    if top_n <= 0:
+        raise ValueError('top_n must be greater than 0')
+
+    liked_product_ids = data.get('likedProductIds') or []
+    if not isinstance(liked_product_ids, list):
+        raise ValueError('likedProductIds must be a list')
+
+    return str(data['userId']), top_n, liked_product_ids
+
+
+@app.route('/item-recommendations', methods=['POST'])
+def get_item_recommendations():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'status': 'error', 'message': 'No data provided'}), 400
+
+        try:
+            user_id, top_n, liked_product_ids = parse_model_request(data)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+        recommendations = recommender.get_item_based_recommendations(user_id, top_n, liked_product_ids)
+        return jsonify({
+            'status': 'success',
+            'recommendations': recommendations
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Unexpected error in item recommendation endpoint: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            'status': 'error',
+            'message': 'An unexpected error occurred'
+        }), 500
+
+
+@app.route('/factor-recommendations', methods=['POST'])
+def get_factor_recommendations():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({'status': 'error', 'message': 'No data provided'}), 400
+
+        try:
+            user_id, top_n, liked_product_ids = parse_model_request(data)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+        recommendations = recommender.get_factor_recommendations(user_id, top_n, liked_product_ids)
+        return jsonify({
+            'status': 'success',
+            'recommendations': recommendations
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Unexpected error in factor recommendation endpoint: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({
+            'status': 'error',
+            'message': 'An unexpected error occurred'
+        }), 500
+
+
 @app.route('/collaborative-recommendations', methods=['POST'])
 def get_collaborative_recommendations():
     try:
         data = request.json
-        print("Collaborative Recommendation Request: ", data)
+        logger.debug(f"Collaborative Recommendation Request: {data}")
         if not data:
             return jsonify({'status': 'error', 'message': 'No data provided'}), 400
 
@@ -652,7 +1623,52 @@ def get_collaborative_recommendations():
 
 
 
+# Live user neighbor model of the process that runs CreateUserUserMatrix,
+# with the vectorizer for new users' preference text and the CreatedOn of
+# the newest feedback it has seen; kept current by UpdateUserNeighbors
+user_neighbor_model = None
+user_profile_vectorizer = None
+user_feedback_watermark = None
+user_neighbor_lock = threading.Lock()
+
+
+def fetch_profile_tables(connection):
+    """ The (userpreferences, aspnetusers, companies) tables that user profiles are built from. """
+    user_preference_result = connection.execute(text("SELECT * FROM userpreferences"))
+    user_preference_data = pd.DataFrame(user_preference_result.fetchall(), columns=user_preference_result.keys())
+    user_result = connection.execute(text("SELECT * FROM aspnetusers"))
+    user_data = pd.DataFrame(user_result.fetchall(), columns=user_result.keys())
+    company_result = connection.execute(text("SELECT * FROM companies"))
+    company_data = pd.DataFrame(company_result.fetchall(), columns=company_result.keys())
+    return user_preference_data, user_data, company_data
+
+
+def feedback_has_created_on(connection):
+    """ Whether userfeedback has the CreatedOn column that incremental feedback reads need. """
+    result = connection.execute(text("SELECT * FROM userfeedback LIMIT 0"))
+    return any(column.lower() == 'createdon' for column in result.keys())
+
+
+def user_profile_text(user_preference_data, user_data, company_data, user_ids):
+    """ One "Column: value" preference string per user in `user_ids` that has preferences, indexed by UserId. """
+    # Deduplicate before joining: one preference profile per user (the
+    # first, as before)
+    profiles = user_preference_data.drop_duplicates(subset='UserId')
+    profiles = profiles[profiles['UserId'].isin(user_ids)]
+    merged_df = pd.merge(profiles, user_data.drop_duplicates(subset='Id'), how='left', left_on='UserId', right_on='Id', suffixes=('', '_user'))
+    merged_df = pd.merge(merged_df, company_data.drop_duplicates(subset='Id'), how='left', left_on='CompanyId', right_on='Id', suffixes=('', '_company'))
+
+    # Built column-wise
+    parts = [
+        f"{col}: " + merged_df[col].astype(object).where(merged_df[col].notna(), "").map(str)
+        for col in USER_PROFILE_COLUMNS
+    ]
+    return pd.Series(parts[0].str.cat(parts[1:], sep=", ").to_numpy(), index=merged_df['UserId'].to_numpy())
+
+
 def CreateUserUserMatrix():
+    """ Full build of the user neighbor lists; also the consistency check for the incremental updates. """
+    global user_neighbor_model, user_profile_vectorizer, user_feedback_watermark
     try:
         DB_HOST = os.getenv('DB_HOST', 'localhost') 
         DB_PORT = os.getenv('DB_PORT', '3306')
@@ -661,138 +1677,201 @@ def CreateUserUserMatrix():
         DB_NAME = os.getenv('DB_NAME', 'SymbioDb')
 
         engine = create_engine(
-            f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}',
+            DATABASE_URL or f'mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}',
             pool_pre_ping=True,
             pool_recycle=3600
         )
 
+        # Updates applied while this build runs are lost with the old model,
+        # so hold the lock throughout
+        with user_neighbor_lock:
+            try:
+                with engine.connect() as connection:
+                    # Without UserFeedback.CreatedOn there is no watermark to
+                    # update from, and only this full build runs
+                    created_on = feedback_has_created_on(connection)
+                    if not created_on:
+                        logger.warning(
+                            "userfeedback has no CreatedOn column; incremental user neighbor updates are disabled"
+                        )
+                    user_feedback_query = f"""
+                        SELECT UserId, ProductId, IsLiked{', CreatedOn' if created_on else ''} FROM userfeedback
+                    """
+                    user_preference_data, user_data, company_data = fetch_profile_tables(connection)
+                    user_feedback_result = connection.execute(text(user_feedback_query))
+                    user_feedback_data = pd.DataFrame(user_feedback_result.fetchall(), columns=user_feedback_result.keys())
+
+            except Exception as e:
+                raise
+
+            # Only users that gave feedback
+            profile_text = user_profile_text(user_preference_data, user_data, company_data, user_feedback_data['UserId'])
+
+            # -----------------------------------------
+            # 1) Build the user x product feedback matrix
+            # -----------------------------------------
+            # Straight from the (UserId, ProductId) codes into a sparse matrix,
+            # keeping the highest IsLiked per pair
+            user_ids = pd.Index(profile_text.index, dtype=object).sort_values()
+            collab_matrix, user_ids, product_ids = interaction_matrix(
+                user_feedback_data['UserId'], user_feedback_data['ProductId'], user_feedback_data['IsLiked'],
+                users=user_ids
+            )
 
-        df = pd.DataFrame()
-
-        user_preference_query = """
-            SELECT * FROM userpreferences
-        """
-        user_query = """
-            SELECT * FROM aspnetusers
-        """
-        user_feedback_query = """
-            SELECT * FROM userfeedback
-        """
-        company_query = """
-            SELECT * FROM companies
-        """
-        merged_df = pd.DataFrame()
-        user_preference_data = pd.DataFrame()
-        user_data = pd.DataFrame()
-        user_feedback_data = pd.DataFrame()
-        company_data = pd.DataFrame()
-        company_data = pd.DataFrame()
+            # -----------------------------------------
+            # 2) Build the TF-IDF-based features
+            # -----------------------------------------
+            # Content-based features, in the same user order as the feedback rows
+            vectorizer = TfidfVectorizer()
+            tfidf_matrix = vectorizer.fit_transform(profile_text.loc[user_ids])
+
+            # -----------------------------------------
+            # 3) Combine the two similarity measures
+            # -----------------------------------------
+            # Example approach: Weighted average
+            alpha = 0.5  # you can pick any weighting (0 < alpha < 1)
+            # Only the top neighbors of each user are kept; the full n_users x
+            # n_users matrix is never materialized
+            model = UserNeighborModel.build(
+                user_ids, product_ids, collab_matrix, tfidf_matrix, [alpha, 1 - alpha],
+                k=USER_NEIGHBORS_K, block_cells=USER_SIMILARITY_BLOCK_CELLS
+            )
+            log_neighbor_drift(user_neighbor_model, model)
+
+            user_neighbor_model = model
+            user_profile_vectorizer = vectorizer
+            watermark = None
+            if created_on and len(user_feedback_data):
+                watermark = pd.to_datetime(user_feedback_data['CreatedOn']).max()
+            user_feedback_watermark = None if pd.isna(watermark) else watermark
+
+            # Exporting for later use
+            index = model.index()
+            save_user_similarity(USER_SIMILARITY_PATH, index.user_ids, index.neighbors_of, index.scores)
+    except Exception as e:
+        logger.error(f"User-user matrix build failed: {e}")
+        raise
 
-        try:
-            with engine.connect() as connection:
-                user_preference_result = connection.execute(text(user_preference_query))
-                user_result = connection.execute(text(user_query))
-                user_feedback_result = connection.execute(text(user_feedback_query))
-                company_result = connection.execute(text(company_query))
 
-                
-                user_preference_data = pd.DataFrame(user_preference_result.fetchall(), columns=user_preference_result.keys())
-                user_data = pd.DataFrame(user_result.fetchall(), columns=user_result.keys())
-                user_feedback_data = pd.DataFrame(user_feedback_result.fetchall(), columns=user_feedback_result.keys())
-                company_data = pd.DataFrame(company_result.fetchall(), columns=company_result.keys())
+def log_neighbor_drift(incremental, rebuilt, k=5):
+    """ Log how far the incrementally updated top-k lists had drifted from a full rebuild. """
+    if incremental is None:
+        return
+    incremental, rebuilt = incremental.index(), rebuilt.index()
+    common = [u for u in rebuilt.row_of if u in incremental.row_of]
+    differing = sum(
+        set(incremental.neighbors(u, k)) != set(rebuilt.neighbors(u, k)) for u in common
+    )
+    logger.info(
+        f"User neighbor consistency check: top-{k} lists of {differing} of {len(common)} users "
+        f"differed from the full rebuild"
+    )
 
 
+def UpdateUserNeighbors():
+    """ Fold feedback given since the last build or update into the live user neighbor lists. """
+    global user_feedback_watermark
+    with user_neighbor_lock:
+        model = user_neighbor_model
+        if model is None or user_feedback_watermark is None:
+            return
+        try:
+            with engine.connect() as connection:
+                # CreatedOn may have coarse precision, so the watermark itself is
+                # read again; applying an event twice changes nothing
+                events = read_frame(
+                    connection, FEEDBACK_SINCE_QUERY,
+                    {'since': pd.Timestamp(user_feedback_watermark).to_pydatetime()},
+                    chunk_rows=FETCH_CHUNK_ROWS
+                )
+                new_user_ids = [u for u in events['UserId'].unique().tolist() if u not in model.row_of]
+                new_profiles = user_profile_text(*fetch_profile_tables(connection), new_user_ids) if new_user_ids else pd.Series(dtype=object)
+            if events.empty:
+                return
+
+            start = time.perf_counter()
+            new_profiles = new_profiles[~new_profiles.index.duplicated()]
+            updated = model.apply_feedback(
+                events['UserId'], events['ProductId'], events['IsLiked'],
+                new_users=new_profiles.index.tolist(),
+                new_content=user_profile_vectorizer.transform(new_profiles) if len(new_profiles) else None
+            )
+            user_feedback_watermark = max(user_feedback_watermark, pd.to_datetime(events['CreatedOn']).max())
+            if updated:
+                index = model.index()
+                save_user_similarity(USER_SIMILARITY_PATH, index.user_ids, index.neighbors_of, index.scores)
+                logger.info(
+                    f"User neighbors updated for {updated} users ({len(new_profiles)} new) "
+                    f"in {time.perf_counter() - start:.2f}s"
+                )
         except Exception as e:
+            logger.error(f"User neighbor update failed: {e}")
             raise
 
-        merged_df = pd.merge(user_preference_data, user_data, how='left', left_on='UserId', right_on='Id', suffixes=('', '_user'))
-        merged_df = pd.merge(merged_df, company_data, how='left', left_on='CompanyId', right_on='Id', suffixes=('', '_company'))
-        merged_df = pd.merge(merged_df, user_feedback_data, how='inner', left_on='UserId', right_on='UserId', suffixes=('', '_feedback'))
-        merged_df['PreferredCategories2'] = merged_df['PreferredCategories2'].fillna('')
-        merged_df['PreferredCategories3'] = merged_df['PreferredCategories3'].fillna('')
-        merged_df['PreferredKeywords'] = merged_df['PreferredKeywords'].fillna('')
 
-        user_feedback_matrix = pd.pivot_table(merged_df, index='UserId', columns='ProductId', values='IsLiked', aggfunc='max', fill_value=0)
-        user_user_sim_matrix = pd.DataFrame(cosine_similarity(user_feedback_matrix))
+def CreateItemItemMatrix():
+    """Compute the top co-like neighbors per product from all likes and save them."""
+    try:
+        with engine.connect() as connection:
+            feedback = read_frame(connection, FEEDBACK_QUERY, chunk_rows=FETCH_CHUNK_ROWS)
 
+        likes, _, product_ids = interaction_matrix(feedback['UserId'], feedback['ProductId'], feedback['IsLiked'])
+        similarity = item_neighbors(likes, k=ITEM_NEIGHBORS_K)
+        save_item_similarity(ITEM_SIMILARITY_PATH, product_ids.astype(str), similarity)
+    except Exception as e:
+        logger.error(f"Item-item matrix build failed: {e}")
+        raise
 
-        user_feedback_matrix = pd.pivot_table(
-            merged_df, 
-            index='UserId', 
-            columns='ProductId', 
-            values='IsLiked', 
-            aggfunc='max', 
-            fill_value=0
-        )
 
-        # Collaborative filtering similarity
-        # This returns a NumPy array (n_users x n_users)
-        collab_sim_array = cosine_similarity(user_feedback_matrix)
-
-        # Make it a DataFrame, aligning rows & columns with user IDs
-        user_ids = user_feedback_matrix.index
-        user_user_sim_matrix = pd.DataFrame(collab_sim_array, 
-                                            index=user_ids, 
-                                            columns=user_ids)
-
-        # -----------------------------------------
-        # 2) Build the TF-IDF-based similarity matrix
-        # -----------------------------------------
-        # Ensure all columns used in "combined_text" exist and have no NaNs
-        cols_to_combine = [
-            "PreferredCategories1",
-            "PreferredCategories2",
-            "PreferredCategories3",
-            "PreferredUnitOfMeasures",
-            "PreferredKeywords",
-            "PreferredSupplyType",
-            "PreferredValidFrom",
-            "PreferredValidTo",
-            "NACECode"
-        ]
+def TrainALSModel():
+    """Train the implicit ALS factor model on all likes and save it."""
+    try:
+        with engine.connect() as connection:
+            feedback = read_frame(connection, FEEDBACK_QUERY, chunk_rows=FETCH_CHUNK_ROWS)
 
-        merged_df[cols_to_combine] = merged_df[cols_to_combine].fillna("")
-
-        # Convert each user row into a single combined string
-        def row_to_text(row):
-            parts = []
-            for col in cols_to_combine:
-                col_value = str(row[col])  # ensure string
-                parts.append(f"{col}: {col_value}")
-            return ", ".join(parts)
-
-        merged_df["combined_text"] = merged_df.apply(row_to_text, axis=1)
-
-        print(len(merged_df))
-        merged_df = merged_df.drop_duplicates(subset='UserId')
-        print(len(merged_df))
-
-        vectorizer = TfidfVectorizer()
-        tfidf_matrix = vectorizer.fit_transform(merged_df["combined_text"])
-
-        # Content-based similarity
-        # This returns a NumPy array (n_users x n_users)
-        content_sim_array = cosine_similarity(tfidf_matrix)
-
-        # Make it a DataFrame with the same index (UserId)
-        # IMPORTANT: merged_df is already indexed by 'UserId'
-        content_sim_matrix = pd.DataFrame(content_sim_array, 
-                                        index=merged_df['UserId'], 
-                                        columns=merged_df['UserId'])
-
-        # -----------------------------------------
-        # 3) Combine the two similarity matrices
-        # -----------------------------------------
-        # Example approach: Weighted average
-        alpha = 0.5  # you can pick any weighting (0 < alpha < 1)
-        combined_sim_matrix = alpha * user_user_sim_matrix + (1 - alpha) * content_sim_matrix
-        # combined_sim_matrix is now a DataFrame with user-based similarity
-        # that incorporates both collaborative filtering and content-based features.
-
-        # Exporting for later use
-        combined_sim_matrix.to_csv("combined_user_user_similarity.csv", index=True)
+        likes, user_ids, product_ids = interaction_matrix(feedback['UserId'], feedback['ProductId'], feedback['IsLiked'])
+        start = time.perf_counter()
+        user_factors, item_factors = train_implicit_als(
+            likes, factors=ALS_FACTORS, regularization=ALS_REGULARIZATION, alpha=ALS_ALPHA,
+            iterations=ALS_ITERATIONS, blas_threads=ALS_BLAS_THREADS
+        )
+        logger.info(f"ALS model trained on {likes.nnz} likes in {time.perf_counter() - start:.1f}s")
+        save_als_model(
+            ALS_MODEL_PATH, user_ids.astype(str), product_ids.astype(str), user_factors, item_factors,
+            regularization=ALS_REGULARIZATION, alpha=ALS_ALPHA
+        )
     except Exception as e:
-        print(e)
+        logger.error(f"ALS model training failed: {e}")
+        raise
+
+
+def RefreshCatalog():
+    """ Catalog delta sync or full refit, published to INDEX_DIR for the serving processes to follow. """
+    # The first run maps the current artifact; later runs continue from the
+    # snapshot this process already holds
+    create_app()
+    recommender.refresh_catalog()
+
+
+def run_catalog_sync():
+    """ Periodically pull catalog changes into the recommender. """
+    while True:
+        time.sleep(CATALOG_SYNC_SECONDS)
+        try:
+            recommender.refresh_catalog()
+        except Exception as e:
+            logger.error(f"Catalog sync failed: {e}")
+            logger.error(traceback.format_exc())
+
+
+def run_feedback_sync():
+    """ Periodically apply new feedback to the index, so every process converges on the database. """
+    while True:
+        time.sleep(FEEDBACK_SYNC_SECONDS)
+        try:
+            recommender.sync_feedback()
+        except Exception as e:
+            logger.error(f"Feedback sync failed: {e}")
 
 
 def run_scheduler():
@@ -801,6 +1880,131 @@ def run_scheduler():
         schedule.run_pending()
         time.sleep(1)
 
+
+def run_index_follower():
+    """ Pick up catalog snapshots published by the maintenance process. """
+    while True:
+        time.sleep(INDEX_POLL_SECONDS)
+        try:
+            recommender.follow_catalog_index()
+        except Exception as e:
+            logger.error(f"Loading published catalog index failed: {e}")
+
+
+def init_job_process(parent_pid):
+    """ Set up a job pool process: its own database engine, below the serving processes' priority. """
+    global engine
+    if JOB_NICE:
+        os.nice(JOB_NICE)
+    engine = create_db_engine()
+    threading.Thread(target=exit_with_parent, args=(parent_pid,), daemon=True).start()
+
+
+def exit_with_parent(parent_pid):
+    """ Pool processes must not outlive the process that schedules their jobs. """
+    while os.getppid() == parent_pid:
+        time.sleep(5)
+    os._exit(0)
+
+
+def create_job_runner():
+    """ The process pools the offline jobs run in, one lane per kind of state. """
+    runner = JobRunner(
+        {'default': JOB_WORKERS, 'user_neighbors': 1, 'catalog': 1},
+        status_path=JOB_STATUS_PATH,
+        initializer=init_job_process,
+        initargs=(os.getpid(),)
+    )
+    # The live user neighbor model and the catalog snapshot stay in their
+    # lane's single process from one run to the next
+    runner.register(CreateUserUserMatrix, lane='user_neighbors')
+    runner.register(UpdateUserNeighbors, lane='user_neighbors')
+    runner.register(RefreshCatalog, lane='catalog')
+    runner.register(CreateItemItemMatrix)
+    runner.register(TrainALSModel)
+    return runner
+
+
+# Job runner of the process that schedules the offline jobs
+job_runner = None
+
+
+def start_background_jobs(catalog_sync=True, feedback_sync=True):
+    """ Start the offline job schedule and, optionally, the catalog and feedback syncs. """
+    global job_runner
+    job_runner = create_job_runner()
+
+    # 1) Build the collaborative models now and once a day
+    for job in ('CreateUserUserMatrix', 'CreateItemItemMatrix', 'TrainALSModel'):
+        job_runner.submit(job)
+        schedule.every(1).day.do(job_runner.submit, job)
+    # Between full builds, new feedback reaches the user neighbor lists here
+    schedule.every(NEIGHBOR_UPDATE_SECONDS).seconds.do(job_runner.submit, 'UpdateUserNeighbors')
+
+    # 2) Keep the product catalog in sync without restarting. With INDEX_DIR
+    # the sync runs as a job and the serving processes follow its artifacts.
+    if catalog_sync:
+        if INDEX_DIR:
+            schedule.every(CATALOG_SYNC_SECONDS).seconds.do(job_runner.submit, 'RefreshCatalog')
+        else:
+            threading.Thread(target=run_catalog_sync, daemon=True).start()
+
+    # 3) Start the scheduler in a separate thread
+    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
+    scheduler_thread.start()
+
+    if feedback_sync:
+        threading.Thread(target=run_feedback_sync, daemon=True).start()
+
+
+def run_maintenance(parent_pid):
+    """ Body of the maintenance process that runs next to the pre-fork workers. """
+    # Connections inherited from the master must not be shared
+    engine.dispose(close=False)
+    # Without INDEX_DIR the workers cannot follow this process's catalog and
+    # sync their own; feedback is always synced by the workers that serve it
+    start_background_jobs(catalog_sync=bool(INDEX_DIR), feedback_sync=False)
+    while os.getppid() == parent_pid:
+        time.sleep(5)
+
+
+def start_maintenance_process():
+    """Fork the process that owns scheduled jobs and catalog syncs.
+
+    Keeping these out of the master means the master never holds threads
+    when it forks workers, and out of the workers means the catalog is
+    refreshed once, not once per worker; workers follow the artifacts it
+    publishes to INDEX_DIR. The process exits when the master goes away.
+    """
+    parent_pid = os.getpid()
+    pid = os.fork()
+    if pid == 0:
+        # Drop the signal handlers installed by the server in the master
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGQUIT, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+        try:
+            run_maintenance(parent_pid)
+        except Exception as e:
+            logger.error(f"Maintenance process failed: {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            os._exit(0)
+
+    logger.info(f"Started maintenance process {pid}")
+    return pid
+
+
+def init_worker():
+    """ Per-worker setup after fork. """
+    engine.dispose(close=False)
+    if INDEX_DIR:
+        target = run_index_follower
+    else:
+        # Without a shared artifact each worker keeps its own catalog in sync
+        target = run_catalog_sync
+    threading.Thread(target=target, daemon=True).start()
+    threading.Thread(target=run_feedback_sync, daemon=True).start()
+
 if __name__ == '__main__':
     # Configure logging
     logging.basicConfig(
@@ -813,6 +2017,7 @@ if __name__ == '__main__':
     )
     
     logger.info("Starting Recommendation System Server")
+    create_app()
     
     try:
         # Test database connection
@@ -822,18 +2027,12 @@ if __name__ == '__main__':
         logger.error(f"Database connection failed: {e}")
         raise
     
-    CreateUserUserMatrix()
-    schedule.every(1).day.do(CreateUserUserMatrix)
-
-
-    
-    # 2) Start the scheduler in a separate thread
-    scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
-    scheduler_thread.start()
-
+    start_background_jobs()
+    if INDEX_DIR:
+        # Catalog syncs run in the job pool; serve what they publish
+        threading.Thread(target=run_index_follower, daemon=True).start()
 
-        # time.sleep(1)
-    # Run the Flask application
+    # Development server; use gunicorn (see gunicorn.conf.py) in production
     app.run(
         debug=False,  # Set to False in production
         host='0.0.0.0',
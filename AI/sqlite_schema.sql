@@ -0,0 +1,74 @@
+-- SQLite stand-in for the tables the recommender reads from SymbioDb.
+-- Only the columns used by recommender_system_v3.py are included; types
+-- follow what the MariaDB driver returns to pandas (GUIDs and coordinates
+-- as text, dates as ISO strings).
+
+CREATE TABLE IF NOT EXISTS Locations (
+    Id TEXT PRIMARY KEY,
+    Latitude TEXT,
+    Longitude TEXT
+);
+
+CREATE TABLE IF NOT EXISTS Companies (
+    Id TEXT PRIMARY KEY,
+    Name TEXT,
+    NACECode TEXT,
+    LocationId TEXT REFERENCES Locations (Id)
+);
+
+CREATE TABLE IF NOT EXISTS Products (
+    Id TEXT PRIMARY KEY,
+    Name TEXT,
+    Description TEXT,
+    SupplyType TEXT,
+    Categories TEXT,
+    ValidFrom TEXT,
+    ValidTo TEXT,
+    CreatedOn TEXT,
+    CompanyId TEXT REFERENCES Companies (Id)
+);
+
+CREATE TABLE IF NOT EXISTS Materials (
+    Id TEXT PRIMARY KEY,
+    Name TEXT,
+    Description TEXT,
+    AvailableQuantity INTEGER,
+    UnitOfMeasure TEXT,
+    ProductId TEXT REFERENCES Products (Id)
+);
+
+CREATE TABLE IF NOT EXISTS UserFeedback (
+    Id INTEGER PRIMARY KEY AUTOINCREMENT,
+    UserId TEXT,
+    ProductId TEXT REFERENCES Products (Id),
+    IsLiked INTEGER,
+    CreatedOn TEXT
+);
+
+CREATE TABLE IF NOT EXISTS aspnetusers (
+    Id TEXT PRIMARY KEY,
+    CompanyId TEXT REFERENCES Companies (Id),
+    Email TEXT
+);
+
+CREATE TABLE IF NOT EXISTS userpreferences (
+    Id TEXT PRIMARY KEY,
+    UserId TEXT REFERENCES aspnetusers (Id),
+    PreferredKeywords TEXT,
+    MaxSearchRadiusKM TEXT,
+    MinimumAvailableQuantity REAL,
+    MaximumAvailableQuantity REAL,
+    PreferredSupplyType TEXT,
+    PreferredUnitOfMeasures TEXT,
+    PreferredValidFrom TEXT,
+    PreferredValidTo TEXT,
+    PreferredCategories1 TEXT,
+    PreferredCategories2 TEXT,
+    PreferredCategories3 TEXT
+);
+
+CREATE INDEX IF NOT EXISTS ix_products_validto ON Products (ValidTo);
+CREATE INDEX IF NOT EXISTS ix_products_createdon ON Products (CreatedOn);
+CREATE INDEX IF NOT EXISTS ix_materials_productid ON Materials (ProductId);
+CREATE INDEX IF NOT EXISTS ix_userfeedback_userid ON UserFeedback (UserId);
+CREATE INDEX IF NOT EXISTS ix_userfeedback_createdon ON UserFeedback (CreatedOn);
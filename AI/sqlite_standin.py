@@ -0,0 +1,105 @@
+"""Create a local SQLite stand-in for SymbioDb, filled with synthetic data.
+
+    python sqlite_standin.py symbio.db --products 100000 --users 2000
+    DATABASE_URL=sqlite:///symbio.db python recommender_system_v3.py
+
+The tables follow sqlite_schema.sql. This allows the streaming catalog load,
+delta sync and collaborative filtering to be run without a MariaDB server.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sqlite3
+import uuid
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sqlite_schema.sql')
+
+WORDS = [
+    'recycled', 'pallets', 'steel', 'scrap', 'oak', 'pine', 'bottles', 'fabric', 'cotton',
+    'cardboard', 'solvent', 'copper', 'aluminium', 'bricks', 'concrete', 'circuit', 'boards',
+    'residue', 'granulate', 'sheets'
+]
+CATEGORIES = ['Wood', 'Metal', 'Plastic', 'Glass', 'Textile', 'Paper', 'Chemicals', 'Food waste']
+SUPPLY_TYPES = ['Waste', 'Surplus', 'By-product']
+UNITS = ['kg', 'ton', 'm3', 'pieces']
+
+
+def create_schema(connection):
+    with open(SCHEMA_PATH) as f:
+        connection.executescript(f.read())
+
+
+def seed(connection, products, users, locations, seed=0):
+    rnd = random.Random(seed)
+    new_id = lambda: str(uuid.UUID(int=rnd.getrandbits(128)))
+    today = datetime.date.today()
+
+    location_ids = [new_id() for _ in range(locations)]
+    connection.executemany('INSERT INTO Locations VALUES (?, ?, ?)', [
+        (lid, str(51 + rnd.random() * 2), str(4 + rnd.random() * 3)) for lid in location_ids
+    ])
+    company_ids = [new_id() for _ in range(locations * 2)]
+    connection.executemany('INSERT INTO Companies VALUES (?, ?, ?, ?)', [
+        (cid, f'Company {i}', str(rnd.randint(10, 99)), rnd.choice(location_ids))
+        for i, cid in enumerate(company_ids)
+    ])
+
+    product_ids = []
+    product_rows = []
+    material_rows = []
+    for _ in range(products):
+        pid = new_id()
+        product_ids.append(pid)
+        name = ' '.join(rnd.sample(WORDS, 3))
+        valid_from = today - datetime.timedelta(days=rnd.randint(0, 300))
+        valid_to = today + datetime.timedelta(days=rnd.randint(-20, 400))
+        product_rows.append((
+            pid, name.title(), '', rnd.choice(SUPPLY_TYPES), json.dumps(rnd.sample(CATEGORIES, 3)),
+            valid_from.isoformat(), valid_to.isoformat(), f'{valid_from.isoformat()} 00:00:00',
+            rnd.choice(company_ids)
+        ))
+        material_rows.append((
+            new_id(), name, ', '.join(rnd.sample(WORDS, 6)), rnd.randint(1, 5000), rnd.choice(UNITS), pid
+        ))
+    connection.executemany('INSERT INTO Products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', product_rows)
+    connection.executemany('INSERT INTO Materials VALUES (?, ?, ?, ?, ?, ?)', material_rows)
+
+    for u in range(users):
+        uid = new_id()
+        categories = rnd.sample(CATEGORIES, 3)
+        connection.execute('INSERT INTO aspnetusers VALUES (?, ?, ?)', (uid, rnd.choice(company_ids), f'user{u}@example.com'))
+        connection.execute('INSERT INTO userpreferences VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+            new_id(), uid, ', '.join(rnd.sample(WORDS, 2)), '50', 10, 4000, rnd.choice(SUPPLY_TYPES),
+            rnd.choice(UNITS), '2024-01-01', f'{today.year + 2}-01-01', *categories
+        ))
+        connection.executemany('INSERT INTO UserFeedback (UserId, ProductId, IsLiked, CreatedOn) VALUES (?, ?, ?, ?)', [
+            (uid, pid, int(rnd.random() < 0.8), f'{today - datetime.timedelta(days=rnd.randint(1, 365))} 12:00:00')
+            for pid in rnd.sample(product_ids, min(products, rnd.randint(0, 15)))
+        ])
+    connection.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--products', type=int, default=10_000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--locations', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.exists(args.path):
+        os.remove(args.path)
+    connection = sqlite3.connect(args.path)
+    try:
+        create_schema(connection)
+        seed(connection, args.products, args.users, args.locations, args.seed)
+    finally:
+        connection.close()
+    print(f"Created {args.path}: {args.products} products, {args.users} users")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+from catalog_snapshot import CatalogSnapshot, FLOAT_COLUMNS, compact_catalog
+from content_index import ContentIndex
+
+
+def product(product_id, text, latitude, longitude, quantity=100.0, categories=('Metal',),
+            supply_type='waste', unit='kg', valid_from='2024-01-01', valid_to='2030-01-01'):
+    """One catalog row as fetch_catalog yields it, with `text` as its name."""
+    return {
+        'ProductId': product_id,
+        'ProductName': text,
+        'Categories': list(categories),
+        'SupplyType': supply_type,
+        'UnitOfMeasure': unit,
+        'AvailableQuantity': quantity,
+        'ValidFrom': valid_from,
+        'ValidTo': valid_to,
+        'CreatedOn': valid_from,
+        'LocationId': f'{latitude},{longitude}',
+        'Latitude': latitude,
+        'Longitude': longitude,
+    }
+
+
+def build_snapshot(products):
+    """A CatalogSnapshot over `product` rows, with their names as the indexed text."""
+    df = compact_catalog(pd.DataFrame(products))
+    content_index = ContentIndex.build(df['ProductName'], min_df=1, max_df=1.0)
+    scaler = MinMaxScaler()
+    numerical_features_scaled = scaler.fit_transform(df[FLOAT_COLUMNS])
+    return CatalogSnapshot.build(1, df, content_index, scaler, numerical_features_scaled)
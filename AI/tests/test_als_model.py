@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from als_model import _least_squares
+
+
+def row_by_row(confidence, fixed, regularization):
+    base = fixed.T @ fixed + regularization * np.eye(fixed.shape[1])
+    solved = np.zeros((confidence.shape[0], fixed.shape[1]))
+    for row in range(confidence.shape[0]):
+        start, end = confidence.indptr[row], confidence.indptr[row + 1]
+        factors = fixed[confidence.indices[start:end]]
+        weights = confidence.data[start:end]
+        solved[row] = np.linalg.solve(base + (factors.T * weights) @ factors, factors.T @ (weights + 1.0))
+    return solved
+
+
+@pytest.mark.parametrize('block_cells', [8_000_000, 500])
+def test_batched_solves_match_row_by_row(block_cells):
+    # Rows with fewer and with more entries than factors take different paths;
+    # empty rows stay zero, and a tiny block_cells splits rows into many blocks
+    rng = np.random.default_rng(0)
+    fixed = rng.normal(size=(40, 6))
+    dense = (rng.random((30, 40)) < 0.1) * rng.uniform(1, 40, size=(30, 40))
+    dense[3] = 0
+    dense[7, :20] = 40.0
+    dense[8] = rng.uniform(1, 40, size=40)
+    confidence = sparse.csr_matrix(dense)
+
+    solved = _least_squares(confidence, fixed, 0.1, block_cells=block_cells)
+
+    np.testing.assert_allclose(solved, row_by_row(confidence, fixed, 0.1), rtol=1e-9, atol=1e-12)
+    assert not solved[3].any()
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from filter_index import FilterIndex
+
+
+@pytest.fixture
+def index():
+    return FilterIndex.build(
+        categories=[['Metal', 'Wood'], ['Wood'], [], ['Glass'], 'Metal'],
+        supply_types=['Waste', 'waste ', 'Surplus', None, 'Surplus'],
+        units=['kg', 'KG', 'm3', 'kg', 'pieces'],
+        quantities=[10, 50, 0, 200, None],
+        valid_from=['2024-01-01', '2024-06-01', None, '2025-01-01', '2024-03-01'],
+        valid_to=['2024-12-31', '2024-09-30', '2024-02-01', None, 'not a date'],
+    )
+
+
+def rows(mask):
+    return list(np.flatnonzero(mask))
+
+
+def test_category_mask_ors_values_case_insensitively(index):
+    assert rows(index.category_mask(['metal'])) == [0, 4]
+    assert rows(index.category_mask(['GLASS', 'wood'])) == [0, 1, 3]
+    assert rows(index.category_mask(['Plastic'])) == []
+
+
+def test_joined_values_fall_back_to_their_parts(index):
+    assert rows(index.category_mask('Glass, Wood')) == [0, 1, 3]
+    assert rows(index.supply_type_mask(['surplus,waste'])) == [0, 1, 2, 4]
+
+
+def test_supply_type_and_unit_masks(index):
+    assert rows(index.supply_type_mask('waste')) == [0, 1]
+    assert rows(index.unit_mask(['kg', 'm3'])) == [0, 1, 2, 3]
+
+
+def test_quantity_range_is_inclusive(index):
+    # A missing quantity counts as 0
+    assert rows(index.quantity_mask(10, 50)) == [0, 1]
+    assert rows(index.quantity_mask(maximum=0)) == [2, 4]
+    assert rows(index.quantity_mask(minimum=100)) == [3]
+
+
+def test_validity_overlaps_window_with_open_ends(index):
+    # Missing or invalid dates never exclude a product on that side
+    assert rows(index.validity_mask('2024-10-01', '2024-11-01')) == [0, 4]
+    assert rows(index.validity_mask(valid_to='2024-01-15')) == [0, 2]
+    assert rows(index.validity_mask(valid_from='2025-06-01')) == [3, 4]
+
+
+def test_mask_ands_constraints(index):
+    assert index.mask({}) is None
+    assert index.mask({'PreferredCategories': [], 'MinimumAvailableQuantity': 0}) is None
+
+    mask = index.mask({
+        'PreferredCategories': ['Metal', 'Wood'],
+        'PreferredUnitOfMeasures': ['kg'],
+        'MinimumAvailableQuantity': 20,
+        'MaximumAvailableQuantity': float('inf'),
+    })
+    assert rows(mask) == [1]
+
+
+def test_round_trips_through_arrays(index):
+    restored = FilterIndex.from_arrays(index.arrays())
+    preferences = {'PreferredSupplyType': ['Surplus'], 'PreferredValidFrom': '2024-05-01'}
+
+    assert rows(restored.mask(preferences)) == rows(index.mask(preferences))
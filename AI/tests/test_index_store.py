@@ -0,0 +1,19 @@
+import numpy as np
+
+from catalog_fixtures import build_snapshot, product
+from index_store import current_artifact, load_snapshot, save_snapshot
+
+
+def test_artifact_round_trip_keeps_full_refit_time(tmp_path):
+    snapshot = build_snapshot([
+        product('a', 'steel scrap', 52.0, 5.0),
+        product('b', 'oak pallets', 52.1, 5.1, categories=('Wood',)),
+    ])
+
+    save_snapshot(snapshot, str(tmp_path), full_refit_at=1_700_000_000.0)
+    loaded, manifest = load_snapshot(current_artifact(str(tmp_path)))
+
+    assert manifest['full_refit_at'] == 1_700_000_000.0
+    assert manifest['created_at'] > manifest['full_refit_at']
+    assert list(loaded.df['ProductId']) == ['a', 'b']
+    np.testing.assert_allclose(loaded.content_index.matrix.toarray(), snapshot.content_index.matrix.toarray())
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from ranking import top_k_indices, top_k_with_ties
+
+
+@pytest.mark.parametrize('k', [1, 3, 5, 9])
+def test_top_k_matches_full_sort(k):
+    scores = np.random.default_rng(0).random(50)
+
+    expected = np.argsort(-scores, kind='stable')[:k]
+    assert list(top_k_indices(scores, k)) == list(expected)
+
+
+@pytest.mark.parametrize('k', [None, 6, 10])
+def test_top_k_beyond_length_sorts_everything(k):
+    scores = np.array([0.2, 0.9, 0.1, 0.9, 0.5, 0.0])
+
+    assert list(top_k_indices(scores, k)) == [1, 3, 4, 0, 2, 5]
+
+
+def test_top_k_empty_selection():
+    assert len(top_k_indices(np.array([0.3, 0.1]), 0)) == 0
+    assert len(top_k_indices(np.zeros(0), 3)) == 0
+
+
+def test_top_k_orders_ties_within_selection_by_position():
+    scores = np.array([0.5, 1.0, 0.5, 0.5, 1.0, 0.5])
+
+    assert list(top_k_indices(scores, 2)) == [1, 4]
+    top = top_k_indices(scores, 3)
+    assert list(top[:2]) == [1, 4]
+    assert scores[top[2]] == 0.5
+
+
+def test_top_k_with_ties_keeps_run_at_cut():
+    scores = np.array([0.5, 1.0, 0.5, 0.2, 0.5])
+
+    assert list(top_k_with_ties(scores, 2)) == [1, 0, 2, 4]
+
+
+def test_top_k_with_ties_all_equal_keeps_everything():
+    assert list(top_k_with_ties(np.zeros(5), 2)) == [0, 1, 2, 3, 4]
+
+
+def test_top_k_with_ties_without_tie_at_cut():
+    scores = np.array([0.5, 1.0, 0.5, 0.9])
+
+    assert list(top_k_with_ties(scores, 2)) == [1, 3]
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from catalog_fixtures import build_snapshot, product
+from ranking_pipeline import RankingContext, RankingPipeline, content_score, distance_score, text_retrieval
+
+
+def radius_filter(context):
+    rows, distances = context.snapshot.geo_index.within_radius(
+        context.latitude, context.longitude, context.preferences['MaxSearchRadiusKm']
+    )
+    context.rows, context.distances = rows, distances
+    context.max_radius = context.preferences['MaxSearchRadiusKm']
+
+
+def content_pipeline(k):
+    pipeline = RankingPipeline()
+    pipeline.add_stage('filter', radius_filter)
+    pipeline.add_stage('retrieve', text_retrieval(k))
+    pipeline.add_feature('content', content_score, 0.7)
+    pipeline.add_feature('distance', distance_score, 0.3)
+    return pipeline
+
+
+def rank(snapshot, pipeline, query, top_n=3, radius=1000):
+    context = RankingContext(
+        snapshot, {'MaxSearchRadiusKm': radius}, top_n, 5.0, 52.0,
+        snapshot.content_index.transform_query(query)
+    )
+    positions, scores, features = pipeline.rank(context)
+    return context, context.rows[positions], scores, features
+
+
+@pytest.fixture
+def far_then_near():
+    # Catalog order puts the far products first, so truncating ties by
+    # position would only keep those
+    products = [product(f'far{i}', 'steel scrap', 53.0 + i * 0.1, 5.0) for i in range(6)]
+    products += [product(f'near{i}', 'steel scrap', 52.0 + i * 0.01, 5.0) for i in range(3)]
+    return build_snapshot(products)
+
+
+@pytest.mark.parametrize('query', ['qwertyuiop', 'steel'])
+def test_text_ties_are_reranked_on_distance(far_then_near, query):
+    # Unknown terms (all scores 0) and identical texts (all scores equal)
+    # must not cut the candidates down to the first rows
+    context, rows, scores, _ = rank(far_then_near, content_pipeline(k=2), query)
+
+    assert len(context.rows) == len(far_then_near)
+    assert list(far_then_near.df['ProductId'].to_numpy()[rows]) == ['near0', 'near1', 'near2']
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_retrieval_truncates_distinct_text_scores():
+    snapshot = build_snapshot([
+        product('a', 'steel scrap copper', 52.0, 5.0),
+        product('b', 'steel pallets', 52.1, 5.0),
+        product('c', 'oak pallets', 52.2, 5.0),
+        product('d', 'glass bottles', 52.3, 5.0),
+    ])
+    context, rows, _, _ = rank(snapshot, content_pipeline(k=2), 'steel scrap', top_n=1)
+
+    assert len(context.rows) == 2
+    assert list(snapshot.df['ProductId'].to_numpy()[context.rows]) == ['a', 'b']
+
+
+def fixed_feature(values):
+    return lambda context: np.asarray(values)[context.rows]
+
+
+@pytest.fixture
+def five_products():
+    return build_snapshot([product(f'p{i}', 'steel scrap', 52.0 + i * 0.01, 5.0) for i in range(5)])
+
+
+def test_rank_orders_by_weighted_mean_of_features(five_products):
+    pipeline = RankingPipeline()
+    pipeline.add_feature('a', fixed_feature([1.0, 0.0, 0.5, 0.2, 0.9]), 0.75)
+    pipeline.add_feature('b', fixed_feature([0.0, 1.0, 0.5, 0.2, 0.1]), 0.25)
+    pipeline.add_feature('unused', lambda context: None, 1.0)
+    pipeline.add_feature('disabled', fixed_feature([0.0, 9.0, 0.0, 0.0, 0.0]), 0.0)
+    context = RankingContext(five_products, {}, 3, 5.0, 52.0, None)
+
+    positions, scores, features = pipeline.rank(context)
+
+    assert list(context.rows[positions]) == [0, 4, 2]
+    np.testing.assert_allclose(scores, [0.75, 0.7, 0.5])
+    assert sorted(features) == ['a', 'b']
+    np.testing.assert_allclose(features['b'], [0.0, 0.1, 0.5])
+
+
+def test_stages_run_in_order_and_features_see_their_candidates(five_products):
+    pipeline = RankingPipeline()
+    pipeline.add_stage('odd_rows_reversed', lambda context: context.keep(np.array([3, 1])))
+    pipeline.add_stage('first', lambda context: context.keep(np.array([0])))
+    pipeline.add_feature('score', fixed_feature([0.0, 0.2, 0.4, 0.6, 0.8]), 1.0)
+    context = RankingContext(five_products, {}, 5, 5.0, 52.0, None)
+
+    positions, scores, _ = pipeline.rank(context)
+
+    assert list(context.rows) == [3]
+    assert list(positions) == [0]
+    np.testing.assert_allclose(scores, [0.6])
+    stats = pipeline.stats()
+    assert stats['odd_rows_reversed']['mean_candidates_in'] == 5
+    assert stats['odd_rows_reversed']['mean_candidates_out'] == 2
+    assert stats['first']['mean_candidates_out'] == 1
+
+
+def test_rank_stops_when_a_stage_leaves_no_candidates(five_products):
+    pipeline = RankingPipeline()
+    pipeline.add_stage('nothing', lambda context: context.keep(np.zeros(0, dtype=np.int64)))
+    pipeline.add_stage('never', lambda context: pytest.fail('stage after an empty one ran'))
+    pipeline.add_feature('score', fixed_feature(np.ones(5)), 1.0)
+
+    positions, scores, features = pipeline.rank(RankingContext(five_products, {}, 3, 5.0, 52.0, None))
+
+    assert len(positions) == 0 and len(scores) == 0 and features == {}
+    assert 'never' not in pipeline.stats()
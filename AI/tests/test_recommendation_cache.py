@@ -0,0 +1,81 @@
+import types
+
+import pytest
+
+import recommendation_cache
+from recommendation_cache import LRUCache, RecommendationCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the cache's monotonic clock; advance it by setting `clock.now`."""
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(recommendation_cache, 'time', types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = LRUCache(maxsize=4, ttl=60)
+    cache.put('a', 1)
+
+    clock.now += 59
+    assert cache.get('a') == 1
+    clock.now += 1
+    assert cache.get('a') is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_without_ttl_entries_do_not_expire(clock):
+    cache = LRUCache(maxsize=4, ttl=None)
+    cache.put('a', 1)
+
+    clock.now += 10 ** 9
+    assert cache.get('a') == 1
+
+
+def test_least_recently_used_is_evicted():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_new_catalog_version_empties_both_levels():
+    cache = RecommendationCache()
+    cache.set_catalog_version(1)
+    preferences = {'PreferredKeywords': ['steel']}
+    vector_key = cache.vector_key(1, preferences)
+    result_key = cache.result_key(1, preferences, 5.0, 52.0, 10)
+    cache.query_vectors.put(vector_key, 'vector')
+    cache.results.put(result_key, ['result'])
+
+    cache.set_catalog_version(1)
+    assert cache.results.get(result_key) == ['result']
+
+    cache.set_catalog_version(2)
+    assert cache.query_vectors.get(vector_key) is None
+    assert cache.results.get(result_key) is None
+    assert cache.stats()['catalog_version'] == 2
+
+
+def test_result_key_normalizes_equivalent_requests():
+    cache = RecommendationCache(location_precision=3)
+    key = cache.result_key(
+        1, {'PreferredKeywords': ['Steel  Scrap'], 'MaxSearchRadiusKm': '50'}, 4.90412, 52.36761, 10
+    )
+
+    assert key == cache.result_key(
+        1, {'PreferredKeywords': 'steel scrap', 'MaxSearchRadiusKm': 50.0}, 4.9041, 52.3676, '10'
+    )
+    assert key != cache.result_key(
+        2, {'PreferredKeywords': ['Steel  Scrap'], 'MaxSearchRadiusKm': '50'}, 4.90412, 52.36761, 10
+    )
+    assert key != cache.result_key(
+        1, {'PreferredKeywords': ['Steel  Scrap'], 'MaxSearchRadiusKm': '50'}, 4.90412, 52.36761, 10, False
+    )
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from user_similarity import UserNeighborModel
+
+WEIGHTS = (0.5, 0.5)
+
+
+def features(n_users, n_products=12, n_terms=8, seed=0):
+    rng = np.random.default_rng(seed)
+    likes = (rng.random((n_users, n_products)) < 0.3).astype(np.float32)
+    content = rng.random((n_users, n_terms)).astype(np.float32)
+    return likes, content
+
+
+def build(likes, content, k):
+    user_ids = [f'u{i}' for i in range(len(likes))]
+    product_ids = [f'p{j}' for j in range(likes.shape[1])]
+    return UserNeighborModel.build(user_ids, product_ids, likes, content, WEIGHTS, k)
+
+
+def assert_same_lists(model, expected):
+    assert list(model.user_ids) == list(expected.user_ids)
+    np.testing.assert_array_equal(model.neighbors_of, expected.neighbors_of)
+    np.testing.assert_allclose(model.scores, expected.scores, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_update_matches_full_build_when_lists_hold_every_user(seed):
+    # With k = users - 1 every list holds every other user, so rescoring in
+    # place must give exactly the lists of a full build
+    likes, content = features(8, seed=seed)
+    model = build(likes, content, k=7)
+
+    changed = model.apply_feedback(['u1', 'u1', 'u5'], ['p0', 'p3', 'p11'], [1, 1, 1])
+
+    updated = likes.copy()
+    updated[1, [0, 3]] = 1
+    updated[5, 11] = 1
+    assert changed == int((updated != likes).any(axis=1).sum())
+    assert_same_lists(model, build(updated, content, k=7))
+
+
+def test_updated_user_gets_full_build_list_and_enters_others():
+    likes = np.zeros((5, 4), dtype=np.float32)
+    likes[0, 0] = likes[1, 1] = likes[2, 1] = likes[3, 2] = likes[4, 3] = 1
+    content = np.eye(5, dtype=np.float32)
+    model = build(likes, content, k=1)
+    assert model.neighbors_of[0, 0] != 4
+
+    # u4 now shares u0's only like, which makes it u0's best match
+    model.apply_feedback(['u4'], ['p0'], [1])
+
+    likes[4, 0] = 1
+    expected = build(likes, content, k=1)
+    np.testing.assert_array_equal(model.neighbors_of[[0, 4]], expected.neighbors_of[[0, 4]])
+    np.testing.assert_allclose(model.scores[[0, 4]], expected.scores[[0, 4]], rtol=1e-5)
+
+
+def test_repeated_and_known_feedback_changes_nothing():
+    likes, content = features(6)
+    model = build(likes, content, k=5)
+    before = model.neighbors_of.copy(), model.scores.copy()
+    row, col = np.argwhere(likes)[0]
+
+    assert model.apply_feedback([f'u{row}', 'unknown'], [f'p{col}', 'p0'], [1, 1]) == 0
+    assert model.apply_feedback(['u0'], ['p0'], [0]) == 0
+    np.testing.assert_array_equal(model.neighbors_of, before[0])
+    np.testing.assert_array_equal(model.scores, before[1])
+
+
+def test_new_users_and_products_match_full_build():
+    likes, content = features(6)
+    model = build(likes, content, k=6)
+    new_content = np.random.default_rng(5).random((1, content.shape[1])).astype(np.float32)
+
+    model.apply_feedback(['u6', 'u2'], ['p0', 'p12'], [1, 1], new_users=['u6'], new_content=new_content)
+
+    likes = np.vstack([np.hstack([likes, np.zeros((6, 1), dtype=np.float32)]), np.zeros((1, 13), dtype=np.float32)])
+    likes[6, 0] = likes[2, 12] = 1
+    assert_same_lists(model, build(likes, np.vstack([content, new_content]), k=6))
@@ -0,0 +1,132 @@
+import ast
+import json
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Replacing punctuation with spaces and then collapsing whitespace turns
+# every run of non-word characters into one space; the pattern does that in a
+# single pass and skips runs that already are a single space.
+NON_WORD_RUN_PATTERN = re.compile(r'[^\w\x00]{2,}|[^\w\x00 ]')
+
+# Columns are normalized as one string with rows separated by SEPARATOR, so
+# the regex runs once per column instead of once per row. SEPARATOR is not a
+# word character, so the pattern excludes it explicitly.
+SEPARATOR = '\x00'
+SEPARATOR_PADDING_PATTERN = re.compile(r' ?\x00 ?')
+
+# ASCII-only text (the common case) takes a bytes fast path: one translate
+# maps every non-word byte to a space, then only runs of spaces remain.
+ASCII_NON_WORD_TABLE = bytes(
+    b if chr(b).isalnum() or chr(b) == '_' or chr(b) == SEPARATOR else ord(' ')
+    for b in range(256)
+)
+ASCII_SPACE_RUN_PATTERN = re.compile(rb' {2,}')
+ASCII_SEPARATOR_PADDING_PATTERN = re.compile(rb' ?\x00 ?')
+
+
+def _normalize_joined(joined):
+    if joined.isascii():
+        data = joined.encode('ascii').lower().translate(ASCII_NON_WORD_TABLE)
+        data = ASCII_SEPARATOR_PADDING_PATTERN.sub(b'\x00', ASCII_SPACE_RUN_PATTERN.sub(b' ', data))
+        return data.decode('ascii')
+    return SEPARATOR_PADDING_PATTERN.sub(SEPARATOR, NON_WORD_RUN_PATTERN.sub(' ', joined.lower()))
+
+# Source columns of the content text, in the order (and with the weights, by
+# repetition) they appear in content_features
+TEXT_COLUMNS = ['ProductName', 'MaterialName', 'MaterialDescription', 'SupplyType', 'UnitOfMeasure']
+NUMERIC_COLUMNS = ['Latitude', 'Longitude', 'AvailableQuantity']
+
+
+def normalize_text(values):
+    """Lowercase, replace punctuation with spaces and collapse whitespace, for a whole column.
+
+    Missing values become ''.
+    """
+    values = pd.Series(values, copy=False)
+    text = values.where(values.notna(), '').astype(str)
+    if len(text) == 0:
+        return text
+
+    joined = SEPARATOR.join(text.tolist())
+    if joined.count(SEPARATOR) != len(text) - 1:
+        # A value contains the separator itself; fall back to per-row string ops
+        return (
+            text.str.lower()
+            .str.replace(SEPARATOR, ' ', regex=False)
+            .str.replace(NON_WORD_RUN_PATTERN, ' ', regex=True)
+            .str.strip(' ')
+        )
+
+    joined = _normalize_joined(joined)
+    return pd.Series(joined.strip(' ').split(SEPARATOR), index=values.index)
+
+
+def _parse_category_value(value):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return ast.literal_eval(value)
+
+
+def parse_categories(values):
+    """Parse the stored category lists of a whole column.
+
+    All JSON strings are decoded with a single `json.loads` over one joined
+    array; only if that fails (e.g. a row in Python literal syntax) are rows
+    parsed one by one. Values that are not strings are left as they are.
+    """
+    values = pd.Series(values, copy=False)
+    is_string = values.map(lambda v: isinstance(v, str)).to_numpy()
+    if not is_string.any():
+        return values
+
+    strings = values[is_string].tolist()
+    try:
+        parsed = json.loads('[' + ','.join(strings) + ']')
+        if len(parsed) != len(strings):
+            raise ValueError('row count mismatch')
+    except ValueError:
+        parsed = [_parse_category_value(s) for s in strings]
+
+    result = values.to_numpy(dtype=object, copy=True)
+    result[np.flatnonzero(is_string)] = parsed
+    return pd.Series(result, index=values.index)
+
+
+def content_features(frame):
+    """Parsed categories and content_features for a frame of product rows."""
+    categories = parse_categories(frame['Categories'])
+    name = normalize_text(frame['ProductName'])
+    processed_categories = normalize_text(pd.Series(
+        [' '.join(map(str, c)) if isinstance(c, (list, tuple)) else c for c in categories],
+        index=categories.index, dtype=object
+    ))
+    content_features = (
+        name + ' ' +
+        name + ' ' +
+        normalize_text(frame['MaterialName']) + ' ' +
+        normalize_text(frame['MaterialDescription']) + ' ' +
+        processed_categories + ' ' +
+        processed_categories + ' ' +
+        normalize_text(frame['SupplyType']) + ' ' +
+        normalize_text(frame['UnitOfMeasure'])
+    )
+    return categories, content_features
+
+
+def coerce_numeric(df):
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    return df
+
+
+def preprocessing_pool(workers):
+    # Spawned workers: the caller may be a threaded process, where forking is unsafe
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
@@ -0,0 +1,269 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from artifact_store import save_npz
+
+logger = logging.getLogger(__name__)
+
+# Bump when the arrays stored in the artifact change meaning
+USER_SIMILARITY_FORMAT_VERSION = 2
+
+
+def _row_top_k(scores, k):
+    """Column positions and values of the `k` highest entries of each row, best first.
+
+    Ties are ordered by position, as in ranking.top_k_indices.
+    """
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, candidates, axis=1)
+    order = np.lexsort((candidates, -values))
+    return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+def top_k_neighbors(matrices, weights, k, block_cells=16_000_000):
+    """Top-`k` most similar other users per user, without the full user x user matrix.
+
+    The similarity of two users is the weighted sum of the cosine similarities
+    of their rows in each of `matrices` (one row per user, same order, sparse
+    or dense). Users are processed in blocks of rows, so at most about
+    `block_cells` similarity values exist at a time.
+
+    Returns (neighbors, scores): (n_users, k) int32 row positions and float32
+    similarities, best first.
+    """
+    matrices = [normalize(m, norm='l2').astype(np.float32) for m in matrices]
+    n_users = matrices[0].shape[0]
+    k = min(k, n_users - 1)
+    neighbors = np.zeros((n_users, max(k, 0)), dtype=np.int32)
+    scores = np.zeros((n_users, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return neighbors, scores
+
+    block = max(1, block_cells // n_users)
+    for start in range(0, n_users, block):
+        stop = min(start + block, n_users)
+        similarity = np.zeros((stop - start, n_users), dtype=np.float32)
+        for matrix, weight in zip(matrices, weights):
+            product = matrix[start:stop] @ matrix.T
+            similarity += weight * (product.toarray() if hasattr(product, 'toarray') else product)
+        # A user is not their own neighbor
+        similarity[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        neighbors[start:stop], scores[start:stop] = _row_top_k(similarity, k)
+
+    return neighbors, scores
+
+
+def _row_norms(matrix):
+    return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()).astype(np.float32)
+
+
+class UserNeighborModel:
+    """Top-k neighbor lists together with the user features they were computed from.
+
+    Keeps the raw user x product feedback matrix and the users' preference
+    text vectors with their row norms, so that new feedback can be applied
+    in place: the rows of the affected users are updated, their own lists
+    are recomputed against all users, and they are inserted into, moved in
+    or rescored in everyone else's list. That costs O(affected x users)
+    instead of the O(users^2) of a full build.
+
+    A user whose similarity to one of their listed neighbors drops keeps that
+    neighbor until a better candidate is updated or the next full build.
+    """
+
+    def __init__(self, user_ids, product_ids, likes, content, weights, neighbors, scores, block_cells=16_000_000):
+        self.user_ids = np.asarray(user_ids, dtype=object)
+        self.product_ids = np.asarray(product_ids, dtype=object)
+        self.row_of = {user_id: row for row, user_id in enumerate(self.user_ids.tolist())}
+        self.product_col = {product_id: col for col, product_id in enumerate(self.product_ids.tolist())}
+        self.matrices = [sparse.csr_matrix(likes, dtype=np.float32), sparse.csr_matrix(content, dtype=np.float32)]
+        self.norms = [_row_norms(m) for m in self.matrices]
+        self.weights = list(weights)
+        self.neighbors_of = neighbors
+        self.scores = scores
+        self.block_cells = block_cells
+
+    @classmethod
+    def build(cls, user_ids, product_ids, likes, content, weights, k, block_cells=16_000_000):
+        """Full build; lists are padded to `k` with -1 / -inf while there are fewer other users."""
+        found, found_scores = top_k_neighbors([likes, content], weights, k, block_cells)
+        neighbors = np.full((len(user_ids), k), -1, dtype=np.int32)
+        scores = np.full((len(user_ids), k), -np.inf, dtype=np.float32)
+        neighbors[:, :found.shape[1]] = found
+        scores[:, :found.shape[1]] = found_scores
+        return cls(user_ids, product_ids, likes, content, weights, neighbors, scores, block_cells)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def k(self):
+        return self.neighbors_of.shape[1]
+
+    def index(self):
+        """A UserSimilarityIndex of the current lists, independent of later updates."""
+        return UserSimilarityIndex(self.user_ids.astype(str), self.neighbors_of.copy(), self.scores.copy())
+
+    def _similarities(self, rows):
+        """Similarity of the users at `rows` to every user, as a dense (rows x users) block."""
+        similarity = np.zeros((len(rows), len(self.user_ids)), dtype=np.float32)
+        for matrix, norms, weight in zip(self.matrices, self.norms, self.weights):
+            dots = (matrix[rows] @ matrix.T).toarray()
+            denominator = np.outer(norms[rows], norms)
+            similarity += weight * np.divide(dots, denominator, out=np.zeros_like(dots), where=denominator > 0)
+        similarity[np.arange(len(rows)), rows] = -np.inf
+        return similarity
+
+    def apply_feedback(self, user_ids, product_ids, values, new_users=None, new_content=None):
+        """Apply feedback events and repair the neighbor lists of everyone they affect.
+
+        Values are merged with the highest value per (user, product), as in
+        the full build. Events of users not in the model are only applied for
+        the `new_users` whose preference text vectors are given as the rows
+        of `new_content`; other unknown users are skipped. Returns the number
+        of users whose features changed.
+        """
+        events = pd.DataFrame({
+            'UserId': pd.Series(user_ids, dtype=object).to_numpy(),
+            'ProductId': pd.Series(product_ids, dtype=object).to_numpy(),
+            'Value': np.asarray(values, dtype=np.float32),
+        })
+        added = [u for u in dict.fromkeys(new_users if new_users is not None else []) if u not in self.row_of]
+        if added:
+            self._add_users(added, new_content)
+        events = events[events['UserId'].isin(self.row_of.keys()) & (events['Value'] != 0)]
+
+        unseen = [p for p in dict.fromkeys(events['ProductId'].tolist()) if p not in self.product_col]
+        if unseen:
+            self.product_col.update({p: len(self.product_ids) + n for n, p in enumerate(unseen)})
+            self.product_ids = np.concatenate([self.product_ids, np.asarray(unseen, dtype=object)])
+            self.matrices[0].resize((len(self.user_ids), len(self.product_ids)))
+
+        # One event per pair, its highest value
+        events = events.sort_values('Value', kind='stable').drop_duplicates(subset=['UserId', 'ProductId'], keep='last')
+        rows = np.fromiter((self.row_of[u] for u in events['UserId']), dtype=np.int64, count=len(events))
+        cols = np.fromiter((self.product_col[p] for p in events['ProductId']), dtype=np.int64, count=len(events))
+        likes = self.matrices[0]
+        update = sparse.csr_matrix((events['Value'].to_numpy(), (rows, cols)), shape=likes.shape)
+        merged = likes.maximum(update).tocsr()
+        changed = np.unique((merged != likes).tocoo().row)
+
+        affected = np.union1d(changed, [self.row_of[u] for u in added]).astype(np.int64)
+        if len(affected) == 0:
+            return 0
+        merged.sort_indices()
+        self.matrices[0] = merged
+        self.norms[0][changed] = _row_norms(merged[changed])
+        self._repair(affected)
+        return len(affected)
+
+    def _add_users(self, user_ids, content):
+        n_before = len(self.user_ids)
+        self.row_of.update({u: n_before + n for n, u in enumerate(user_ids)})
+        self.user_ids = np.concatenate([self.user_ids, np.asarray(user_ids, dtype=object)])
+        content = sparse.csr_matrix(content, dtype=np.float32)
+        self.matrices[0].resize((len(self.user_ids), self.matrices[0].shape[1]))
+        self.matrices[1] = sparse.vstack([self.matrices[1], content], format='csr')
+        self.norms[0] = np.concatenate([self.norms[0], np.zeros(len(user_ids), dtype=np.float32)])
+        self.norms[1] = np.concatenate([self.norms[1], _row_norms(content)])
+        self.neighbors_of = np.vstack([self.neighbors_of, np.full((len(user_ids), self.k), -1, dtype=np.int32)])
+        self.scores = np.vstack([self.scores, np.full((len(user_ids), self.k), -np.inf, dtype=np.float32)])
+
+    def _repair(self, affected):
+        """Recompute the lists of `affected` rows and fix their entries in all other lists."""
+        n_users = len(self.user_ids)
+        is_affected = np.zeros(n_users, dtype=bool)
+        is_affected[affected] = True
+        k = min(self.k, n_users - 1)
+
+        block = max(1, self.block_cells // n_users)
+        for start in range(0, len(affected), block):
+            rows = affected[start:start + block]
+            similarity = self._similarities(rows)
+            if k > 0:
+                self.neighbors_of[rows, :k], self.scores[rows, :k] = _row_top_k(similarity, k)
+
+            for row, to_row in zip(rows, similarity):
+                # Rescore the lists `row` is already in ...
+                member_rows, member_cols = np.nonzero(self.neighbors_of == row)
+                keep = ~is_affected[member_rows]
+                member_rows, member_cols = member_rows[keep], member_cols[keep]
+                self.scores[member_rows, member_cols] = to_row[member_rows]
+                # ... and let it replace the last neighbor of lists it now beats
+                enters = (to_row > self.scores[:, -1]) & ~is_affected
+                enters[member_rows] = False
+                self.neighbors_of[enters, -1] = row
+                self.scores[enters, -1] = to_row[enters]
+                # Later rows compare against the last entry, so keep lists ordered
+                self._sort_rows(np.union1d(member_rows, np.flatnonzero(enters)))
+
+    def _sort_rows(self, rows):
+        if len(rows) == 0:
+            return
+        neighbors, scores = self.neighbors_of[rows], self.scores[rows]
+        order = np.lexsort((neighbors, -scores))
+        self.neighbors_of[rows] = np.take_along_axis(neighbors, order, axis=1)
+        self.scores[rows] = np.take_along_axis(scores, order, axis=1)
+
+
+class UserSimilarityIndex:
+    """Top-k most similar users per user, held in memory and addressed by user ID.
+
+    Row `i` of `neighbors`/`scores` belongs to `user_ids[i]` and lists the row
+    positions of its most similar users, best first; `row_of` maps a user ID
+    back to its row.
+    """
+
+    def __init__(self, user_ids, neighbors, scores):
+        self.user_ids = np.asarray(user_ids)
+        self.neighbors_of = np.asarray(neighbors)
+        self.scores = np.asarray(scores)
+        self.row_of = {user_id: row for row, user_id in enumerate(self.user_ids.tolist())}
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def k(self):
+        return self.neighbors_of.shape[1]
+
+    def neighbors(self, user_id, k=5):
+        """The `k` most similar other users of `user_id`, best first ([] for unknown users)."""
+        row = self.row_of.get(user_id)
+        if row is None:
+            return []
+        neighbors = self.neighbors_of[row, :k]
+        # Lists are padded with -1 while there are fewer than k other users
+        return self.user_ids[neighbors[neighbors >= 0]].tolist()
+
+    def scored_neighbors(self, user_id, k=None):
+        """(user IDs, similarities) of the `k` most similar other users, all stored ones by default."""
+        row = self.row_of.get(user_id)
+        if row is None:
+            return self.user_ids[:0], self.scores[:0, 0]
+        neighbors, scores = self.neighbors_of[row, :k], self.scores[row, :k]
+        keep = neighbors >= 0
+        return self.user_ids[neighbors[keep]], scores[keep]
+
+
+def save_user_similarity(path, user_ids, neighbors, scores):
+    """Write the top-k neighbor lists and their user-ID index to `path` (.npz)."""
+    save_npz(
+        path,
+        format_version=np.int32(USER_SIMILARITY_FORMAT_VERSION),
+        user_ids=np.asarray(user_ids, dtype=str),
+        neighbors=np.asarray(neighbors, dtype=np.int32),
+        scores=np.asarray(scores, dtype=np.float32),
+    )
+    logger.info(f"Saved user similarity for {len(user_ids)} users to {path}")
+
+
+def load_user_similarity(path):
+    with np.load(path, allow_pickle=False) as arrays:
+        if int(arrays['format_version']) != USER_SIMILARITY_FORMAT_VERSION:
+            raise ValueError(f"Unsupported user similarity format in {path}")
+        return UserSimilarityIndex(arrays['user_ids'], arrays['neighbors'], arrays['scores'])
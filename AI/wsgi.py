@@ -0,0 +1,7 @@
+"""WSGI entry point for production serving.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from recommender_system_v3 import create_app
+
+app = create_app()